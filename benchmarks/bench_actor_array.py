@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Compares the per-reading cost of N sensor state machines written
+as N Afsms with that of one ActorArray holding N instances.
+The Afsms' events are dispatched directly, without queueing or
+scheduling, so their cost is a lower bound.
+
+Usage: bench_actor_array.py [number of sensors (default 50000)]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import farc
+from farc.ActorArray import ActorArray, BatchEvent
+
+
+class Sensor(farc.Afsm):
+    @farc.Fsm.state
+    def _initial(self, event):
+        self.alarms = 0
+        return self.tran(Sensor._normal)
+
+    @farc.Fsm.state
+    def _normal(self, event):
+        if event.signal == farc.Signal.READING and event.value > 100.0:
+            return self.tran(Sensor._alarm)
+        return self.ignored(event)
+
+    @farc.Fsm.state
+    def _alarm(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.alarms += 1
+            return self.handled(event)
+        if sig == farc.Signal.READING and event.value < 90.0:
+            return self.tran(Sensor._normal)
+        return self.ignored(event)
+
+
+class Sensors(ActorArray):
+    def __init__(self, n):
+        super().__init__(n, ("normal", "alarm"), "normal")
+        self.alarms = np.zeros(n, dtype=np.int64)
+        self.on("READING", "normal", "alarm",
+                when=lambda arr, idx, val: val > 100.0)
+        self.on("READING", "alarm", "normal",
+                when=lambda arr, idx, val: val < 90.0)
+        self.on_entry("alarm", Sensors._count_alarm)
+
+    def _count_alarm(self, idx, val):
+        self.alarms[idx] += 1
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    farc.Signal.register("READING")
+    farc.Framework.configure_flight_recorder(depth=0)
+    farc.Framework.run_to_completion = lambda: None
+    rng = np.random.default_rng(0)
+    rounds = 10
+    readings = rng.uniform(0.0, 120.0, (rounds, n))
+
+    sensors = [Sensor() for _ in range(n)]
+    for prio, sm in enumerate(sensors):
+        sm.start(prio)
+    t0 = time.perf_counter()
+    for r in range(rounds):
+        for sm, val in zip(sensors, readings[r].tolist()):
+            sm.dispatch(farc.Event(farc.Signal.READING, val))
+    t_afsm = (time.perf_counter() - t0) / (rounds * n)
+    for sm in sensors:
+        sm.end()
+
+    arr = Sensors(n)
+    arr.start(n)
+    idx = np.arange(n)
+    t0 = time.perf_counter()
+    for r in range(rounds):
+        arr.post_fifo(BatchEvent(farc.Signal.READING, idx, readings[r]))
+        farc.Framework.run()
+    t_array = (time.perf_counter() - t0) / (rounds * n)
+
+    assert arr.alarms.sum() == sum(sm.alarms for sm in sensors)
+    print("sensors:     %d" % n)
+    print("Afsm:        %8.1f ns per reading" % (1e9 * t_afsm))
+    print("ActorArray:  %8.1f ns per reading" % (1e9 * t_array))
+
+
+if __name__ == "__main__":
+    main()
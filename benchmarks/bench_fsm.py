@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Compares the dispatch rate of a flat Afsm with that of an Ahsm
+implementing the same two-state toggle.
+
+Usage: bench_fsm.py [number of events (default 200000)]
+"""
+
+import sys
+import time
+
+import farc
+
+
+class HsmToggle(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("FLIP")
+        farc.Signal.register("NOP")
+        self.flips = 0
+        return self.tran(HsmToggle._off)
+
+    @farc.Hsm.state
+    def _off(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.flips += 1
+            return self.handled(event)
+        if sig == farc.Signal.FLIP:
+            return self.tran(HsmToggle._on)
+        return self.super(self.top)
+
+    @farc.Hsm.state
+    def _on(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.flips += 1
+            return self.handled(event)
+        if sig == farc.Signal.FLIP:
+            return self.tran(HsmToggle._off)
+        return self.super(self.top)
+
+
+class FsmToggle(farc.Afsm):
+    @farc.Fsm.state
+    def _initial(self, event):
+        farc.Signal.register("FLIP")
+        farc.Signal.register("NOP")
+        self.flips = 0
+        return self.tran(FsmToggle._off)
+
+    @farc.Fsm.state
+    def _off(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.flips += 1
+            return self.handled(event)
+        if sig == farc.Signal.FLIP:
+            return self.tran(FsmToggle._on)
+        return self.ignored(event)
+
+    @farc.Fsm.state
+    def _on(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.flips += 1
+            return self.handled(event)
+        if sig == farc.Signal.FLIP:
+            return self.tran(FsmToggle._off)
+        return self.ignored(event)
+
+
+def bench(cls, prio, n):
+    """Returns the dispatches per second of direct dispatch()
+    and of events posted and run through the Framework,
+    for transitions (FLIP) and for events that are ignored (NOP).
+    """
+    sm = cls()
+    sm.start(prio)
+    results = []
+    for signame in ("FLIP", "NOP"):
+        evt = farc.Event(getattr(farc.Signal, signame), None)
+
+        t0 = time.perf_counter()
+        for _ in range(n):
+            sm.dispatch(evt)
+        results.append(n / (time.perf_counter() - t0))
+
+        t0 = time.perf_counter()
+        for _ in range(n):
+            sm.post_fifo(evt)
+        farc.Framework.run()
+        results.append(n / (time.perf_counter() - t0))
+    sm.end()
+    return results
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    # Queue the events and run them in one pass
+    farc.Framework.configure_flight_recorder(depth=0)
+    farc.Framework.run_to_completion = lambda: None
+
+    print("%-8s %14s %14s %14s %14s" % ("", "FLIP dispatch", "FLIP posted",
+                                        "NOP dispatch", "NOP posted"))
+    for prio, cls in enumerate((HsmToggle, FsmToggle)):
+        print("%-8s" % cls.__bases__[0].__name__ + "".join(
+            " %10.0f ev/s" % r for r in bench(cls, prio, n)))
+
+
+if __name__ == "__main__":
+    main()
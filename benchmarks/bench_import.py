@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Measures the time it takes to import farc in a fresh interpreter,
+as reported by python -X importtime (median of several runs).
+
+Usage: bench_import.py [number of runs (default 20)]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+
+def import_time_us(module):
+    """Returns the cumulative import time of the module in microseconds.
+    """
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))).stderr
+    for line in out.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise ValueError("%s not found in importtime output" % module)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    # The first run may compile the .pyc files
+    import_time_us("farc")
+    for module in ("farc", "asyncio"):
+        times = [import_time_us(module) for _ in range(n)]
+        print("import %-8s %8.1f ms" % (module, statistics.median(times) / 1e3))
+
+
+if __name__ == "__main__":
+    main()
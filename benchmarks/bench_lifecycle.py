@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Measures the cost of creating and ending many short-lived Ahsms,
+each with an armed TimeEvent and a subscription, and the dispatch rate
+of one busy Ahsm among many idle ones.
+
+Usage: bench_lifecycle.py [number of Ahsms (default 100000)]
+"""
+
+import sys
+import time
+
+import farc
+
+
+class Session(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        self.tmr = farc.TimeEvent("SESSION_TIMEOUT")
+        self.tmr.post_in(self, 30.0)
+        farc.Framework.subscribe("session.close", self)
+        return self.tran(Session._open)
+
+    @farc.Hsm.state
+    def _open(self, event):
+        return self.super(self.top)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    farc.Framework.configure_flight_recorder(depth=0)
+    band = farc.PriorityBand(1000, 1000 + n)
+
+    t0 = time.perf_counter()
+    acts = [Session() for _ in range(n)]
+    farc.Framework.start_all(acts, band)
+    t1 = time.perf_counter()
+
+    # One Ahsm busy among n idle ones
+    farc.Framework.run_to_completion = lambda: None
+    evt = farc.Event(farc.Signal.register("PING"), None)
+    busy = acts[-1]
+    m = 100000
+    t2 = time.perf_counter()
+    for _ in range(m):
+        busy.post_fifo(evt)
+    farc.Framework.run()
+    t3 = time.perf_counter()
+    for _ in range(m):
+        busy.post_fifo(evt)
+        farc.Framework._run_ready()
+    t4 = time.perf_counter()
+
+    for act in acts:
+        act.end()
+    t5 = time.perf_counter()
+    assert not farc.Framework._time_events
+
+    print("actors:          %d" % n)
+    print("start:           %.3f s (%.1f us per actor, with a timer)"
+          % (t1 - t0, 1e6 * (t1 - t0) / n))
+    print("end:             %.3f s (%.1f us per actor)"
+          % (t5 - t4, 1e6 * (t5 - t4) / n))
+    print("busy, queued:    %.0f ev/s" % (m / (t3 - t2)))
+    print("busy, one a run: %.0f ev/s" % (m / (t4 - t3)))
+
+
+if __name__ == "__main__":
+    main()
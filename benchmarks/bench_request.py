@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Measures request/reply round trips: between two Ahsms with
+Ahsm.request() (compared with a hand-made pair of signals), and from
+an asyncio coroutine awaiting Framework.request().
+
+Usage: bench_request.py [number of round trips (default 100000)]
+"""
+
+import sys
+import time
+
+import farc
+
+
+class Server(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register_many("QUERY", "PING", "PONG")
+        return self.tran(Server._serving)
+
+    @farc.Hsm.state
+    def _serving(self, event):
+        if event.signal == farc.Signal.QUERY:
+            self.reply(event, event.value)
+            return self.handled(event)
+        if event.signal == farc.Signal.PING:
+            # The hand-made way: the requester is in the value
+            self.client.post_fifo(farc.Event(farc.Signal.PONG, event.value))
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class Client(farc.Ahsm):
+    """Makes n round trips, one after another, then stops the loop.
+    """
+
+    def __init__(self, server, n, use_request):
+        super().__init__()
+        self.server = server
+        self.n = n
+        self.use_request = use_request
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register_many("GO", "ANSWER")
+        return self.tran(Client._running)
+
+    @farc.Hsm.state
+    def _running(self, event):
+        sig = event.signal
+        if sig in (farc.Signal.GO, farc.Signal.ANSWER, farc.Signal.PONG):
+            if self.n == 0:
+                farc.Framework._event_loop.stop()
+                return self.handled(event)
+            self.n -= 1
+            if self.use_request:
+                self.request(self.server,
+                             farc.Event(farc.Signal.QUERY, self.n), "ANSWER")
+            else:
+                self.server.post_fifo(farc.Event(farc.Signal.PING, self.n))
+            return self.handled(event)
+        return self.super(self.top)
+
+
+def between_ahsms(server, prio, n, use_request):
+    client = Client(server, n, use_request)
+    client.start(prio)
+    server.client = client
+    t0 = time.perf_counter()
+    client.post_fifo(farc.Event(farc.Signal.GO, None))
+    farc.Framework._event_loop.run_forever()
+    dt = time.perf_counter() - t0
+    client.end()
+    return dt / n
+
+
+def from_coroutine(server, n):
+    async def calls():
+        for i in range(n):
+            await farc.Framework.request(
+                server, farc.Event(farc.Signal.QUERY, i), timeout=1.0)
+
+    t0 = time.perf_counter()
+    farc.Framework._event_loop.run_until_complete(calls())
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    farc.Framework.configure_flight_recorder(depth=0)
+    server = Server()
+    server.start(1)
+
+    print("round trips: %d" % n)
+    print("Ahsm -> Ahsm, two signals:     %.1f us"
+          % (1e6 * between_ahsms(server, 2, n, False)))
+    print("Ahsm -> Ahsm, request/reply:   %.1f us"
+          % (1e6 * between_ahsms(server, 3, n, True)))
+    print("coroutine -> Ahsm, request():  %.1f us"
+          % (1e6 * from_coroutine(server, n)))
+
+
+if __name__ == "__main__":
+    main()
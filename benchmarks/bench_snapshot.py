@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Measures how long it takes to snapshot and to restore
+a Framework of many small Ahsms.
+
+Usage: bench_snapshot.py [number of Ahsms (default 100000)]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import farc
+from farc.Snapshot import Snapshot, restore
+
+
+class Sensor(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("READING")
+        self.last = 0
+        self.tmr = farc.TimeEvent("READING")
+        self.tmr.post_every(self, 60.0)
+        return self.tran(Sensor._sampling)
+
+    @farc.Hsm.state
+    def _sampling(self, event):
+        if event.signal == farc.Signal.READING:
+            self.last = event.value
+            return self.handled(event)
+        return self.super(self.top)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    path = os.path.join(tempfile.gettempdir(), "farc-bench-snapshot.bin")
+
+    t0 = time.perf_counter()
+    for prio in range(n):
+        Sensor().start(prio)
+    t1 = time.perf_counter()
+    Snapshot(path).take(background=False)
+    t2 = time.perf_counter()
+
+    # Empty the Framework as a freshly started process would be
+    farc.Framework._ahsm_registry.clear()
+    farc.Framework._priority_dict.clear()
+    farc.Framework._time_events.clear()
+    farc.Framework._time_event_times.clear()
+    farc.Framework._act_timers.clear()
+
+    t3 = time.perf_counter()
+    acts = restore(path)
+    t4 = time.perf_counter()
+    assert len(acts) == n
+
+    print("actors:       %d" % n)
+    print("start:        %.3f s" % (t1 - t0))
+    print("snapshot:     %.3f s (%d bytes)" % (t2 - t1, os.path.getsize(path)))
+    print("restore:      %.3f s (%.1f us per actor)"
+          % (t4 - t3, 1e6 * (t4 - t3) / n))
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
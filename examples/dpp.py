@@ -9,6 +9,7 @@ dpp.py - the Dining Philosopher's Problem
 """
 
 import random
+import sys
 
 import farc
 
@@ -176,6 +177,10 @@ class Philo(farc.Ahsm):
 def main():
     global philo
 
+    # Run an hour of simulated time, as fast as possible
+    if "--virtual" in sys.argv:
+        farc.Framework.set_clock(farc.VirtualClock(stop_at=3600.0))
+
     table = Table()
     table.start(0)
 
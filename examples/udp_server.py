@@ -19,22 +19,12 @@ References:
 import asyncio
 
 import farc
+from farc.Transports import DatagramAdapter
 
 
 UDP_PORT = 4242
 
 
-class UdpServer:
-    def connection_made(self, transport):
-        pass
-
-    def datagram_received(self, data, addr):
-        UdpRelayAhsm.on_datagram(data, addr)
-
-    def error_received(self, error):
-        UdpRelayAhsm.on_error(error)
-
-
 class UdpRelayAhsm(farc.Ahsm):
 
     @farc.Hsm.state
@@ -43,9 +33,12 @@ class UdpRelayAhsm(farc.Ahsm):
         farc.Framework.subscribe("NET_RXD", self)
         self.tmr = farc.TimeEvent("FIVE_COUNT")
 
+        # The adapter publishes each batch of received datagrams as NET_RXD
         loop = asyncio.get_event_loop()
-        server = loop.create_datagram_endpoint(UdpServer, local_addr=("localhost", UDP_PORT))
-        self.transport, self.protocol = loop.run_until_complete(server)
+        server = loop.create_datagram_endpoint(
+            lambda: DatagramAdapter(batch_delay=0.001),
+            local_addr=("localhost", UDP_PORT))
+        self.transport, self.adapter = loop.run_until_complete(server)
         return self.tran(UdpRelayAhsm._waiting)
 
 
@@ -57,8 +50,8 @@ class UdpRelayAhsm(farc.Ahsm):
             return self.handled(event)
 
         elif sig == farc.Signal.NET_RXD:
-            self.latest_msg, self.latest_addr = event.value
-            print("RelayFrom(%s): %r" % (self.latest_addr, self.latest_msg.decode()))
+            for self.latest_msg, self.latest_addr in event.value:
+                print("RelayFrom(%s): %r" % (self.latest_addr, self.latest_msg.decode()))
             return self.tran(UdpRelayAhsm._relaying)
 
         elif sig == farc.Signal.SIGTERM:
@@ -75,13 +68,13 @@ class UdpRelayAhsm(farc.Ahsm):
             return self.handled(event)
 
         elif sig == farc.Signal.NET_RXD:
-            self.latest_msg, self.latest_addr = event.value
-            print("RelayFrom(%s): %r" % (self.latest_addr, self.latest_msg.decode()))
+            for self.latest_msg, self.latest_addr in event.value:
+                print("RelayFrom(%s): %r" % (self.latest_addr, self.latest_msg.decode()))
             return self.handled(event)
 
         elif sig == farc.Signal.FIVE_COUNT:
             s = "Latest: %r\n" % self.latest_msg.decode()
-            self.transport.sendto(s.encode(), self.latest_addr)
+            self.adapter.writer.write(s.encode(), self.latest_addr)
             return self.handled(event)
 
         elif sig == farc.Signal.NET_ERR:
@@ -108,17 +101,6 @@ class UdpRelayAhsm(farc.Ahsm):
         return self.super(self.top)
 
 
-    # Callbacks interact via messaging
-    @staticmethod
-    def on_datagram(data, addr):
-        e = farc.Event(farc.Signal.NET_RXD, (data,addr))
-        farc.Framework.publish(e)
-
-    @staticmethod
-    def on_error(error):
-        e = farc.Event(farc.Signal.NET_ERR, (error))
-        farc.Framework.publish(e)
-
 
 if __name__ == "__main__":
     relay = UdpRelayAhsm()
@@ -0,0 +1,180 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+ActorArray holds N identical flat state machines in one Ahsm.
+The current state of every instance is kept in a NumPy array and
+events carry a batch of (instance index, value) pairs, so one
+dispatch updates every instance in the batch with a few vectorized
+operations instead of N Python handler calls.
+
+Transitions are declared as rules: on a signal, the instances in the
+batch that are in the rule's source state, and for which the rule's
+when() mask is true, move to the rule's target state.  The first
+matching rule wins for each instance.  Exit and entry actions run as
+callbacks over the indices of the instances that changed state.
+
+    class Sensors(ActorArray):
+        def __init__(self, n):
+            super().__init__(n, ("normal", "alarm"), "normal")
+            self.on("READING", "normal", "alarm",
+                    when=lambda arr, idx, val: val > 100.0)
+            self.on("READING", "alarm", "normal",
+                    when=lambda arr, idx, val: val < 90.0)
+            self.on_entry("alarm", Sensors._raise_alarm)
+
+    sensors.post_fifo(BatchEvent(Signal.READING, idx, values))
+"""
+
+
+import numpy as np # pip3 install numpy
+
+from . import Ahsm, BaseEvent, Hsm, Signal
+
+
+class BatchEvent(BaseEvent):
+    """An event carrying a batch of (instance index, value) pairs
+    for an ActorArray as two equal-length arrays.
+    Unlike an Event, the arrays are not copied,
+    so they must not be modified after the event is posted.
+    """
+
+    def __init__(self, sigid, idx, values=None):
+        self.signal = sigid
+        self.idx = np.asarray(idx, dtype=np.intp)
+        self.values = values if values is None else np.asarray(values)
+
+    @property
+    def value(self):
+        return (self.idx, self.values)
+
+
+class ActorArray(Ahsm):
+    """An Ahsm holding N identical flat state machines whose
+    states are in the NumPy array, state (one state code per instance).
+    State codes are indices into the tuple of state names, states.
+    """
+
+    def __init__(self, n, states, initial):
+        super().__init__()
+        self.n = n
+        self.states = tuple(states)
+        self._initial_code = self.code(initial)
+        self.state = np.full(n, self._initial_code, dtype=np.intp)
+        self._rules = {}    # sigid: [(source, target, when, action), ...]
+        self._entry = {}    # state code: [callback, ...]
+        self._exit = {}     # state code: [callback, ...]
+
+    # The whole array is a single state as far as the Framework
+    # and the Spy are concerned
+    @Hsm.state
+    def _initial(self, event):
+        return self.tran(ActorArray._vectorized)
+
+    @Hsm.state
+    def _vectorized(self, event):
+        return self.super(self.top)
+
+    def code(self, name):
+        """Returns the state code of the state name.
+        """
+        return self.states.index(name)
+
+    def on(self, signame, source=None, target=None, when=None, action=None):
+        """Adds a rule for the signal.  The rule matches the instances in
+        an event's batch that are in the source state (any state if None)
+        and for which when(self, idx, values) returns True (a boolean
+        array as long as idx).  action(self, idx, values), if given, is
+        called with the matching instances.  The matching instances then
+        transition to the target state, unless target is None.
+        Rules are tried in the order they are added and each instance
+        is handled by the first rule that matches it.
+        """
+        sigid = Signal.register(signame)
+        self._rules.setdefault(sigid, []).append((
+            None if source is None else self.code(source),
+            None if target is None else self.code(target),
+            when, action))
+
+    def on_entry(self, state, callback):
+        """Calls callback(self, idx, values) with the instances that
+        entered the state, after each batch and at start().
+        values is None at start().
+        """
+        self._entry.setdefault(self.code(state), []).append(callback)
+
+    def on_exit(self, state, callback):
+        """Calls callback(self, idx, values) with the instances that
+        are leaving the state, before their state changes.
+        """
+        self._exit.setdefault(self.code(state), []).append(callback)
+
+    def init(self):
+        """Puts every instance in the initial state
+        and runs that state's entry callbacks.
+        """
+        self._state = ActorArray._vectorized
+        self.state[:] = self._initial_code
+        for callback in self._entry.get(self._initial_code, ()):
+            callback(self, np.arange(self.n), None)
+
+    def dispatch(self, event):
+        """Applies the event's batch to the instances it names.
+        The batch's indices should be unique; if an index repeats,
+        every occurrence is evaluated against the state before the batch.
+        """
+        rules = self._rules.get(event.signal)
+        if not rules:
+            return
+        if isinstance(event, BatchEvent):
+            idx, values = event.idx, event.values
+        else:
+            idx, values = event.value
+            idx = np.asarray(idx, dtype=np.intp)
+            values = values if values is None else np.asarray(values)
+
+        cur = self.state[idx]
+        new = cur.copy()
+        pending = np.ones(len(idx), dtype=bool)
+        moved = np.zeros(len(idx), dtype=bool)
+        for source, target, when, action in rules:
+            m = pending if source is None else pending & (cur == source)
+            if when is not None:
+                m = m & when(self, idx, values)
+            if not m.any():
+                continue
+            if action is not None:
+                action(self, idx[m], None if values is None else values[m])
+            if target is not None:
+                new[m] = target
+                moved |= m
+            pending = pending & ~m
+            if not pending.any():
+                break
+        if not moved.any():
+            return
+
+        self._run_actions(self._exit, cur, moved, idx, values)
+        self.state[idx[moved]] = new[moved]
+        self._run_actions(self._entry, new, moved, idx, values)
+
+    def _run_actions(self, actions, codes, moved, idx, values):
+        """Calls each state's callbacks with the moved instances
+        whose code (before or after the batch) is that state.
+        """
+        for code, callbacks in actions.items():
+            m = moved & (codes == code)
+            if m.any():
+                for callback in callbacks:
+                    callback(self, idx[m],
+                             None if values is None else values[m])
+
+    def counts(self):
+        """Returns a dict of {state name: number of instances in it}.
+        """
+        n = np.bincount(self.state, minlength=len(self.states))
+        return dict(zip(self.states, n.tolist()))
+
+    def in_state(self, name):
+        """Returns the indices of the instances in the named state.
+        """
+        return np.flatnonzero(self.state == self.code(name))
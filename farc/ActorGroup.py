@@ -0,0 +1,165 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+ActorGroup puts N instances of an Ahsm class behind one address.
+Events posted (or published, once the group subscribes) to the group
+go to one member, chosen by the group's mode:
+
+    "pool"      the least-loaded member: an idle one if there is one
+                (taking turns), otherwise the one with the shortest queue.
+                For stages whose events are independent of each other.
+    "partition" the member that owns the event's key on a consistent-hash
+                ring, so every event of a key goes to the same member
+                and is handled in the order it was posted.
+
+For example:
+
+    workers = ActorGroup(Resolver, 4, mode="pool")
+    workers.start(200)      # members get priorities 200..203
+    Framework.subscribe("DNS_QUERY", workers)
+
+    sessions = ActorGroup(Session, 8, mode="partition",
+                          key=lambda event: event.value["session_id"])
+
+Each member has a group attribute (the ActorGroup)
+and a member_index attribute (its index in the group).
+"""
+
+
+import bisect
+import zlib
+
+from . import Framework
+
+
+class ActorGroup():
+    """N instances of cls(*args, **kwargs) behind one address.
+    In partition mode, key(event) returns the event's key,
+    which is hashed by its str(); by default the key is event.value.
+    Each member owns vnodes points of the hash ring.
+    """
+
+    MODES = ("pool", "partition")
+
+    def __init__(self, cls, n, mode="pool", key=None, vnodes=64,
+                 args=(), kwargs=None):
+        assert n > 0, "a group needs at least one member"
+        assert mode in ActorGroup.MODES, "mode must be one of %s" \
+            % (ActorGroup.MODES,)
+        self.mode = mode
+        self.key = key or (lambda event: event.value)
+        self.members = []
+        for i in range(n):
+            act = cls(*args, **(kwargs or {}))
+            act.group = self
+            act.member_index = i
+            self.members.append(act)
+        self.framework = Framework
+        self.priority = None
+        self.posted = 0
+        self.routed = [0] * n   # events routed to each member
+        self._next = 0          # the member to try first in pool mode
+
+        # The hash ring: sorted points and the member owning each
+        self._ring = sorted((ActorGroup._hash("%d:%d" % (i, v)), i)
+                            for i in range(n) for v in range(vnodes))
+        self._points = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(key):
+        # crc32 rather than hash(), which differs between processes
+        return zlib.crc32(str(key).encode())
+
+    def start(self, priority, framework=None):
+        """Starts the members with the priorities priority,
+        priority + 1, ... priority + N - 1 in the given Framework
+        (the default Framework if None).  The group has the priority
+        of its first member, e.g. for the order of publish().
+        """
+        for i, act in enumerate(self.members):
+            act.start(priority + i, framework)
+        self.framework = self.members[0].framework
+        self.priority = priority
+
+    def end(self):
+        """Ends the members and removes the group's subscriptions.
+        """
+        fw = self.framework
+        for signame in tuple(fw._subscriptions.get(self, ())):
+            fw.unsubscribe(signame, self)
+        for act in self.members:
+            act.end()
+
+    def member_for(self, event):
+        """Returns the member the event is routed to.
+        """
+        if self.mode == "partition":
+            return self.members[self._owner(self.key(event))]
+        members = self.members
+        n = len(members)
+        start = self._next
+        best = None
+        for j in range(n):
+            act = members[(start + j) % n]
+            depth = len(act.mq)
+            if depth == 0:
+                # Let the next idle member take the next event
+                self._next = (start + j + 1) % n
+                return act
+            if best is None or depth < len(best.mq):
+                best = act
+        return best
+
+    def _owner(self, key):
+        """Returns the index of the member owning the key on the ring.
+        """
+        i = bisect.bisect(self._points, ActorGroup._hash(key))
+        return self._ring[i % len(self._ring)][1]
+
+    def post_fifo(self, evt):
+        act = self.member_for(evt)
+        self.posted += 1
+        self.routed[act.member_index] += 1
+        act.post_fifo(evt)
+
+    def post_lifo(self, evt):
+        act = self.member_for(evt)
+        self.posted += 1
+        self.routed[act.member_index] += 1
+        act.post_lifo(evt)
+
+    def depth(self):
+        """Returns the number of events queued in all of the members.
+        """
+        return sum(len(act.mq) for act in self.members)
+
+    def get_metrics(self):
+        """Returns a dict of the group's queue metrics: the total and
+        deepest queue depth, the events posted to the group and routed
+        to each member and, while the Framework's metrics are enabled,
+        the members' ActorMetrics combined.
+        """
+        depths = [len(act.mq) for act in self.members]
+        metrics = {
+            "members": len(self.members),
+            "depth": sum(depths),
+            "depth_max": max(depths),
+            "posted": self.posted,
+            "routed": list(self.routed),
+        }
+        snapshots = [m for prio, m in self.framework.get_metrics().items()
+                     if prio in {act.priority for act in self.members}]
+        if snapshots:
+            dispatched = sum(m["dispatched"] for m in snapshots)
+            metrics.update({
+                "dispatched": dispatched,
+                "depth_hwm": max(m["depth_hwm"] for m in snapshots),
+                "events_per_sec": sum(m["events_per_sec"] for m in snapshots),
+                "latency_avg": (sum(m["latency_avg"] * m["dispatched"]
+                                    for m in snapshots) / dispatched
+                                if dispatched else 0.0),
+                "latency_max": max(m["latency_max"] for m in snapshots),
+                "expired": sum(m["expired"] for m in snapshots),
+                "coalesced": sum(m["coalesced"] for m in snapshots),
+            })
+        return metrics
@@ -0,0 +1,80 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+"""
+
+
+import collections
+import os
+import threading
+
+
+class BufferedWriter():
+    """BufferedWriter moves the cost of formatting and writing
+    trace records off of the event loop's thread.
+    The loop thread calls append() with a compact record (a tuple).
+    A background thread drains the buffer every flush_interval seconds
+    and passes each record to the sink, which formats and writes it.
+
+    The sink is any object with these methods:
+        open(path)          starts a new output file
+        write(record)       formats and writes one record
+        size()              returns the number of bytes written so far
+        close()             finishes and closes the output file
+
+    If max_bytes is non-zero, the output file is rotated once it exceeds
+    max_bytes: path is renamed to path.1 (path.1 to path.2 and so on,
+    keeping at most backup_count old files) and the sink is reopened.
+    """
+
+    def __init__(self, sink, path, max_bytes=0, backup_count=0,
+                 flush_interval=0.1):
+        self.path = path
+        self._sink = sink
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._flush_interval = flush_interval
+        self._buf = collections.deque()
+        self._stop = threading.Event()
+
+        # deque.append is atomic, so the loop thread
+        # may append while the writer thread pops
+        self.append = self._buf.append
+
+        self._sink.open(self.path)
+        self._thread = threading.Thread(
+            target=self._run, name="farc-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops the writer thread, writes any buffered records
+        and closes the sink.
+        """
+        self._stop.set()
+        self._thread.join()
+        self._drain()
+        self._sink.close()
+
+    def _run(self):
+        while not self._stop.wait(self._flush_interval):
+            self._drain()
+
+    def _drain(self):
+        popleft = self._buf.popleft
+        write = self._sink.write
+        while self._buf:
+            write(popleft())
+            if self._max_bytes and self._sink.size() > self._max_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        """Closes the current file, shifts the backups
+        and opens a fresh file at the same path.
+        """
+        self._sink.close()
+        if self._backup_count > 0:
+            for n in range(self._backup_count - 1, 0, -1):
+                src = "%s.%d" % (self.path, n)
+                if os.path.exists(src):
+                    os.replace(src, "%s.%d" % (self.path, n + 1))
+            os.replace(self.path, self.path + ".1")
+        self._sink.open(self.path)
@@ -0,0 +1,289 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+ChromeTraceSpy writes the Chrome trace-event (JSON array) format,
+which Perfetto (ui.perfetto.dev) and chrome://tracing load.
+Each Ahsm gets a track, named after its class and priority, on which
+    - every event handled is a duration slice named after its signal,
+      with the states before and after as arguments,
+    - a transition is a nested slice from the end of the handler search
+      to the end of the dispatch (exits, entries and initial transitions),
+    - every post and TimeEvent firing is an instant event and
+    - a flow arrow runs from the slice that posted or published an event
+      to the slice that handled it.
+The loop thread only appends compact records to a buffer;
+a BufferedWriter formats and writes them on a background thread.
+"""
+
+
+import itertools
+import json
+import os
+import tempfile
+
+from . import Framework, Hsm, Signal, TimeEvent
+from .BufferedWriter import BufferedWriter
+from .SpyType import SpyType
+
+
+class _ChromeSink():
+    """Formats ChromeTraceSpy's records as trace events
+    on BufferedWriter's background thread.
+    """
+
+    def __init__(self, tracks):
+        # tid:name shared with ChromeTraceSpy
+        self._tracks = tracks
+        self._pid = os.getpid()
+
+    def open(self, path):
+        self._file = open(path, "w")
+        self._file.write("[\n")
+        self._sep = ""
+        # Every file names all the tracks known so far,
+        # so a rotated file can be loaded on its own
+        for tid, name in self._tracks.copy().items():
+            self._track(tid, name)
+
+    def _emit(self, d):
+        self._file.write(self._sep + json.dumps(d, separators=(",", ":")))
+        self._sep = ",\n"
+
+    def _track(self, tid, name):
+        self._emit({"ph": "M", "name": "thread_name", "pid": self._pid,
+                    "tid": tid, "args": {"name": name}})
+        self._emit({"ph": "M", "name": "thread_sort_index", "pid": self._pid,
+                    "tid": tid, "args": {"sort_index": tid}})
+
+    def write(self, record):
+        ph = record[0]
+        if ph == "M":
+            self._track(record[1], record[2])
+            return
+        d = {"ph": ph, "pid": self._pid, "tid": record[1],
+             "ts": 1e6 * record[2]}
+        if ph == "X":
+            d["name"], d["dur"], d["args"] = (
+                record[3], 1e6 * (record[4] - record[2]), record[5])
+        elif ph == "i":
+            d["name"], d["s"] = record[3], "t"
+        else:
+            # Flow start ("s") or end ("f"), bound to the enclosing slice
+            d["name"], d["cat"], d["id"] = "post", "farc", record[3]
+            if ph == "f":
+                d["bp"] = "e"
+        self._emit(d)
+
+    def size(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.write("\n]\n")
+        self._file.close()
+
+
+class _Dispatch():
+    """The state of a dispatch in progress on an Ahsm's track.
+    """
+    __slots__ = ("act", "event", "t0", "state", "t_search", "result")
+
+    def __init__(self, act, event, t0):
+        self.act = act
+        self.event = event
+        self.t0 = t0
+        self.state = act._state
+        self.t_search = None
+        self.result = None
+
+
+class ChromeTraceSpy(metaclass=SpyType):
+    """ChromeTraceSpy, if enabled, writes a Chrome trace-event file
+    of every Ahsm's handlers, transitions, posts and TimeEvents
+    for viewing in Perfetto.
+    """
+
+    _path = None
+    _max_bytes = 0
+    _backup_count = 0
+
+
+    @staticmethod
+    def configure(path=None, max_bytes=0, backup_count=0):
+        """Sets the output path (a temporary file if None),
+        the size in bytes at which the file is rotated (0 to never rotate)
+        and the number of rotated files to keep.
+        Call before Spy.enable_spy(ChromeTraceSpy).
+        """
+        ChromeTraceSpy._path = path
+        ChromeTraceSpy._max_bytes = max_bytes
+        ChromeTraceSpy._backup_count = backup_count
+
+
+    @staticmethod
+    def init():
+        """Starts the background writer and names the tracks
+        of the Ahsms that were added before the Spy was enabled.
+        """
+        path = ChromeTraceSpy._path
+        if path is None:
+            with tempfile.NamedTemporaryFile(
+                    mode='w', suffix=".json", delete=False) as f:
+                path = f.name
+        ChromeTraceSpy._tracks = {}
+        ChromeTraceSpy._writer = BufferedWriter(
+                _ChromeSink(ChromeTraceSpy._tracks), path,
+                ChromeTraceSpy._max_bytes, ChromeTraceSpy._backup_count)
+        ChromeTraceSpy._append = ChromeTraceSpy._writer.append
+        ChromeTraceSpy._time = Framework.time
+        # Dispatches in progress, innermost last
+        ChromeTraceSpy._stack = []
+        # The flows to each Ahsm's queued events,
+        # {priority: {id(event): [event, flow id, ...]}}.  Each entry
+        # holds its event so that the id is not reused while it lives.
+        ChromeTraceSpy._flows = {}
+        ChromeTraceSpy._flow_ids = itertools.count(1)
+        for act in Framework._ahsm_registry:
+            ChromeTraceSpy.on_framework_add(act)
+
+
+    @staticmethod
+    def on_framework_add(act):
+        """Names the Ahsm's track.
+        """
+        name = "%s(%d)" % (act.__class__.__name__, act.priority)
+        ChromeTraceSpy._tracks[act.priority] = name
+        ChromeTraceSpy._append(("M", act.priority, name))
+
+
+    @staticmethod
+    def on_framework_stop():
+        """Flushes and closes the trace file and prints the filename to stdout
+        """
+        ChromeTraceSpy._writer.close()
+        print("ChromeTraceSpy file: %s" % ChromeTraceSpy._writer.path)
+
+
+    @staticmethod
+    def on_ahsm_post(act, evt):
+        """Marks the post with an instant event.  A post from a handler
+        is marked on the poster's track and starts a flow to the
+        slice that will handle the event.
+        """
+        t = ChromeTraceSpy._time()
+        name = Signal._lookup[evt.signal]
+        stack = ChromeTraceSpy._stack
+        if isinstance(evt, TimeEvent):
+            ChromeTraceSpy._append(("i", act.priority, t, "timer " + name))
+        elif not stack:
+            ChromeTraceSpy._append(("i", act.priority, t, "post " + name))
+        else:
+            tid = stack[-1].act.priority
+            flow = next(ChromeTraceSpy._flow_ids)
+            pending = ChromeTraceSpy._flows.setdefault(act.priority, {})
+            entry = pending.get(id(evt))
+            if entry is None:
+                pending[id(evt)] = [evt, flow]
+            else:
+                # The same event object was posted again
+                entry.append(flow)
+            ChromeTraceSpy._append(("i", tid, t, "post %s to %s" % (
+                name, ChromeTraceSpy._tracks.get(act.priority, act.priority))))
+            ChromeTraceSpy._append(("s", tid, t, flow))
+
+
+    @staticmethod
+    def on_framework_dispatch_pre(act, evt):
+        t = ChromeTraceSpy._time()
+        ChromeTraceSpy._stack.append(_Dispatch(act, evt, t))
+        flow = ChromeTraceSpy._take_flow(act, evt)
+        if flow is not None:
+            ChromeTraceSpy._append(("f", act.priority, t, flow))
+
+
+    @staticmethod
+    def on_state_handler_called(st, evt, result):
+        """Keeps the result of the handler of the dispatched event,
+        ignoring the ENTRY, EXIT and INIT events of a transition.
+        """
+        stack = ChromeTraceSpy._stack
+        if stack and evt is stack[-1].event:
+            stack[-1].result = result
+
+
+    @staticmethod
+    def on_hsm_dispatch_post(st_list):
+        """Marks the end of the handler search, where a transition starts.
+        """
+        stack = ChromeTraceSpy._stack
+        if stack and stack[-1].t_search is None:
+            stack[-1].t_search = ChromeTraceSpy._time()
+
+
+    @staticmethod
+    def on_framework_dispatch_post(act, evt):
+        t = ChromeTraceSpy._time()
+        stack = ChromeTraceSpy._stack
+        if not stack:
+            # The Spy was enabled during the dispatch
+            return
+        d = stack.pop()
+        source = d.state.__qualname__
+        target = act._state.__qualname__
+        ChromeTraceSpy._append(("X", act.priority, d.t0,
+                                Signal._lookup[evt.signal], t,
+                                {"state": source, "next": target}))
+        if d.result == Hsm.RET_TRAN and d.t_search is not None:
+            ChromeTraceSpy._append(("X", act.priority, d.t_search,
+                                    "tran " + act._state.__name__, t,
+                                    {"source": source, "target": target}))
+
+
+    @staticmethod
+    def on_framework_dispatch_error(act, evt, exc):
+        """Ends the slice of a handler that raised.
+        """
+        t = ChromeTraceSpy._time()
+        stack = ChromeTraceSpy._stack
+        if not stack:
+            return
+        d = stack.pop()
+        ChromeTraceSpy._append(("X", act.priority, d.t0,
+                                Signal._lookup[evt.signal], t,
+                                {"state": d.state.__qualname__,
+                                 "error": repr(exc)}))
+
+
+    @staticmethod
+    def on_framework_event_expired(act, evt):
+        ChromeTraceSpy._take_flow(act, evt)
+
+
+    @staticmethod
+    def on_ahsm_coalesced(act, old_evt, evt):
+        """Drops the flow to the queued event that evt replaced.
+        """
+        ChromeTraceSpy._take_flow(act, old_evt)
+
+
+    @staticmethod
+    def on_framework_remove(act):
+        """Drops the flows to the events left in the Ahsm's queue.
+        """
+        ChromeTraceSpy._flows.pop(act.priority, None)
+
+
+    @staticmethod
+    def _take_flow(act, evt):
+        """Removes and returns the oldest flow to the Ahsm's queued evt,
+        or None if there is none.
+        """
+        pending = ChromeTraceSpy._flows.get(act.priority)
+        if not pending:
+            return None
+        entry = pending.get(id(evt))
+        if entry is None:
+            return None
+        flow = entry.pop(1)
+        if len(entry) == 1:
+            del pending[id(evt)]
+        return flow
@@ -0,0 +1,239 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+EventRecorder captures every event injected into the Framework
+from outside of a state handler: posts and publishes made by
+application code or asyncio callbacks, and TimeEvent expirations.
+EventReplayer feeds a recording back into a freshly started set of
+Ahsms, at the recorded pace or as fast as possible, and checks that
+each Ahsm ends in the state it was recorded in.
+
+Events posted by state handlers are not recorded because replaying
+the injected events makes the handlers post them again.
+
+Recording file: a stream of pickled tuples
+    ("farc-events", VERSION, signal names by id)
+    (time, kind, priority, component, signal id, value)    repeated
+    ("end", {priority: (class name, state name)})
+where component is the index of the component posted to (see
+Ahsm.add_component()), or None for the Ahsm itself, and value is
+the pickled value of an Event or, if kind has the OBJECT flag,
+the whole pickled event of another type (e.g. a BatchEvent).
+"""
+
+
+import pickle
+import time
+import warnings
+
+from . import Event, Framework, Signal, TimeEvent
+from .farc import Clock, _ComponentEvent
+
+
+VERSION = 2
+
+# Record kinds
+POST_FIFO = 0
+POST_LIFO = 1
+TIMER = 2
+
+# Flags a post of an event that is not an Event
+OBJECT = 4
+
+
+class EventRecorder():
+    """Records externally injected events to a file.
+    Call start() before the events of interest are injected;
+    recording ends when the Framework stops or stop() is called.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.in_run = False
+        self._file = None
+
+    def start(self):
+        self._file = open(self.path, "wb")
+        self._pickler = pickle.Pickler(self._file, pickle.HIGHEST_PROTOCOL)
+        self._pickler.dump(("farc-events", VERSION, list(Signal._lookup)))
+        Framework._recorder = self
+
+    def stop(self):
+        """Writes each Ahsm's current state and closes the file.
+        """
+        if self._file is None:
+            return
+        Framework._recorder = None
+        self._pickler.dump(("end", final_states()))
+        self._file.close()
+        self._file = None
+
+    def on_post(self, act, evt, lifo):
+        # Posts made while the Framework is running come from state
+        # handlers and TimeEvents are recorded when they expire
+        if self.in_run or isinstance(evt, TimeEvent):
+            return
+        kind = POST_LIFO if lifo else POST_FIFO
+        component = None
+        if evt.__class__ is _ComponentEvent:
+            component = act.components.index(evt.component)
+            evt = evt.event
+        if isinstance(evt, Event):
+            value = evt._value
+        else:
+            kind |= OBJECT
+            try:
+                value = pickle.dumps(evt, pickle.HIGHEST_PROTOCOL)
+            except Exception as exc:
+                warnings.warn("EventRecorder can not record a %s: %r"
+                              % (evt.__class__.__name__, exc),
+                              RuntimeWarning)
+                return
+        self._pickler.dump((Framework.time(), kind, act.priority,
+                            component, evt.signal, value))
+
+    def on_time_event(self, tm_event):
+        self._pickler.dump((Framework.time(), TIMER, tm_event.act.priority,
+                            None, tm_event.signal, None))
+
+    def on_stop(self):
+        self.stop()
+
+
+def final_states():
+    """Returns {priority: (class name, state name)} for every Ahsm.
+    """
+    return {act.priority: (act.__class__.__name__, act._state.__name__)
+            for act in Framework._ahsm_registry}
+
+
+class _ReplayClock(Clock):
+    """A clock that is set to each record's time
+    and never fires TimeEvents itself; the recorded
+    expirations fire them instead.
+    """
+
+    class _Handle():
+        def cancel(self):
+            pass
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback, *args):
+        return _ReplayClock._Handle()
+
+
+class EventReplayer():
+    """Replays a recording made by EventRecorder.
+    The application must create and start the same Ahsms,
+    at the same priorities, before calling run().
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            if header[:2] != ("farc-events", VERSION):
+                raise ValueError("%s is not a farc event recording" % path)
+            sig_names = header[2]
+            self.records = []
+            self.final_states = None
+            while True:
+                try:
+                    rec = pickle.load(f)
+                except EOFError:
+                    break
+                if rec[0] == "end":
+                    self.final_states = rec[1]
+                    break
+                self.records.append(rec)
+        # The replaying process may have registered signals in another order
+        self._sigids = [Signal.register(nm) for nm in sig_names]
+
+    def run(self, realtime=False):
+        """Injects every recorded event, running the Framework to completion
+        after each one.  If realtime is True, waits between events to keep
+        the recorded pace; otherwise replays as fast as possible.
+        Returns a dict of the number of events injected, the number of
+        dispatches, the elapsed (wall) time and the dispatches per second.
+        """
+        acts = {act.priority: act for act in Framework._ahsm_registry}
+        dispatched0 = sum(act.dispatched for act in acts.values())
+
+        saved_clock = Framework._clock
+        saved_rtc = Framework.__dict__.get("run_to_completion")
+        clock = _ReplayClock(self.records[0][0] if self.records else 0.0)
+        Framework.set_clock(clock)
+        # Every injection is followed by a synchronous run();
+        # don't let each post also schedule one on the event loop
+        Framework.run_to_completion = lambda: None
+        t_first = clock.now
+        start = time.perf_counter()
+        try:
+            for t, kind, prio, component, sigid, value in self.records:
+                if realtime:
+                    delay = (t - t_first) - (time.perf_counter() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                clock.now = t
+                act = acts[prio]
+                sigid = self._sigids[sigid]
+                if kind == TIMER:
+                    self._fire_time_event(act, sigid)
+                else:
+                    if kind & OBJECT:
+                        evt = pickle.loads(value)
+                    else:
+                        evt = Event.__new__(Event)
+                        evt._value = value
+                    evt.signal = sigid
+                    if component is not None:
+                        act = act.components[component]
+                    if kind & POST_LIFO:
+                        act.post_lifo(evt)
+                    else:
+                        act.post_fifo(evt)
+                Framework.run()
+        finally:
+            elapsed = time.perf_counter() - start
+            if saved_rtc:
+                Framework.run_to_completion = saved_rtc
+            else:
+                del Framework.run_to_completion
+            Framework.set_clock(saved_clock)
+
+        dispatched = sum(act.dispatched for act in acts.values()) - dispatched0
+        return {"events": len(self.records),
+                "dispatched": dispatched,
+                "elapsed": elapsed,
+                "dispatches_per_sec": dispatched / elapsed if elapsed else 0.0}
+
+    def _fire_time_event(self, act, sigid):
+        """Fires the Ahsm's armed TimeEvent having the given signal
+        the same way Framework.time_event_callback() does.
+        """
+        for tm_event in Framework._time_events:
+            if tm_event.act is act and tm_event.signal == sigid:
+                break
+        else:
+            # The Ahsm did not arm the timer this time; deliver the signal anyway
+            act.post_fifo(Event(sigid, None))
+            return
+        Framework.remove_time_event(tm_event)
+        if tm_event.is_periodic():
+            Framework._insort_time_event(tm_event,
+                                         Framework.time() + tm_event.interval)
+        act.post_fifo(tm_event)
+
+    def verify(self):
+        """Returns a dict of {priority: (recorded, replayed)}
+        for each Ahsm whose final state differs from the recording.
+        An empty dict means the replay matched.
+        """
+        replayed = final_states()
+        return {prio: (st, replayed.get(prio))
+                for prio, st in (self.final_states or {}).items()
+                if replayed.get(prio) != st}
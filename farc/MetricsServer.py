@@ -0,0 +1,190 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+MetricsServer exports the Framework's metrics in the Prometheus text
+format over HTTP, on a localhost TCP port or a Unix socket:
+per-actor queue depth, posts, dispatches, queueing latency, handler
+time, timer, expired and coalesced event counts, plus the number of armed TimeEvents and the
+event loop's lag.  Watch it live with:
+    python3 -m farc.top <port | host:port | /path/to/unix.sock>
+or scrape it with Prometheus or curl.
+
+Each actor's lines are kept between scrapes and only the actors whose
+metrics changed since the previous scrape are rendered again.
+"""
+
+
+import asyncio
+
+from . import Framework
+from .farc import ActorMetrics
+
+
+# (name, type, help) of each per-actor metric family
+FAMILIES = (
+    ("farc_queue_depth", "gauge", "Events waiting in the actor's queue"),
+    ("farc_queue_depth_max", "gauge", "High-water mark of the queue depth"),
+    ("farc_events_posted_total", "counter", "Events posted to the actor"),
+    ("farc_events_dispatched_total", "counter",
+     "Events dispatched to the actor"),
+    ("farc_queue_latency_seconds", "histogram",
+     "Time events spent in the actor's queue"),
+    ("farc_handler_seconds", "histogram",
+     "Time the actor's state handlers took per event"),
+    ("farc_timers_fired_total", "counter", "TimeEvents fired for the actor"),
+    ("farc_events_expired_total", "counter",
+     "Stale events dropped before dispatch"),
+    ("farc_events_coalesced_total", "counter",
+     "Posts that replaced a queued event of the same signal"),
+)
+
+
+def _histogram(name, labels, bins, counts, total):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(bins, counts):
+        cumulative += n
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append('%s_bucket{%s,le="%s"} %d\n'
+                     % (name, labels, le, cumulative))
+    lines.append("%s_sum{%s} %r\n" % (name, labels, total))
+    lines.append("%s_count{%s} %d\n" % (name, labels, cumulative))
+    return "".join(lines)
+
+
+class MetricsServer():
+    """Serves the metrics of the given Framework.
+    Enables the Framework's metrics.  The event loop's lag is
+    measured every lag_interval seconds.
+    """
+
+    def __init__(self, framework=Framework, lag_interval=0.1):
+        self.framework = framework
+        self.lag_interval = lag_interval
+        self.lag = 0.0
+        self.lag_max = 0.0
+        self.scrapes = 0
+        self.server = None
+        # Ahsm: rendered lines of each FAMILY.  Keyed by the Ahsm, not
+        # its priority, which a PriorityBand may give to a new Ahsm.
+        self._blocks = {}
+        self._lag_handle = None
+
+    def start(self, port=None, host="127.0.0.1", path=None):
+        """Starts serving on the Unix socket at path, if given,
+        otherwise on host:port.  Returns the task that starts the server;
+        it completes once the event loop has run.
+        """
+        fw = self.framework
+        fw.enable_metrics()
+        loop = fw._event_loop or fw.bind()
+        self._expected = loop.time() + self.lag_interval
+        self._lag_handle = loop.call_at(self._expected, self._probe_lag)
+        if path:
+            coro = asyncio.start_unix_server(self._handle, path)
+        else:
+            coro = asyncio.start_server(self._handle, host, port)
+        return loop.create_task(self._serve(coro))
+
+    async def _serve(self, coro):
+        self.server = await coro
+        return self.server
+
+    def stop(self):
+        if self._lag_handle:
+            self._lag_handle.cancel()
+            self._lag_handle = None
+        if self.server:
+            self.server.close()
+            self.server = None
+
+    def address(self):
+        """Returns the address the server is listening on.
+        """
+        return self.server.sockets[0].getsockname()
+
+    def _probe_lag(self):
+        """Measures how late the event loop ran this callback.
+        """
+        loop = self.framework._event_loop
+        now = loop.time()
+        self.lag = max(0.0, now - self._expected)
+        if self.lag > self.lag_max:
+            self.lag_max = self.lag
+        self._expected = now + self.lag_interval
+        self._lag_handle = loop.call_at(self._expected, self._probe_lag)
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        parts = request.split(b" ", 2)
+        if len(parts) > 1 and parts[1] in (b"/", b"/metrics"):
+            body = self.render().encode()
+            head = "HTTP/1.0 200 OK\r\n" \
+                   "Content-Type: text/plain; version=0.0.4\r\n"
+        else:
+            body = b"Not found\n"
+            head = "HTTP/1.0 404 Not Found\r\nContent-Type: text/plain\r\n"
+        writer.write(("%sContent-Length: %d\r\n\r\n" % (head, len(body)))
+                     .encode() + body)
+        await writer.drain()
+        writer.close()
+
+    def render(self):
+        """Returns the metrics in the Prometheus text format.
+        """
+        self.scrapes += 1
+        fw = self.framework
+        # Ahsms in other threads may mark their metrics dirty meanwhile
+        dirty = list(fw._metrics_dirty)
+        fw._metrics_dirty.difference_update(dirty)
+        for m in dirty:
+            m.is_dirty = False
+            act = m.act
+            if fw._priority_dict.get(act.priority) is act:
+                self._blocks[act] = self._render_actor(act, m)
+            else:
+                self._blocks.pop(act, None)
+
+        out = []
+        blocks = self._blocks.values()
+        for i, (name, typ, help) in enumerate(FAMILIES):
+            out.append("# HELP %s %s\n# TYPE %s %s\n" % (name, help, name, typ))
+            out.extend(block[i] for block in blocks)
+        for name, help, value in (
+                ("farc_actors", "Actors in the Framework",
+                 len(fw._ahsm_registry)),
+                ("farc_timers_armed", "Armed TimeEvents",
+                 len(fw._time_events)),
+                ("farc_loop_lag_seconds",
+                 "How late the event loop ran the latest probe", self.lag),
+                ("farc_loop_lag_max_seconds",
+                 "Largest event loop lag seen", self.lag_max)):
+            out.append("# HELP %s %s\n# TYPE %s gauge\n%s %r\n"
+                       % (name, help, name, name, value))
+        return "".join(out)
+
+    @staticmethod
+    def _render_actor(act, m):
+        """Returns the lines of each of FAMILIES for one actor.
+        """
+        labels = 'actor="%s",priority="%d"' % (act.__class__.__name__,
+                                               act.priority)
+        return (
+            "farc_queue_depth{%s} %d\n" % (labels, len(act.mq)),
+            "farc_queue_depth_max{%s} %d\n" % (labels, m.depth_hwm),
+            "farc_events_posted_total{%s} %d\n" % (labels, m.posted),
+            "farc_events_dispatched_total{%s} %d\n" % (labels, m.dispatched),
+            _histogram("farc_queue_latency_seconds", labels,
+                       ActorMetrics.LATENCY_BINS, m.latency_hist,
+                       m.latency_sum),
+            _histogram("farc_handler_seconds", labels,
+                       ActorMetrics.HANDLER_BINS, m.handler_hist,
+                       m.handler_sum),
+            "farc_timers_fired_total{%s} %d\n" % (labels, m.timers_fired),
+            "farc_events_expired_total{%s} %d\n" % (labels, m.expired),
+            "farc_events_coalesced_total{%s} %d\n" % (labels, m.coalesced),
+        )
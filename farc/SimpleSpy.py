@@ -1,31 +1,69 @@
+import collections
 import inspect
 from . import Framework, Hsm, Signal
-
-class SpyType(type):
-    # This is used so that unimplemented static methods
-    #  swallow their arguments and return None
-    def __getattr__(cls, key):
-        # print(f'Called class attribute {key}')
-        return lambda *args, **kwargs: None
+from .SpyType import SpyType
 
 class SimpleSpy(metaclass=SpyType):
+    # The log holds raw (state, signal, result) tuples and is only
+    # formatted by get_log() and compare_log().  A dispatched event
+    # is logged with a state of None.  The oldest entries are discarded
+    # once the log holds _log_maxlen entries.
     _sig_names = {}
     _sig_id = {}
     _state_names = {}
-    _log_lines = []
+    _log_maxlen = 100000
+    _log = collections.deque(maxlen=_log_maxlen)
+    _echo = True
+
+    @staticmethod
+    def configure(echo=True, maxlen=100000):
+        """Sets whether log lines are printed as they happen
+        and the maximum number of entries kept in the log.
+        Clears the log.
+        """
+        __class__._echo = echo
+        __class__._log_maxlen = maxlen
+        __class__.clear_log()
 
     @staticmethod
     def clear_log():
-        __class__._log_lines = []
+        __class__._log = collections.deque(maxlen=__class__._log_maxlen)
+
+    @staticmethod
+    def _format(entry):
+        state, sig, _ = entry
+        if state is None:
+            return f"\n<{__class__._sig_names[sig]}> "
+        return f"{__class__._state_names[state]}-{__class__._sig_names[sig]};"
 
     @staticmethod
     def get_log():
-        return __class__._log_lines.copy()
+        return [__class__._format(entry) for entry in __class__._log]
+
+    @staticmethod
+    def compare_log(reference):
+        """Compares the log, as get_log() would format it,
+        against the reference string one entry at a time.
+        Returns -1 if they are equal, otherwise the offset
+        in the reference where they first differ.
+        """
+        pos = 0
+        for entry in __class__._log:
+            line = __class__._format(entry)
+            if not reference.startswith(line, pos):
+                while pos < len(reference) and line \
+                        and reference[pos] == line[0]:
+                    pos += 1
+                    line = line[1:]
+                return pos
+            pos += len(line)
+        return -1 if pos == len(reference) else pos
 
     @staticmethod
-    def logger(msg):
-        print(msg, end='')
-        __class__._log_lines.append(msg)
+    def logger(entry):
+        __class__._log.append(entry)
+        if __class__._echo:
+            print(__class__._format(entry), end='')
 
     @staticmethod
     def init():
@@ -38,9 +76,9 @@ class SimpleSpy(metaclass=SpyType):
 
     @staticmethod
     def on_state_handler_called(state, evt, result):
-        if evt is not None and evt.signal not in [Signal.EMPTY]:
-            if (result != Hsm.RET_SUPER) or evt.signal in [Signal.ENTRY, Signal.EXIT]:
-                __class__.logger(f"{__class__._state_names[state]}-{__class__._sig_names[evt.signal]};")
+        if evt is not None and evt.signal != Signal.EMPTY:
+            if (result != Hsm.RET_SUPER) or evt.signal in (Signal.ENTRY, Signal.EXIT):
+                __class__.logger((state, evt.signal, result))
 
     @staticmethod
     def on_framework_add(act):
@@ -50,4 +88,4 @@ class SimpleSpy(metaclass=SpyType):
 
     @staticmethod
     def on_hsm_dispatch_event(evt):
-        __class__.logger(f"\n<{__class__._sig_names[evt.signal]}> ")
+        __class__.logger((None, evt.signal, None))
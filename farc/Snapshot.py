@@ -0,0 +1,248 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+Snapshot saves the Ahsms of a running Framework so that a restarted
+process can resume from where it left off instead of replaying a long
+history of events.  For each Ahsm it saves the current state handler,
+the user attributes, the pending events in the queue and the armed
+TimeEvents with their expirations.  restore() rebuilds the Ahsms
+without running their init() chains.
+
+Snapshots are incremental: each take() appends a frame holding only
+the Ahsms that have dispatched or queued events since the previous
+take().  Where os.fork() is available, the frame is pickled and written
+by a child process, which sees a copy-on-write image of the parent's
+memory, so the event loop is paused only for the fork itself.
+
+Snapshot file: a stream of pickled frames, each a dict with
+    "time"      Framework.time() when the frame was taken
+    "signals"   the signal names by id
+    "actors"    {priority: (class, pickled (attributes, timers))}
+    "removed"   priorities of Ahsms that left the Framework
+"""
+
+
+import io
+import os
+import pickle
+import traceback
+
+from . import Ahsm, BaseEvent, Framework, Signal, TimeEvent
+from .farc import _CoalescedEvent, _ComponentEvent, _QueuedEvent
+
+
+# Ahsm attributes that belong to the Framework rather than the application
+_FRAMEWORK_ATTRS = ("metrics", "flight", "framework", "dispatched",
+                    "_scheduled")
+
+
+class _ActorPickler(pickle.Pickler):
+    """Pickles references to other Ahsms by priority
+    so each Ahsm can be saved in its own frame,
+    and references to the Framework (e.g. from TimeEvents) by name.
+    """
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Ahsm):
+            return obj.priority
+        if obj is Framework:
+            return "Framework"
+        return None
+
+
+class _ActorUnpickler(pickle.Unpickler):
+    def __init__(self, f, acts):
+        super().__init__(f)
+        self._acts = acts
+
+    def persistent_load(self, pid):
+        if pid == "Framework":
+            return Framework
+        return self._acts[pid]
+
+
+def _armed_timers():
+    """Returns {priority: [(TimeEvent, expiration, interval), ...]}.
+    """
+    timers = {}
+    for te, t in zip(Framework._time_events, Framework._time_event_times):
+        timers.setdefault(te.act.priority, []).append((te, t, te.interval))
+    return timers
+
+
+def _dump_actor(act, timers):
+    """Returns the pickled attributes and armed TimeEvents of the Ahsm.
+    """
+    attrs = {k: v for k, v in act.__dict__.items()
+             if k not in _FRAMEWORK_ATTRS}
+    f = io.BytesIO()
+    _ActorPickler(f, pickle.HIGHEST_PROTOCOL).dump((attrs, timers))
+    return f.getvalue()
+
+
+class Snapshot():
+    """Takes incremental snapshots of the Framework's Ahsms into a file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._versions = None   # {priority: version} as last written
+        self._child = None      # pid of the child writing the last frame
+        self._pending = None    # the versions the child's frame holds
+
+    @staticmethod
+    def _version(act):
+        """Returns a value that changes when the Ahsm dispatches or queues
+        an event.
+        """
+        return (act.dispatched, len(act.mq))
+
+    def take(self, full=False, background=True):
+        """Appends a frame holding every Ahsm that changed since
+        the previous take() (all Ahsms on the first take() or if full).
+        A full frame replaces the file's previous contents.
+        If background and os.fork() is available, a child process
+        writes the frame and take() returns without waiting for it.
+        """
+        self.wait()
+        versions = {act.priority: Snapshot._version(act)
+                    for act in Framework._ahsm_registry}
+        if full or self._versions is None:
+            changed = list(Framework._ahsm_registry)
+            removed = []
+            mode = "wb"
+        else:
+            changed = [act for act in Framework._ahsm_registry
+                       if self._versions.get(act.priority)
+                       != versions[act.priority]]
+            removed = [p for p in self._versions if p not in versions]
+            mode = "ab"
+
+        if background and hasattr(os, "fork"):
+            pid = os.fork()
+            if pid:
+                self._child = pid
+                self._pending = versions
+                return
+            status = 1
+            try:
+                self._write(changed, removed, mode)
+                status = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(status)
+        self._write(changed, removed, mode)
+        # Only a written frame moves the baseline of the next one,
+        # so a failed frame's changes go into the next frame
+        self._versions = versions
+
+    def _write(self, changed, removed, mode):
+        timers = _armed_timers()
+        frame = {
+            "time": Framework.time(),
+            "signals": list(Signal._lookup),
+            "actors": {act.priority: (act.__class__, _dump_actor(
+                           act, timers.get(act.priority, [])))
+                       for act in changed},
+            "removed": removed,
+        }
+        with open(self.path, mode) as f:
+            pickle.dump(frame, f, pickle.HIGHEST_PROTOCOL)
+
+    def wait(self):
+        """Waits for the child writing the previous frame, if any.
+        Raises RuntimeError if the child failed to write the frame;
+        the next take() then saves the changes the frame held.
+        """
+        if not self._child:
+            return
+        _, status = os.waitpid(self._child, 0)
+        self._child = None
+        versions, self._pending = self._pending, None
+        if status:
+            raise RuntimeError(
+                "Snapshot frame was not written to %s (exit status %d)"
+                % (self.path, os.waitstatus_to_exitcode(status)))
+        self._versions = versions
+
+
+def restore(path):
+    """Rebuilds the Ahsms saved in the snapshot file and adds them
+    to the Framework without running their init() chains.
+    TimeEvents are re-armed with the time they had remaining
+    when the last frame was taken.  Returns the restored Ahsms.
+    """
+    latest = {}
+    with open(path, "rb") as f:
+        while True:
+            try:
+                frame = pickle.load(f)
+            except EOFError:
+                break
+            for prio in frame["removed"]:
+                latest.pop(prio, None)
+            latest.update(frame["actors"])
+            t_snap = frame["time"]
+            sig_names = frame["signals"]
+
+    # Map the snapshot's signal ids to this process's signal ids
+    sig_map = {i: Signal.register(nm) for i, nm in enumerate(sig_names)}
+    remap = any(i != j for i, j in sig_map.items())
+
+    acts = {prio: cls.__new__(cls) for prio, (cls, _) in latest.items()}
+    now = Framework.time()
+    armed = []
+    restored = []
+    for prio in sorted(latest):
+        act = acts[prio]
+        attrs, timers = _ActorUnpickler(
+            io.BytesIO(latest[prio][1]), acts).load()
+        act.__dict__.update(attrs)
+        if remap:
+            # The queue entries and the events they wrap
+            queued = []
+            for e in act.mq:
+                queued.append(e)
+                while isinstance(e, (_QueuedEvent, _ComponentEvent,
+                                     _CoalescedEvent)):
+                    e = e.event
+                    queued.append(e)
+            evts = {id(e): e for e in queued
+                    + list(attrs.values()) + [te for te, _, _ in timers]
+                    if isinstance(e, BaseEvent)}
+            for evt in evts.values():
+                evt.signal = sig_map[evt.signal]
+            if "_coalesce" in attrs:
+                act._coalesce = {sig_map[sig] for sig in act._coalesce}
+                act._slots = {(comp, sig_map[sig]): slot
+                              for (comp, sig), slot in act._slots.items()}
+        Framework.add(act)
+        for te, expiration, interval in timers:
+            te.act = act
+            te.interval = interval
+            armed.append((now + max(0.0, expiration - t_snap), te))
+        restored.append(act)
+    _arm_all(armed)
+    Framework.run_to_completion()
+    return restored
+
+
+def _arm_all(armed):
+    """Merges the (expiration, TimeEvent) pairs into the Framework's
+    time events in one sort, rather than one insort per TimeEvent.
+    """
+    if not armed:
+        return
+    if Framework._tm_event_handle:
+        Framework._tm_event_handle.cancel()
+        Framework._tm_event_handle = None
+    # The sort is stable, so equal expirations keep their FIFO order
+    merged = sorted(list(zip(Framework._time_event_times,
+                             Framework._time_events)) + armed,
+                    key=lambda pair: pair[0])
+    Framework._time_event_times[:] = [t for t, _ in merged]
+    Framework._time_events[:] = [te for _, te in merged]
+    for t, te in armed:
+        Framework._index_time_event(te, t)
+    Framework._reschedule_time_events()
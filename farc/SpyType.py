@@ -0,0 +1,13 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+"""
+
+
+class SpyType(type):
+    """The metaclass of the Spy classes.  Spy forwards every hook
+    to the enabled Spy class, so hooks a Spy class does not implement
+    swallow their arguments and return None.
+    """
+
+    def __getattr__(cls, key):
+        return lambda *args, **kwargs: None
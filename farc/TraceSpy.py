@@ -0,0 +1,355 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+TraceSpy records fixed-size binary trace records into a preallocated
+ring, either in memory or in an mmap-backed file, so that tracing is
+cheap enough to leave enabled.  The names of signals, states and actors
+are written once, as dictionary entries, when they are first seen.
+
+Trace file layout (little-endian):
+    header      HEADER (magic, version, record size, capacity,
+                dictionary size, number of records written)
+    dictionary  DICT_ENTRY + utf-8 name, repeated; a zero kind ends it
+    ring        capacity * RECORD (timestamp, actor, state, signal, type)
+
+Decode a trace offline with:
+    python3 -m farc.TraceSpy trace.bin [--format text|vcd|npy] [-o out]
+"""
+
+
+import argparse
+import inspect
+import mmap
+import struct
+import sys
+
+from . import Signal
+from . import Framework
+from .SpyType import SpyType
+
+
+MAGIC = b"FARCTRC\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIIQ")
+DICT_ENTRY = struct.Struct("<BiH")
+# timestamp, actor (priority), state id, signal id, record type
+RECORD = struct.Struct("<diIIB3x")
+
+# Dictionary entry kinds
+DICT_SIGNAL = 1
+DICT_STATE = 2
+DICT_ACTOR = 3
+
+# Record types
+REC_POST = 1        # an event was posted to the actor's queue
+REC_DISPATCH = 2    # the actor, in the given state, starts handling an event
+REC_DONE = 3        # the actor finished handling an event; state is the result
+
+REC_NAMES = {REC_POST: "POST", REC_DISPATCH: "DISPATCH", REC_DONE: "DONE"}
+
+
+class _TraceBuffer():
+    """The trace buffer and its write position.
+    This state lives on an instance rather than on TraceSpy because
+    assigning class attributes on every record defeats CPython's
+    attribute cache and more than doubles the cost of a record.
+    """
+
+    def __init__(self, path, capacity, dict_size):
+        self.capacity = capacity
+        self.dict_size = dict_size
+        self.ring_offset = HEADER.size + dict_size
+        size = self.ring_offset + capacity * RECORD.size
+        if path:
+            self.file = open(path, "w+b")
+            self.file.truncate(size)
+            self.buf = mmap.mmap(self.file.fileno(), size)
+        else:
+            self.file = None
+            self.buf = bytearray(size)
+        self.dict_pos = HEADER.size
+        self.count = 0
+        self.state_ids = {}
+        self.time = Framework.time
+        self.write_header()
+
+    def write_header(self):
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, RECORD.size,
+                         self.capacity, self.dict_size, self.count)
+
+    def write_dict(self, kind, id, name):
+        """Appends a dictionary entry; drops it if the region is full.
+        """
+        name = name.encode()
+        end = self.dict_pos + DICT_ENTRY.size + len(name)
+        # Always leave room for the zero kind that ends the dictionary
+        if end < self.ring_offset:
+            DICT_ENTRY.pack_into(self.buf, self.dict_pos,
+                                 kind, id, len(name))
+            self.buf[end - len(name):end] = name
+            self.dict_pos = end
+
+    def state_id(self, st):
+        """Returns the id of the state handler, writing its
+        dictionary entry the first time the state is seen.
+        """
+        sid = self.state_ids.get(st)
+        if sid is None:
+            sid = len(self.state_ids)
+            self.state_ids[st] = sid
+            self.write_dict(DICT_STATE, sid, st.__qualname__)
+        return sid
+
+    def record(self, act, st, sig, rec_type, _pack_into=RECORD.pack_into):
+        i = self.count
+        self.count = i + 1
+        _pack_into(self.buf,
+                   self.ring_offset + (i % self.capacity) * RECORD.size,
+                   self.time(), act, st, sig, rec_type)
+
+    def close(self):
+        self.write_header()
+        if self.file:
+            self.buf.flush()
+            self.buf.close()
+            self.file.close()
+
+
+class TraceSpy(metaclass=SpyType):
+    """TraceSpy is a low-overhead tracing system that, if enabled,
+    writes one fixed-size binary record per event post, dispatch
+    and dispatch completion.  Once the ring is full, the oldest
+    records are overwritten.
+    """
+
+    _path = None
+    _capacity = 1 << 16
+    _dict_size = 1 << 16
+
+    # Per-class cache of each Hsm class's state handlers
+    _class_states = {}
+
+
+    @staticmethod
+    def configure(path=None, capacity=1 << 16, dict_size=1 << 16):
+        """Sets the trace file path (None keeps the trace in memory;
+        see save()), the number of records in the ring and the bytes
+        reserved for dictionary entries.
+        Call before Spy.enable_spy(TraceSpy).
+        """
+        TraceSpy._path = path
+        TraceSpy._capacity = capacity
+        TraceSpy._dict_size = dict_size
+
+
+    @staticmethod
+    def init():
+        """Allocates the trace buffer and writes the dictionary entries
+        for the signals that are already registered.
+        """
+        global _trace
+        _trace = _TraceBuffer(
+            TraceSpy._path, TraceSpy._capacity, TraceSpy._dict_size)
+        for nm, id in Signal._registry.items():
+            TraceSpy.on_signal_register(nm, id)
+
+
+    @staticmethod
+    def save(path):
+        """Writes the in-memory trace to a file
+        that the decoders in this module can read.
+        """
+        _trace.write_header()
+        with open(path, "wb") as f:
+            f.write(_trace.buf)
+
+
+    @staticmethod
+    def on_signal_register(signame, sigid):
+        _trace.write_dict(DICT_SIGNAL, sigid, signame)
+
+
+    @staticmethod
+    def on_framework_add(act):
+        _trace.write_dict(DICT_ACTOR, act.priority, act.__class__.__name__)
+        cls = act.__class__
+        states = TraceSpy._class_states.get(cls)
+        if states is None:
+            states = [st for _, st in inspect.getmembers(
+                          cls, predicate=inspect.isfunction)
+                      if hasattr(st, "farc_state")]
+            TraceSpy._class_states[cls] = states
+        for st in states:
+            _trace.state_id(st)
+
+
+    @staticmethod
+    def on_ahsm_post(act, evt):
+        _trace.record(act.priority, 0, evt.signal, REC_POST)
+
+
+    @staticmethod
+    def on_framework_dispatch_pre(act, evt):
+        _trace.record(act.priority, _trace.state_id(act._state),
+                      evt.signal, REC_DISPATCH)
+
+
+    @staticmethod
+    def on_framework_dispatch_post(act, evt):
+        _trace.record(act.priority, _trace.state_id(act._state),
+                      evt.signal, REC_DONE)
+
+
+    @staticmethod
+    def on_framework_stop():
+        """Updates the record count in the header and,
+        for a file-backed trace, flushes and closes the file.
+        """
+        _trace.close()
+        if TraceSpy._path:
+            print("TraceSpy file: %s" % TraceSpy._path)
+
+
+def read_trace(path):
+    """Reads a trace file.  Returns (names, records) where names is
+    a dict of {DICT_SIGNAL|DICT_STATE|DICT_ACTOR: {id: name}}
+    and records is a list of (timestamp, actor, state, signal, type)
+    tuples, oldest first.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, rec_size, capacity, dict_size, count = \
+        HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or rec_size != RECORD.size:
+        raise ValueError("%s is not a farc trace file" % path)
+
+    names = {DICT_SIGNAL: {}, DICT_STATE: {}, DICT_ACTOR: {}}
+    pos = HEADER.size
+    ring_offset = HEADER.size + dict_size
+    while pos + DICT_ENTRY.size <= ring_offset:
+        kind, id, n = DICT_ENTRY.unpack_from(data, pos)
+        if kind == 0:
+            break
+        pos += DICT_ENTRY.size
+        names[kind][id] = data[pos:pos + n].decode()
+        pos += n
+
+    n = min(count, capacity)
+    first = count % capacity if count > capacity else 0
+    records = [RECORD.unpack_from(
+                   data, ring_offset + ((first + i) % capacity) * rec_size)
+               for i in range(n)]
+    return names, records
+
+
+def to_text(path, out):
+    """Writes one line of text per trace record to the file object, out.
+    """
+    names, records = read_trace(path)
+    sigs, states, acts = (names[DICT_SIGNAL], names[DICT_STATE],
+                          names[DICT_ACTOR])
+    for t, act, st, sig, typ in records:
+        out.write("%.6f %s(%d) %s %s %s\n" % (
+            t, acts.get(act, "?"), act, REC_NAMES.get(typ, typ),
+            sigs.get(sig, sig),
+            states.get(st, st) if typ != REC_POST else ""))
+
+
+def to_vcd(path, vcd_path):
+    """Converts a trace into a VCD file with VcdSpy's var names.
+    A state's wire is high while its actor is in that state.
+    """
+    # Import vcd here so that pyvcd is only required for VCD output
+    import vcd # pip3 install pyvcd
+
+    names, records = read_trace(path)
+    if not records:
+        return
+    states, acts = names[DICT_STATE], names[DICT_ACTOR]
+    with open(vcd_path, "w") as f:
+        writer = vcd.VCDWriter(f, timescale="1 us",
+                               init_timestamp=round(1e6 * records[0][0]))
+        sig_vars = {}
+        for sigid, signame in names[DICT_SIGNAL].items():
+            sig_vars[sigid] = writer.register_var(
+                "tsk", "Sig%d_%s" % (sigid, signame), "event", size=1, init=0)
+        st_vars = {}
+        for act, sid in sorted({(r[1], r[2]) for r in records
+                                if r[4] != REC_POST}):
+            st_name = states.get(sid, str(sid)).rsplit(".", 1)[-1]
+            st_vars[(act, sid)] = writer.register_var(
+                "tsk", "St%d_%s_%s" % (act, acts.get(act, "?"), st_name),
+                "wire", size=1, init=0)
+        current = {}
+        for t, act, st, sig, typ in records:
+            ts = round(1e6 * t)
+            if typ == REC_DISPATCH:
+                writer.change(sig_vars[sig], ts, 1)
+            if typ != REC_POST and current.get(act) != st:
+                if act in current:
+                    writer.change(st_vars[(act, current[act])], ts, 0)
+                writer.change(st_vars[(act, st)], ts, 1)
+                current[act] = st
+        writer.close()
+
+
+def to_numpy(path):
+    """Returns the trace records as a NumPy structured array
+    with fields t, act, state, sig and type, oldest first.
+    """
+    # Import numpy here so that it is only required for array output
+    import numpy as np
+
+    with open(path, "rb") as f:
+        data = f.read()
+    _, _, _, capacity, dict_size, count = HEADER.unpack_from(data, 0)
+    dtype = np.dtype({"names": ["t", "act", "state", "sig", "type"],
+                      "formats": ["<f8", "<i4", "<u4", "<u4", "u1"],
+                      "offsets": [0, 8, 12, 16, 20],
+                      "itemsize": RECORD.size})
+    ring = np.frombuffer(data, dtype, capacity, HEADER.size + dict_size)
+    if count > capacity:
+        return np.roll(ring, -(count % capacity))
+    return ring[:count].copy()
+
+
+def to_pandas(path):
+    """Returns the trace records as a pandas DataFrame
+    with the signal, state, actor and record type names resolved.
+    """
+    # Import pandas here so that it is only required for DataFrame output
+    import pandas as pd
+
+    names, _ = read_trace(path)
+    df = pd.DataFrame(to_numpy(path))
+    df["sig_name"] = df["sig"].map(names[DICT_SIGNAL])
+    df["state_name"] = df["state"].map(names[DICT_STATE])
+    df["act_name"] = df["act"].map(names[DICT_ACTOR])
+    df["type_name"] = df["type"].map(REC_NAMES)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode a farc trace file")
+    parser.add_argument("trace", help="trace file written by TraceSpy")
+    parser.add_argument("--format", choices=("text", "vcd", "npy"),
+                        default="text")
+    parser.add_argument("-o", "--output",
+                        help="output file (text defaults to stdout)")
+    args = parser.parse_args()
+
+    if args.format == "text":
+        if args.output:
+            with open(args.output, "w") as out:
+                to_text(args.trace, out)
+        else:
+            to_text(args.trace, sys.stdout)
+    elif args.format == "vcd":
+        to_vcd(args.trace, args.output or args.trace + ".vcd")
+    else:
+        import numpy as np
+        np.save(args.output or args.trace + ".npy", to_numpy(args.trace))
+
+
+if __name__ == "__main__":
+    main()
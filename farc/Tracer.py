@@ -0,0 +1,185 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+Tracer records causal traces of the events flowing between Ahsms.
+An event posted from outside a state handler (by application code,
+an asyncio callback or a TimeEvent) starts a trace; every event posted
+or published while a handler of a traced event runs joins that trace
+as a child of the handler.  Each dispatch of a traced event records
+two spans: the event's time in the queue and the handler's run,
+so the end-to-end latency of a publish that fans out into chains
+of posts can be attributed to the Ahsms along the way.
+
+Sampling is decided once, at the head of a trace: the posts of an
+unsampled trace carry trace_id 0 and their dispatches record nothing.
+The trace context of a post is kept in the post's queue entry, not on
+the event, so an event may be posted again while still queued.
+
+The spans are written as OpenTelemetry (OTLP) JSON, one
+resourceSpans document, which trace viewers and the OpenTelemetry
+collector's file receiver can load offline.
+"""
+
+
+import collections
+import json
+import random
+import time
+
+from . import Framework, Signal
+
+
+# The trace context of handlers of events in unsampled traces
+_UNSAMPLED = (0, None)
+
+# OTLP's SPAN_KIND_INTERNAL and STATUS_CODE_ERROR
+_KIND_INTERNAL = 1
+_STATUS_ERROR = 2
+
+
+class Tracer():
+    """Records the spans of sampled traces in a Framework.
+    Call start() before the events of interest are posted;
+    tracing ends and the spans are written to path when
+    the Framework stops or stop() is called.
+    sample_rate is the fraction of traces recorded.
+    At most max_spans spans are kept; the oldest are dropped.
+    """
+
+    def __init__(self, path, sample_rate=1.0, max_spans=100000,
+                 framework=Framework, service_name="farc"):
+        assert 0.0 <= sample_rate <= 1.0
+        self.path = path
+        self.sample_rate = sample_rate
+        self.framework = framework
+        self.service_name = service_name
+        self.spans = collections.deque(maxlen=max_spans)
+        self.dropped = 0
+        # The trace context, (trace id, span id), of the running handler
+        self._current = None
+        self._random = random.Random()
+
+    def start(self):
+        # Converts Framework.time() to wall-clock time
+        self._epoch = time.time() - self.framework.time()
+        self.framework._tracer = self
+
+    def stop(self):
+        """Stops tracing and writes the spans to the file.
+        """
+        if self.framework._tracer is not self:
+            return
+        self.framework._tracer = None
+        self._current = None
+        self.write(self.path)
+
+    def on_stop(self):
+        self.stop()
+
+    def on_post(self, act, entry, evt):
+        """Sets the trace context of the queue entry of a post
+        of the event: the running handler's, else the one set on
+        the event, else that of a new trace.
+        """
+        current = self._current
+        if current is not None:
+            entry.trace_id, entry.parent_span = current
+        elif evt.trace_id is not None:
+            entry.trace_id, entry.parent_span = evt.trace_id, evt.parent_span
+        else:
+            # The head of a new trace
+            entry.parent_span = None
+            if self._random.random() < self.sample_rate:
+                entry.trace_id = self._random.getrandbits(128) or 1
+            else:
+                entry.trace_id = 0
+
+    def on_dispatch(self, act, entry, now):
+        """Makes the trace of the queue entry's post the context
+        of its handler.  Returns what on_handled() needs to end
+        the handler's span.
+        """
+        parent = self._current
+        trace_id = entry.trace_id
+        if not trace_id:
+            self._current = None if trace_id is None else _UNSAMPLED
+            return parent, None
+        rand = self._random.getrandbits
+        queue_span = rand(64)
+        handler_span = rand(64)
+        self._current = (trace_id, handler_span)
+        return parent, (queue_span, handler_span, entry.parent_span,
+                        entry.t_posted, now)
+
+    def on_handled(self, act, entry, span, exc=None):
+        """Restores the context of the handler that was running, if any,
+        and records the spans of the queue entry's post.  exc is
+        the exception that escaped the handler, if one did.
+        """
+        parent, span = span
+        self._current = parent
+        if span is None:
+            return
+        queue_span, handler_span, parent_span, t_posted, t_dispatched = span
+        end = self.framework._clock.time()
+        if len(self.spans) + 2 > self.spans.maxlen:
+            self.dropped += 2
+        trace_id = entry.trace_id
+        name = Signal._lookup[entry.signal]
+        if t_posted is None:
+            t_posted = t_dispatched
+        self.spans.append((trace_id, queue_span, parent_span,
+                           "queue " + name, t_posted, t_dispatched,
+                           act, None, None))
+        self.spans.append((trace_id, handler_span, queue_span,
+                           "handle " + name, t_dispatched, end,
+                           act, act._state.__name__,
+                           None if exc is None else repr(exc)))
+
+    def write(self, path):
+        """Writes the recorded spans to path as OTLP JSON.
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_otlp(), f)
+
+    def to_otlp(self):
+        """Returns the recorded spans as an OTLP JSON document.
+        """
+        epoch = self._epoch
+        spans = []
+        for (trace_id, span_id, parent_span, name, start, end,
+             act, state, error) in self.spans:
+            attrs = [_attr("farc.actor", act.__class__.__name__),
+                     _attr("farc.priority", act.priority)]
+            if state is not None:
+                attrs.append(_attr("farc.state", state))
+            span = {
+                "traceId": "%032x" % trace_id,
+                "spanId": "%016x" % span_id,
+                "name": name,
+                "kind": _KIND_INTERNAL,
+                "startTimeUnixNano": str(int((epoch + start) * 1e9)),
+                "endTimeUnixNano": str(int((epoch + end) * 1e9)),
+                "attributes": attrs,
+            }
+            if parent_span is not None:
+                span["parentSpanId"] = "%016x" % parent_span
+            if error is not None:
+                span["status"] = {"code": _STATUS_ERROR, "message": error}
+            spans.append(span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                _attr("service.name", self.service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "farc"},
+                "spans": spans,
+            }],
+        }]}
+
+
+def _attr(key, value):
+    """Returns an OTLP attribute; OTLP JSON encodes 64-bit ints as strings.
+    """
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    return {"key": key, "value": {"stringValue": str(value)}}
@@ -0,0 +1,312 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+Transports adapts asyncio transports to farc.  Each adapter is an
+asyncio protocol that turns received data into farc events, posted to
+an Ahsm or, if no Ahsm is given, published.  Data that arrives in the
+same pass of the event loop is delivered as one batch event.  When the
+receiving Ahsm's queue grows past high_water, the adapter pauses reading
+from the transport and resumes once the queue drains below low_water.
+Ahsms send through the adapter's writer, a QueuedWriter that holds data
+while the transport asks its protocol to pause writing.
+
+    DatagramAdapter     UDP or Unix datagram endpoints
+                        (loop.create_datagram_endpoint())
+    StreamAdapter       TCP or Unix stream connections and servers
+                        (loop.create_connection(), create_server(),
+                        create_unix_connection(), create_unix_server())
+    SubprocessAdapter   a child process's pipes (loop.subprocess_exec())
+
+For example:
+
+    loop.create_datagram_endpoint(
+        lambda: DatagramAdapter(relay, rx_signame="NET_RXD"),
+        local_addr=("localhost", 4242))
+
+Event values:
+    DatagramAdapter     rx: [(data, addr), ...]
+    StreamAdapter       rx: (adapter id, data received since the last batch)
+                        open, close: adapter id
+    SubprocessAdapter   rx: [(fd, data), ...]; close: the exit code
+    every adapter       err: str(exception)
+Adapter.get(id) returns a connected adapter, e.g. to reply through
+its writer.
+"""
+
+
+import asyncio
+import collections
+import itertools
+
+from . import Event, Framework, Signal
+
+
+class QueuedWriter():
+    """Queues data for a transport and writes it while the transport
+    has not asked to pause writing.  If more than max_queued writes
+    are waiting, further writes are dropped and counted.
+    """
+
+    def __init__(self, transport, max_queued=10000):
+        self.transport = transport
+        self.max_queued = max_queued
+        self.paused = False
+        self.dropped = 0
+        self._queue = collections.deque()
+        self._closing = False
+        # Datagram transports send with sendto()
+        self._sendto = getattr(transport, "sendto", None)
+
+    def write(self, data, addr=None):
+        """Queues the data (to addr for a datagram transport).
+        Returns False if the data was dropped.
+        """
+        if len(self._queue) >= self.max_queued or self._closing:
+            self.dropped += 1
+            return False
+        self._queue.append((data, addr))
+        if not self.paused:
+            self._drain()
+        return True
+
+    def queued(self):
+        return len(self._queue)
+
+    def close(self):
+        """Closes the transport once the queued data is written.
+        """
+        self._closing = True
+        if not self._queue:
+            self.transport.close()
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        self._drain()
+
+    def _drain(self):
+        q = self._queue
+        while q and not self.paused:
+            data, addr = q.popleft()
+            if self._sendto:
+                self._sendto(data, addr)
+            else:
+                self.transport.write(data)
+        if self._closing and not q:
+            self.transport.close()
+
+
+class Adapter():
+    """The batching and flow control common to all adapters.
+    act is the Ahsm that receives the events (None to publish them).
+    A batch is delivered as soon as it holds max_batch items,
+    otherwise batch_delay seconds after its first item arrived
+    (0 means at the end of the event loop's current pass).
+    asyncio reads at most one datagram per pass, so datagrams
+    are only batched with a batch_delay, e.g. 0.001.
+    While reading is paused, the queue depth is checked
+    every poll_interval seconds.
+    """
+
+    _ids = itertools.count(1)
+
+    # Connected adapters by id
+    _adapters = {}
+
+    def __init__(self, act=None, rx_signame="NET_RXD", err_signame="NET_ERR",
+                 open_signame=None, close_signame=None, max_batch=256,
+                 batch_delay=0.0, high_water=1000, low_water=100,
+                 poll_interval=0.005, max_queued=10000):
+        self.act = act
+        self.framework = act.framework if act else Framework
+        self.rx_sig = Signal.register(rx_signame)
+        self.err_sig = Signal.register(err_signame) if err_signame else None
+        self.open_sig = Signal.register(open_signame) if open_signame else None
+        self.close_sig = \
+            Signal.register(close_signame) if close_signame else None
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.high_water = high_water
+        self.low_water = low_water
+        self.poll_interval = poll_interval
+        self.max_queued = max_queued
+        self.id = next(Adapter._ids)
+        self.transport = None
+        self.writer = None
+        self.batches = 0    # number of batch events delivered
+        self.items = 0      # number of items in those batches
+        self.pauses = 0     # number of times reading was paused
+        self.reading_paused = False
+        self._batch = []
+        self._flush_handle = None
+
+    @staticmethod
+    def get(adapter_id):
+        """Returns the connected adapter having the given id.
+        """
+        return Adapter._adapters[adapter_id]
+
+    def _post(self, sig, value):
+        evt = Event(sig, value)
+        if self.act:
+            self.act.post_fifo(evt)
+        else:
+            self.framework.publish(evt)
+
+    def _depth(self):
+        """Returns the deepest queue among the receiving Ahsms.
+        """
+        if self.act:
+            return len(self.act.mq)
+        return max((len(act.mq) for act in
+                    self.framework.subscribers(self.rx_sig)), default=0)
+
+    def _add(self, item):
+        """Adds a received item to the batch.
+        """
+        self._batch.append(item)
+        if len(self._batch) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            if self.batch_delay:
+                self._flush_handle = loop.call_later(
+                    self.batch_delay, self._flush)
+            else:
+                self._flush_handle = loop.call_soon(self._flush)
+
+    def _flush(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        self.batches += 1
+        self.items += len(batch)
+        self._post(self.rx_sig, self._batch_value(batch))
+        if not self.reading_paused and self._depth() >= self.high_water:
+            self.reading_paused = True
+            self.pauses += 1
+            self._pause_reading()
+            asyncio.get_running_loop().call_later(
+                self.poll_interval, self._check_resume)
+
+    def _batch_value(self, batch):
+        return batch
+
+    def _check_resume(self):
+        if self.transport is None:
+            return
+        if self._depth() <= self.low_water:
+            self.reading_paused = False
+            self._resume_reading()
+        else:
+            asyncio.get_running_loop().call_later(
+                self.poll_interval, self._check_resume)
+
+    def _pause_reading(self):
+        self.transport.pause_reading()
+
+    def _resume_reading(self):
+        self.transport.resume_reading()
+
+    # asyncio protocol callbacks common to all transports
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.writer = QueuedWriter(transport, self.max_queued)
+        Adapter._adapters[self.id] = self
+        if self.open_sig is not None:
+            self._post(self.open_sig, self.id)
+
+    def connection_lost(self, exc):
+        self._flush()
+        Adapter._adapters.pop(self.id, None)
+        self.transport = None
+        if exc is not None and self.err_sig is not None:
+            self._post(self.err_sig, str(exc))
+        if self.close_sig is not None:
+            self._post(self.close_sig, self._close_value())
+
+    def _close_value(self):
+        return self.id
+
+    def pause_writing(self):
+        if self.writer:
+            self.writer.pause()
+
+    def resume_writing(self):
+        if self.writer:
+            self.writer.resume()
+
+
+class DatagramAdapter(Adapter, asyncio.DatagramProtocol):
+    """Delivers received datagrams as lists of (data, addr).
+    Reply with adapter.writer.write(data, addr).
+    """
+
+    def datagram_received(self, data, addr):
+        self._add((data, addr))
+
+    def error_received(self, exc):
+        if self.err_sig is not None:
+            self._post(self.err_sig, str(exc))
+
+
+class StreamAdapter(Adapter, asyncio.Protocol):
+    """Delivers the bytes received on a stream connection as
+    (adapter id, data), where data is everything received
+    since the previous event.
+    """
+
+    def data_received(self, data):
+        self._add(data)
+
+    def eof_received(self):
+        self._flush()
+        # Let the transport close itself
+        return False
+
+    def _batch_value(self, batch):
+        return (self.id, b"".join(batch))
+
+
+class SubprocessAdapter(Adapter, asyncio.SubprocessProtocol):
+    """Delivers a child process's output as lists of (fd, data).
+    Write to the child's stdin with adapter.writer.write(data).
+    The close event's value is the child's exit code.
+    """
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        stdin = transport.get_pipe_transport(0)
+        self.writer = QueuedWriter(stdin, self.max_queued) if stdin else None
+
+    def pipe_data_received(self, fd, data):
+        self._add((fd, data))
+
+    def process_exited(self):
+        self._flush()
+        code = self.transport.get_returncode()
+        Adapter._adapters.pop(self.id, None)
+        if self.close_sig is not None:
+            self._post(self.close_sig, code)
+
+    def connection_lost(self, exc):
+        # The close event is posted by process_exited()
+        pass
+
+    def _pipes(self):
+        return [p for p in (self.transport.get_pipe_transport(fd)
+                            for fd in (1, 2)) if p]
+
+    def _pause_reading(self):
+        for pipe in self._pipes():
+            pipe.pause_reading()
+
+    def _resume_reading(self):
+        for pipe in self._pipes():
+            pipe.resume_reading()
@@ -6,16 +6,64 @@ Copyright 2018 Dean Hall.  See LICENSE file for details.
 import datetime
 import inspect
 import tempfile
+import warnings
 
 from . import Signal
 from . import Framework
+from .BufferedWriter import BufferedWriter
+from .SpyType import SpyType
+
+class _VcdSink():
+    """Formats VcdSpy's (timestamp, key, value) records
+    into a VCD file on BufferedWriter's background thread.
+    """
+
+    def __init__(self, var_decls):
+        # key:(scope, name, var_type, size, init) shared with VcdSpy
+        self._var_decls = var_decls
+        # True once the current file's header (its var declarations)
+        # is written; vars declared after that are not in the file
+        self.header_written = False
+
+    def open(self, path):
+        datestring = datetime.datetime.isoformat(datetime.datetime.now())
+        self._file = open(path, "w")
+        self._writer = None
+        self._date = datestring
+        self._vars = {}
+        self.header_written = False
+
+    def _open_writer(self, ts):
+        # Set before copying the declarations so that VcdSpy warns
+        # about any var declared too late to be copied
+        self.header_written = True
+        self._writer = vcd.VCDWriter(
+                self._file, timescale='1 us', date=self._date,
+                init_timestamp=ts)
+        for key, decl in self._var_decls.copy().items():
+            self._vars[key] = self._writer.register_var(*decl[:3],
+                size=decl[3], init=decl[4])
+
+    def write(self, record):
+        t, key, value = record
+        ts = round(1e6 * t)
+        if self._writer is None:
+            self._open_writer(ts)
+        var = self._vars.get(key)
+        if var is None:
+            # The var was declared after this file's header was written
+            # (VcdSpy warned then); it appears after the next rotation
+            return
+        self._writer.change(var, ts, value)
+
+    def size(self):
+        return self._file.tell()
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+        self._file.close()
 
-class SpyType(type):
-    # This is used so that unimplemented static methods
-    #  swallow their arguments and return None
-    def __getattr__(cls, key):
-        # print(f'Called class attribute {key}')
-        return lambda *args, **kwargs: None
 
 class VcdSpy(metaclass=SpyType):
     """VcdSpy is a visual tracing system that, if enabled,
@@ -23,12 +71,34 @@ class VcdSpy(metaclass=SpyType):
     application such as GTKWave allows you to see a timeline of
     [A]Hsms, states, signals and any instrumented debug IDs
     which will help you make sense of what happened at run time.
+    The loop thread only appends (timestamp, var, value) records
+    to a buffer; a BufferedWriter formats and writes them
+    to the file on a background thread.
     """
 
+    _path = None
+    _max_bytes = 0
+    _backup_count = 0
+
+    # Per-class cache of each Hsm class's (name, state) pairs
+    _class_states = {}
+
+
+    @staticmethod
+    def configure(path=None, max_bytes=0, backup_count=0):
+        """Sets the VCD output path (a temporary file if None),
+        the size in bytes at which the file is rotated (0 to never rotate)
+        and the number of rotated files to keep.
+        Call before Spy.enable_spy(VcdSpy).
+        """
+        VcdSpy._path = path
+        VcdSpy._max_bytes = max_bytes
+        VcdSpy._backup_count = backup_count
+
 
     @staticmethod
     def init():
-        """Creates a temporary file to hold VCD data
+        """Starts the background writer for the VCD file
         and registers variables that will be written to it.
         """
         # VcdSpy: Import vcd here (rather than at top of file)
@@ -36,14 +106,18 @@ class VcdSpy(metaclass=SpyType):
         global vcd
         import vcd # pip3 install pyvcd
 
-        datestring = datetime.datetime.isoformat(datetime.datetime.now())
-        VcdSpy._vcd_file = tempfile.NamedTemporaryFile(
-                mode='w', suffix=".vcd", delete=False)
-        VcdSpy._vcd_writer = vcd.VCDWriter(
-                VcdSpy._vcd_file, timescale='1 us', date=datestring,
-                init_timestamp=VcdSpy._get_timestamp())
-        VcdSpy._vcd_var_state = {}
-        VcdSpy._vcd_var_sig = {}
+        path = VcdSpy._path
+        if path is None:
+            with tempfile.NamedTemporaryFile(
+                    mode='w', suffix=".vcd", delete=False) as f:
+                path = f.name
+        VcdSpy._vcd_var_decls = {}
+        VcdSpy._sink = _VcdSink(VcdSpy._vcd_var_decls)
+        VcdSpy._writer = BufferedWriter(
+                VcdSpy._sink, path,
+                VcdSpy._max_bytes, VcdSpy._backup_count)
+        VcdSpy._append = VcdSpy._writer.append
+        VcdSpy._time = Framework.time
         # Handle signals that were registered before
         # the application selected VcdSpy as the Spy class
         for nm, id in Signal._registry.items():
@@ -51,71 +125,89 @@ class VcdSpy(metaclass=SpyType):
 
 
     @staticmethod
-    def _get_timestamp():
-        """Returns microsecond timestamp as an integer
+    def _declare(decls):
+        """Declares the VCD vars, a dict of key:decl.  VCD declares
+        every var in the file's header, so vars declared after the header
+        was written cannot be traced in the current file; warns instead
+        of dropping them silently.
+        """
+        VcdSpy._vcd_var_decls.update(decls)
+        if VcdSpy._sink.header_written:
+            warnings.warn(
+                "VcdSpy: %s declared after the header of %s was written; "
+                "traced only after the file is rotated (see "
+                "VcdSpy.configure(max_bytes=...)).  Start Ahsms and "
+                "register signals before the first event to trace them."
+                % (", ".join(d[1] for d in decls.values()),
+                   VcdSpy._writer.path), RuntimeWarning, stacklevel=3)
+
+
+    @staticmethod
+    def _get_states(cls):
+        """Returns the (name, state) pairs of the given Hsm class.
+        The result is cached per class so that adding
+        many instances of one class is cheap.
         """
-        return round(1e6 * Framework._event_loop.time())
+        states = VcdSpy._class_states.get(cls)
+        if states is None:
+            states = [(nm, st) for nm, st in inspect.getmembers(
+                          cls, predicate=inspect.isfunction)
+                      if hasattr(st, "farc_state")]
+            VcdSpy._class_states[cls] = states
+        return states
 
 
     @staticmethod
     def on_framework_add(act):
-        """Registers the given Ahsm and creates VCDWriter vars
+        """Registers the given Ahsm and declares the VCD vars
         used to trace the Ahsm's execution and state.
         """
         # for each state in the Actor's state machine
-        for nm, st in inspect.getmembers(
-                act.__class__, predicate=inspect.isfunction):
-            if hasattr(st, "farc_state"):
-                st_lbl = "St%d_%s_%s" % (
-                    act.priority, act.__class__.__name__, nm)
-                act_var = VcdSpy._vcd_writer.register_var(
-                    "tsk", st_lbl, "wire", size=1, init=0)
-                VcdSpy._vcd_var_state[st.__hash__()] = act_var
+        decls = {}
+        for nm, st in VcdSpy._get_states(act.__class__):
+            st_lbl = "St%d_%s_%s" % (
+                act.priority, act.__class__.__name__, nm)
+            decls[st] = ("tsk", st_lbl, "wire", 1, 0)
+        VcdSpy._declare(decls)
 
 
     @staticmethod
     def on_framework_stop():
-        """Closes the VcdWriter file and prints the filename to stdout
+        """Flushes and closes the VCD file and prints the filename to stdout
         """
-        fn = VcdSpy._vcd_file.name
-        VcdSpy._vcd_writer.close()
-        VcdSpy._vcd_file.close()
-        print("VcdSpy file: %s" % fn)
+        VcdSpy._writer.close()
+        print("VcdSpy file: %s" % VcdSpy._writer.path)
 
 
     @staticmethod
     def on_hsm_dispatch_event(evt):
-        """Writes changes to the VCD file for the given Event
+        """Buffers a change for the given Event
         """
-        ts = VcdSpy._get_timestamp()
-        VcdSpy._vcd_writer.change(VcdSpy._vcd_var_sig[evt.signal], ts, 1)
+        VcdSpy._append((VcdSpy._time(), evt.signal, 1))
 
 
     @staticmethod
     def on_hsm_dispatch_pre(st):
-        """Writes changes to the VCD file for pre-dispatch
+        """Buffers a change for pre-dispatch
         of an event to the given State
         """
-        ts = VcdSpy._get_timestamp()
-        act_var = VcdSpy._vcd_var_state[st.__hash__()]
-        VcdSpy._vcd_writer.change(act_var, ts, 1)
+        VcdSpy._append((VcdSpy._time(), st, 1))
 
 
     @staticmethod
     def on_hsm_dispatch_post(st_list):
-        """Writes changes to the VCD file for post-dispatch.
+        """Buffers changes for post-dispatch.
         Argument is a list of state handlers
         """
-        ts = VcdSpy._get_timestamp()
+        ts = VcdSpy._time()
+        append = VcdSpy._append
         for st in st_list:
-            act_var = VcdSpy._vcd_var_state[st.__hash__()]
-            VcdSpy._vcd_writer.change(act_var, ts, 0)
+            append((ts, st, 0))
 
 
     @staticmethod
     def on_signal_register(signame, sigid):
-        """Registers a signal with the VcdWriter when that signal is registered with farc
+        """Declares a VCD var for a signal when that signal is registered with farc
         """
         sig_lbl = "Sig%d_%s" % (sigid, signame)
-        VcdSpy._vcd_var_sig[sigid] = VcdSpy._vcd_writer.register_var(
-            "tsk", sig_lbl, "event", size=1, init=0)
+        VcdSpy._declare({sigid: ("tsk", sig_lbl, "event", 1, 0)})
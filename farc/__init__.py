@@ -1 +1 @@
-from .farc import Spy, Signal, Event, Hsm, Framework, run_forever, Ahsm, TimeEvent
+from .farc import Spy, Signal, SignalNotRegistered, BaseEvent, Event, Hsm, Fsm, Framework, run_forever, Ahsm, Afsm, TimeEvent, Clock, VirtualClock, PriorityBand
@@ -1,11 +1,19 @@
 # Copyright 2016, Dean Hall.  See LICENSE for details.
 
-import asyncio
+# asyncio and tempfile are imported where they are first needed
+# so that importing farc stays cheap
 import bisect
 import collections
+import heapq
+import itertools
+import os
 import pickle
+import _thread
 import signal
+import sys
+import warnings
 from functools import wraps
+from time import perf_counter
 
 
 class Spy():
@@ -26,20 +34,41 @@ class Spy():
         """Sets the Spy to use the given class
         and calls its initializer.
         """
+        # Forget the methods resolved for the previous Spy class
+        Spy.__dict__.clear()
         Spy._actv_cls = spy_cls
         spy_cls.init()
 
+    @staticmethod
+    def disable_spy():
+        """Returns the Spy system to doing nothing.
+        """
+        Spy.__dict__.clear()
+
     def __getattr__(*args):
         """Returns
         1) the enable_spy static method if requested by name, or
         2) the attribute from the active class (if active class was set), or
         3) a function that swallows any arguments and does nothing.
+        The result is cached on the Spy instance so that
+        later calls to the same Spy.on_*() skip this method.
         """
         if args[1] == "enable_spy":
             return Spy.enable_spy
         if Spy._actv_cls:
-            return getattr(Spy._actv_cls, args[1])
-        return lambda *x: None
+            attr = getattr(Spy._actv_cls, args[1])
+        else:
+            attr = _spy_nop
+        if args[1].startswith("on_"):
+            args[0].__dict__[args[1]] = attr
+        return attr
+
+
+def _spy_nop(*args):
+    """The inert Spy.on_*() method; shared to avoid
+    creating a lambda on every call while Spy is disabled.
+    """
+    return None
 
 
 # Singleton pattern:
@@ -50,15 +79,33 @@ class Spy():
 Spy = Spy()
 
 
+class SignalNotRegistered(AttributeError, KeyError):
+    """Raised for an unregistered signal name, e.g. Signal.NO_SUCH.
+    An AttributeError, so hasattr() and getattr() with a default work,
+    and a KeyError, as it was before Signal names became attributes.
+    """
+
+
 class Signal():
     """An asynchronous stimulus that triggers reactions.
     A unique identifier that, along with a value, specifies an Event.
     p. 154
+    Each registered signal is an attribute of Signal (Signal.ENTRY),
+    so reading one is a plain attribute read.  State handlers may
+    also keep the ids in module globals:
+        TICK, TOCK = Signal.register_many("TICK", "TOCK")
     """
 
     _registry = {}  # signame:str to sigid:int
     _lookup = []    # sigid:int to signame:str
 
+    # Registration may happen from several threads.
+    # (_thread is used rather than threading to keep importing farc cheap)
+    _lock = _thread.allocate_lock()
+
+    # Once frozen, new signals can not be registered
+    _frozen = False
+
     @staticmethod
     def exists(signame):
         """Returns True if signame is in the Signal registry."""
@@ -70,24 +117,59 @@ class Signal():
         Returns the signal number for the signame.
         """
         assert type(signame) is str
-        if signame in Signal._registry:
+        sigid = Signal._registry.get(signame)
+        if sigid is not None:
             # TODO: emit warning that signal is already registered
-            sigid = Signal._registry[signame]
-        else:
-            sigid = len(Signal._lookup)
-            Signal._registry[signame] = sigid
-            Signal._lookup.append(signame)
-            Spy.on_signal_register(signame, sigid)
+            return sigid
+        with Signal._lock:
+            sigid = Signal._registry.get(signame)
+            if sigid is None:
+                if Signal._frozen:
+                    raise RuntimeError(
+                        "Signal %s registered after Signal.freeze()" % signame)
+                sigid = len(Signal._lookup)
+                Signal._lookup.append(signame)
+                Signal._registry[signame] = sigid
+                # Make the signal an attribute, unless that would
+                # hide one of Signal's own attributes
+                if not hasattr(Signal.__class__, signame):
+                    Signal.__dict__[signame] = sigid
+            else:
+                return sigid
+        # Outside the lock, so a Spy may register signals of its own
+        Spy.on_signal_register(signame, sigid)
         return sigid
 
+    @staticmethod
+    def register_many(*signames):
+        """Registers each of the signames.
+        Returns a tuple of their signal numbers, in the same order.
+        """
+        return tuple(Signal.register(nm) for nm in signames)
+
+    @staticmethod
+    def freeze():
+        """Prevents any more signals from being registered,
+        e.g. once the application has started.  Registering a new
+        signal afterwards raises a RuntimeError; registering
+        an existing signal still returns its number.
+        """
+        Signal._frozen = True
+
     @staticmethod
     def to_str(sigid):
         """Returns the signame:str for the given sigid:int."""
         return Signal._lookup[sigid]
 
     def __getattr__(self, signame):
-        assert type(signame) is str
-        return Signal._registry[signame]
+        """Only called for names that are not registered signals
+        (or that are hidden by Signal's own attributes).
+        """
+        try:
+            return Signal._registry[signame]
+        except KeyError:
+            raise SignalNotRegistered(
+                "Signal %s is not registered" % signame) from None
 
 
 # Singleton pattern:
@@ -106,7 +188,39 @@ Signal.register("SIGINT")   # (i.e. Ctrl+C)
 Signal.register("SIGTERM")  # (i.e. kill <pid>)
 
 
-class Event():
+class BaseEvent():
+    """The fields the Framework reads from every event it queues,
+    with their defaults.  Event, TimeEvent and other event-like classes
+    (e.g. ActorArray's BatchEvent) derive from it and set signal
+    and value.
+    """
+    # Time (Framework.time()) after which the event is stale:
+    # it is dropped when dequeued instead of being dispatched.
+    # Set it directly, or set ttl (seconds) to make each post of the
+    # event stale ttl seconds after that post.  Framework.set_ttl()
+    # gives every event of a signal a ttl.
+    deadline = None
+    ttl = None
+
+    # Set by Framework.request(): the Framework waiting for
+    # the reply and the id that correlates the reply with the request
+    reply_to = None
+    request_id = None
+
+    # The trace (see farc.Tracer) to post the event in: the id of
+    # the trace and the span that caused the event.  Set them before
+    # posting the event from outside a handler to continue an existing
+    # trace; posts from a handler join the handler's trace.
+    trace_id = None
+    parent_span = None
+
+    # Time (Framework.time()) of the post.  Only set on the queue
+    # entries that carry a post's own deadline, time and trace
+    # (see Framework._queue_entry()), never on the event itself.
+    t_posted = None
+
+
+class Event(BaseEvent):
     """Events are a coupling of a signal and a value.
     Events are passed from one AHSM to another.
     Signals are defined in each AHSM's source code by name,
@@ -118,6 +232,7 @@ class Event():
     by other AHSMs.  Each AHSM state (static method) accepts an Event
     as the parameter and handles the event based on its Signal.
     """
+
     def __init__(self, sigid, val):
         assert 0 <= sigid <= len(Signal._lookup)
         self.signal = sigid
@@ -164,6 +279,10 @@ class Hsm():
     RET_TRAN = 2
     RET_SUPER = 3
 
+    # The Ahsm that owns this Hsm as an orthogonal component
+    # (see Ahsm.add_component()), if any
+    container = None
+
     def __init__(self):
         """Sets this Hsm's current state to Hsm.top(), the default state
         and stores the given initial state.
@@ -364,6 +483,450 @@ class Hsm():
         # Restore the state
         self._state = t
 
+    def post_fifo(self, evt):
+        """Posts the event to this component through its container's
+        queue.  The container dispatches it straight to this component.
+        """
+        assert self.container, "Only components and Ahsms have a queue"
+        self.container.post_fifo(_ComponentEvent(self, evt))
+
+    def post_lifo(self, evt):
+        """Posts the event to this component through its container's
+        queue, ahead of the events already there.
+        """
+        assert self.container, "Only components and Ahsms have a queue"
+        self.container.post_lifo(_ComponentEvent(self, evt))
+
+
+class Fsm(Hsm):
+    """A flat (non-hierarchical) Finite State Machine.
+    Dispatch calls the current state's handler once; a transition
+    runs the EXIT action of the current state and the ENTRY action of
+    the target, without the superstate probing an Hsm does.
+    State handlers are decorated with @Fsm.state and return
+    handled(), ignored() or tran(); they have no superstate.
+    """
+
+    def state(func):
+        """A decorator that identifies which methods are states.
+        Unlike Hsm.state, it does not wrap the handler,
+        so state handler calls are not reported to the Spy.
+        """
+        func.farc_state = True
+        return staticmethod(func)
+
+    def ignored(self, event): return Hsm.RET_IGNORED
+
+    def init(self):
+        """Transitions to the initial state and performs its ENTRY action.
+        """
+        self._initial_state(self, Event.INIT)
+        self._state(self, Event.ENTRY)
+
+    def dispatch(self, event):
+        """Dispatches the given event to the current state's handler
+        and performs any transition the handler requests.
+        """
+        s = self._state
+        if s(self, event) == Hsm.RET_TRAN:
+            t = self._state
+            s(self, Event.EXIT)
+            t(self, Event.ENTRY)
+            self._state = t
+        else:
+            self._state = s
+
+
+class ActorMetrics():
+    """Queue statistics for one Ahsm.
+    The counters are updated incrementally as events are posted
+    and dispatched, so reading them is cheap.
+    An Ahsm only has an ActorMetrics while
+    Framework.enable_metrics() is in effect.
+    When an ActorMetrics first changes after being read,
+    it adds itself to the dirty set it was given,
+    so readers need only look at the ones that changed.
+    """
+
+    # Upper bound (seconds) of each bin of the post-to-dispatch
+    # latency histogram.  The last bin catches everything slower.
+    LATENCY_BINS = (10e-6, 100e-6, 1e-3, 10e-3, 100e-3, 1.0, float("inf"))
+
+    # Upper bound (seconds) of each bin of the handler time histogram
+    HANDLER_BINS = (1e-6, 2e-6, 5e-6, 10e-6, 20e-6, 50e-6, 100e-6, 200e-6,
+                    500e-6, 1e-3, 10e-3, 100e-3, 1.0, float("inf"))
+
+    def __init__(self, now, act=None, dirty=None):
+        self.act = act
+        self.dirty = dirty
+        self.is_dirty = False
+        self.reset(now)
+
+    def reset(self, now):
+        """Zeroes all counters and restarts the rate measurement at now.
+        """
+        self.t_reset = now
+        self.posted = 0
+        self.dispatched = 0
+        self.depth_hwm = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_hist = [0] * len(ActorMetrics.LATENCY_BINS)
+        self.handler_sum = 0.0
+        self.handler_hist = [0] * len(ActorMetrics.HANDLER_BINS)
+        self.timers_fired = 0
+        self.expired = 0
+        self.coalesced = 0
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        if not self.is_dirty and self.dirty is not None:
+            self.is_dirty = True
+            self.dirty.add(self)
+
+    def on_post(self, depth):
+        """Counts a post and tracks the queue's high-water mark.
+        """
+        self.posted += 1
+        if depth > self.depth_hwm:
+            self.depth_hwm = depth
+        if not self.is_dirty:
+            self.mark_dirty()
+
+    def on_dispatch(self, entry, now):
+        """Accumulates the time the queue entry spent in the queue.
+        """
+        self.dispatched += 1
+        if entry.t_posted is not None:
+            latency = now - entry.t_posted
+            self.latency_sum += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+            self.latency_hist[
+                bisect.bisect_left(ActorMetrics.LATENCY_BINS, latency)] += 1
+
+    def on_handled(self, duration):
+        """Accumulates the time the state handlers took for one event.
+        """
+        self.handler_sum += duration
+        self.handler_hist[
+            bisect.bisect_left(ActorMetrics.HANDLER_BINS, duration)] += 1
+        if not self.is_dirty:
+            self.mark_dirty()
+
+    def on_timer(self):
+        self.timers_fired += 1
+
+    def on_expired(self):
+        self.expired += 1
+        if not self.is_dirty:
+            self.mark_dirty()
+
+    def on_coalesced(self):
+        """Counts a post that replaced a queued event.
+        """
+        self.posted += 1
+        self.coalesced += 1
+        if not self.is_dirty:
+            self.mark_dirty()
+
+    def handler_percentile(self, q):
+        """Returns the upper bound of the handler time histogram bin
+        holding the q-th (0.0..1.0) fraction of the dispatches.
+        """
+        total = sum(self.handler_hist)
+        if not total:
+            return 0.0
+        seen = 0
+        for bound, n in zip(ActorMetrics.HANDLER_BINS, self.handler_hist):
+            seen += n
+            if seen >= q * total:
+                return bound
+        return ActorMetrics.HANDLER_BINS[-1]
+
+    def snapshot(self, depth, now):
+        """Returns a dict of the counters and the derived rates.
+        """
+        elapsed = now - self.t_reset
+        return {
+            "depth": depth,
+            "depth_hwm": self.depth_hwm,
+            "posted": self.posted,
+            "dispatched": self.dispatched,
+            "events_per_sec": self.dispatched / elapsed if elapsed > 0 else 0.0,
+            "latency_avg": (self.latency_sum / self.dispatched
+                            if self.dispatched else 0.0),
+            "latency_max": self.latency_max,
+            "latency_hist": list(zip(ActorMetrics.LATENCY_BINS,
+                                     self.latency_hist)),
+            "handler_p50": self.handler_percentile(0.5),
+            "handler_p90": self.handler_percentile(0.9),
+            "handler_p99": self.handler_percentile(0.99),
+            "timers_fired": self.timers_fired,
+            "expired": self.expired,
+            "coalesced": self.coalesced,
+        }
+
+
+class FlightRecorder():
+    """Keeps the most recent dispatches of one Ahsm:
+    when each event was dispatched, its signal, the state the Ahsm
+    was left in and how long the handlers took.  A dispatch that
+    raised keeps the state whose handler raised and the exception.
+    The rings are allocated once, so recording is cheap enough
+    to leave on all the time.
+    """
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.count = 0  # Total number of dispatches recorded
+        self.times = [0.0] * depth
+        self.signals = [0] * depth
+        self.states = [None] * depth
+        self.durations = [0.0] * depth
+        self.errors = [None] * depth
+
+    def record(self, t, sig, state, duration, error=None):
+        i = self.count % self.depth
+        self.times[i] = t
+        self.signals[i] = sig
+        self.states[i] = state
+        self.durations[i] = duration
+        self.errors[i] = error
+        self.count += 1
+
+    def entries(self, errors=False):
+        """Returns the recorded (time, signal, state, duration) tuples,
+        oldest first.  If errors, each tuple also has the repr()
+        of the exception that escaped the handlers, or None.
+        """
+        n = min(self.count, self.depth)
+        first = self.count - n
+        d = self.depth
+        if errors:
+            return [(self.times[i % d], self.signals[i % d],
+                     self.states[i % d], self.durations[i % d],
+                     self.errors[i % d])
+                    for i in range(first, first + n)]
+        return [(self.times[i % d], self.signals[i % d],
+                 self.states[i % d], self.durations[i % d])
+                for i in range(first, first + n)]
+
+
+class Clock():
+    """The Framework's source of time.
+    All of farc's time reads and TimeEvent scheduling go through
+    Framework's clock.  This one is the event loop's real-time clock.
+    """
+
+    # The Framework using this clock; set by Framework.set_clock()
+    framework = None
+
+    def time(self):
+        fw = self.framework
+        return (fw._event_loop or fw.bind()).time()
+
+    def call_at(self, when, callback, *args):
+        """Schedules callback(*args) at the given time.
+        Returns a handle having a cancel() method.
+        """
+        fw = self.framework
+        return (fw._event_loop or fw.bind()).call_at(when, callback, *args)
+
+
+class VirtualClock(Clock):
+    """A simulated clock for running timer-heavy systems
+    faster than real time.  Whenever every Ahsm's queue is empty,
+    the clock jumps straight to the earliest pending callback's time
+    (a TimeEvent's expiration or a request's timeout).
+    If stop_at is given, the Framework is stopped instead of
+    advancing the clock past that time.
+    """
+
+    class _Handle():
+        def __init__(self):
+            self.cancelled = False
+
+        def cancel(self):
+            self.cancelled = True
+
+    def __init__(self, start=0.0, stop_at=None):
+        self.now = start
+        self.stop_at = stop_at
+        # The pending callbacks, a heap of
+        # (time, sequence number, handle, callback, args)
+        self._pending = []
+        self._seq = itertools.count()
+        self._advance_scheduled = False
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback, *args):
+        handle = VirtualClock._Handle()
+        heapq.heappush(self._pending,
+                       (when, next(self._seq), handle, callback, args))
+        self._schedule_advance()
+        return handle
+
+    def _schedule_advance(self):
+        if not self._advance_scheduled:
+            self._advance_scheduled = True
+            self.framework._event_loop.call_soon(self._advance)
+
+    def _advance(self):
+        """Runs the earliest pending callback at its virtual time
+        once the Ahsms are idle.
+        """
+        self._advance_scheduled = False
+        pending = self._pending
+        while pending and pending[0][2].cancelled:
+            heapq.heappop(pending)
+        if not pending:
+            return
+        fw = self.framework
+        if any(act.has_msgs() for act in fw._ahsm_registry):
+            self._schedule_advance()
+            return
+        when, _, handle, callback, args = heapq.heappop(pending)
+        if self.stop_at is not None and when > self.stop_at:
+            self.now = self.stop_at
+            fw.stop()
+            return
+        if when > self.now:
+            self.now = when
+        callback(*args)
+        if pending:
+            self._schedule_advance()
+
+
+class PriorityBand():
+    """A range of priorities, lo <= priority < hi, handed out to Ahsms
+    started with the band instead of a priority (see Ahsm.start()).
+    A priority returns to the band when its Ahsm ends, and the lowest
+    returned priority is handed out first.
+    For actors that are created and ended at high rates, e.g. sessions.
+    """
+
+    def __init__(self, lo, hi):
+        assert lo < hi
+        self.lo = lo
+        self.hi = hi
+        self._next = lo     # lowest priority never handed out
+        self._free = []     # heap of returned priorities
+
+    def allocate(self, framework):
+        """Returns a priority of the band not in use in the Framework.
+        Raises ValueError if every priority of the band is in use.
+        """
+        taken = framework._priority_dict
+        while self._free:
+            prio = heapq.heappop(self._free)
+            if prio not in taken:
+                return prio
+        while self._next < self.hi:
+            prio = self._next
+            self._next += 1
+            if prio not in taken:
+                return prio
+        raise ValueError("No free priority in band [%d, %d)"
+                         % (self.lo, self.hi))
+
+    def release(self, prio):
+        heapq.heappush(self._free, prio)
+
+
+class _TopicNode():
+    """A node of a Framework's subscription trie.  Each node is one
+    dot-separated word of a subscription pattern, where "*" matches
+    exactly one word of a signal's name and "#" matches zero or more.
+    """
+    __slots__ = ("children", "acts")
+
+    def __init__(self):
+        self.children = {}
+        # The Ahsms subscribed to the pattern ending at this node
+        # and the filter of each subscription (None if unfiltered)
+        self.acts = {}
+
+    def match(self, words, i, found):
+        """Adds the Ahsms of every pattern matching words[i:] to found,
+        mapping each Ahsm to None if it has an unfiltered subscription,
+        otherwise to the tuple of its subscriptions' filters.
+        """
+        node = self.children.get("#")
+        if node is not None:
+            for j in range(i, len(words) + 1):
+                node.match(words, j, found)
+        if i == len(words):
+            for act, where in self.acts.items():
+                if where is None:
+                    found[act] = None
+                else:
+                    wheres = found.get(act, ())
+                    if wheres is not None:
+                        found[act] = wheres + (where,)
+            return
+        for key in (words[i], "*"):
+            node = self.children.get(key)
+            if node is not None:
+                node.match(words, i + 1, found)
+
+
+# Stands for a field an event's value does not have
+_NO_FIELD = object()
+
+
+def _field(value, name):
+    """Returns the named field of an event's value: the item of a dict,
+    otherwise the attribute (e.g. of a namedtuple).
+    """
+    if isinstance(value, dict):
+        return value.get(name, _NO_FIELD)
+    return getattr(value, name, _NO_FIELD)
+
+
+class _SignalFilters():
+    """The filtered subscriptions to one signal.  Filters that test
+    fields for equality are indexed by their first field's value,
+    so a publish only visits the subscriptions whose first field
+    matches; other filters are predicates called with the value.
+    """
+    __slots__ = ("acts", "index", "predicates")
+
+    def __init__(self, filtered):
+        self.acts = tuple(filtered)
+        # {field: {value: [(act, ((field, value), ...)), ...]}}
+        self.index = {}
+        self.predicates = []
+        for act, wheres in filtered.items():
+            for where in wheres:
+                if callable(where):
+                    self.predicates.append((act, where))
+                else:
+                    items = tuple(where.items())
+                    (name, want), rest = items[0], items[1:]
+                    self.index.setdefault(name, {}) \
+                        .setdefault(want, []).append((act, rest))
+
+    def select(self, value):
+        """Returns the set of Ahsms having a filter that passes the value.
+        """
+        selected = set()
+        for name, by_value in self.index.items():
+            try:
+                entries = by_value.get(_field(value, name), ())
+            except TypeError:
+                # An unhashable field equals none of the wanted values
+                continue
+            for act, rest in entries:
+                if all(_field(value, n) == v for n, v in rest):
+                    selected.add(act)
+        for act, where in self.predicates:
+            if act not in selected and where(value):
+                selected.add(act)
+        return selected
+
 
 class Framework():
     """Framework is a composite class that holds:
@@ -372,331 +935,1264 @@ class Framework():
     - the set of TimeEvents
     - the handle to the next TimeEvent
     - the table subscriptions to events
+    farc provides a default Framework, farc.Framework, which is all
+    most applications need.  Framework.new() creates another,
+    independent Framework, e.g. to run a group of Ahsms
+    on their own event loop in another thread.
     """
 
-    _event_loop = asyncio.get_event_loop()
-
-    # The Framework maintains a registry of Ahsms in a list.
-    _ahsm_registry = []
-
-    # The Framework maintains a dict of priorities to prevent duplicates.
-    # An Ahsm's priority is checked against this dict
-    # within the Ahsm.start() method when the Ahsm is added to the Framework.
-    # The dict's key is the priority (integer) and the value is the Ahsm.
-    _priority_dict = {}
-
-    # The Framework maintains a collection of TimeEvents.  The next
-    # expiration of the TimeEvent is kept alongside the TimeEvent.
-    # Only the TimeEvent having the soonest expiration time is scheduled
-    # for the time_event_callback().  As TimeEvents expire or are added and
-    # removed, the scheduled callback must be re-evaluated.  Periodic
-    # TimeEvents must only have one entry in the collection: the next
-    # expiration.  The time_event_callback() will add a periodic TimeEvent
-    # back into the dict with its next expiration.
-    _time_events = []
-    _time_event_times = []
-
-    # When a TimeEvent is scheduled for the time_event_callback(),
-    # a handle is kept so that the callback may be cancelled if necessary.
-    _tm_event_handle = None
-
-    # The Subscriber Table is a dictionary.  The keys are signals.
-    # The value for each key is a list of Ahsms that are subscribed to the
-    # signal.  An Ahsm may subscribe to a signal at any time during runtime.
-    _subscriber_table = {}
+    # When True, every Ahsm keeps an ActorMetrics
+    # and every posted event is stamped with its enqueue time.
+    _metrics_enabled = False
 
-    @staticmethod
-    def post(event, act):
+    # Every Ahsm has a FlightRecorder of this depth (0 disables them).
+    # The recorders are written to _flight_path (a file in the temp dir
+    # if None) when _flight_signum arrives or an exception escapes run().
+    _flight_depth = 32
+    _flight_path = None
+    _flight_signum = getattr(signal, "SIGUSR1", None)
+
+    # An EventRecorder (see farc.EventRecorder) while
+    # externally injected events are being recorded
+    _recorder = None
+
+    # A Tracer (see farc.Tracer) while causal traces are recorded
+    _tracer = None
+
+    def __init__(self):
+        # The asyncio event loop is bound by the first Ahsm.start()
+        # or by bind() so that importing farc has no side effects
+        self._event_loop = None
+
+        # True if stop() should stop the event loop;
+        # False when the loop belongs to asyncio.run() or other running code
+        self._owns_loop = True
+
+        # True while a run() is scheduled on the event loop and has not
+        # yet started, so posts need not schedule another one.
+        # This keeps posting from other threads cheap.
+        self._run_pending = False
+
+        # The Framework maintains a registry of Ahsms in a dict
+        # used as an insertion-ordered set, so removal is O(1).
+        self._ahsm_registry = {}
+
+        # A heap of the priorities of the Ahsms that may have events
+        # to dispatch.  A post pushes its Ahsm's priority unless the
+        # Ahsm's _scheduled flag says it is already in the heap,
+        # so run() need not look at idle Ahsms.  Entries whose Ahsm
+        # has no events (any more) are skipped.
+        self._ready = []
+
+        # The Framework maintains a dict of priorities to prevent duplicates.
+        # An Ahsm's priority is checked against this dict
+        # within the Ahsm.start() method when the Ahsm is added to the Framework.
+        # The dict's key is the priority (integer) and the value is the Ahsm.
+        self._priority_dict = {}
+
+        # The Framework maintains a collection of TimeEvents.  The next
+        # expiration of the TimeEvent is kept alongside the TimeEvent.
+        # Only the TimeEvent having the soonest expiration time is scheduled
+        # for the time_event_callback().  As TimeEvents expire or are added and
+        # removed, the scheduled callback must be re-evaluated.  Periodic
+        # TimeEvents must only have one entry in the collection: the next
+        # expiration.  The time_event_callback() will add a periodic TimeEvent
+        # back into the dict with its next expiration.
+        self._time_events = []
+        self._time_event_times = []
+
+        # The armed TimeEvents of each Ahsm, so they can be
+        # disarmed when the Ahsm ends
+        self._act_timers = {}
+
+        # When a TimeEvent is scheduled for the time_event_callback(),
+        # a handle is kept so that the callback may be cancelled if necessary.
+        self._tm_event_handle = None
+
+        # Subscriptions are kept in a trie of the words of their patterns
+        # (see subscribe()).  The Subscriber Table caches, for each signal
+        # published so far, the tuple of Ahsms whose patterns match the
+        # signal's name, ordered by priority, so publish() walks a tuple.
+        # Changing a subscription drops the cached tuples it affects.
+        # An Ahsm may subscribe to a signal at any time during runtime.
+        self._topics = _TopicNode()
+        self._subscriber_table = {}
+
+        # The _SignalFilters of each cached signal that has
+        # filtered subscribers; they are not in the Subscriber Table
+        self._filter_table = {}
+
+        # The patterns each Ahsm is subscribed to
+        self._subscriptions = {}
+
+        # The ttl (seconds) of every event of a signal; see set_ttl()
+        self._ttls = {}
+
+        # The requests waiting for a reply (see request()), by id:
+        # (a Future or an (Ahsm, signal) pair, the timeout's handle)
+        self._requests = {}
+        self._request_ids = itertools.count(1)
+
+        # The ids of the requests each Ahsm is waiting on
+        # (see Ahsm.request()), so they are forgotten when it ends
+        self._act_requests = {}
+
+        # The ActorMetrics that changed since a metrics reader
+        # (e.g. farc.MetricsServer) last looked at them
+        self._metrics_dirty = set()
+
+        # The source of time for TimeEvents, metrics and the Spy
+        self._clock = Clock()
+        self._clock.framework = self
+
+    def new(self):
+        """Returns a new Framework, independent of this one, with its own
+        event loop, Ahsms, TimeEvents and subscriptions.  Pass it to
+        Ahsm.start() to add Ahsms to it.  Ahsms in different Frameworks
+        may post to each other, even from different threads.
+        """
+        return type(self)()
+
+    def time(self):
+        """Returns the current time of the Framework's clock.
+        """
+        return self._clock.time()
+
+    def set_clock(self, clock):
+        """Sets the Framework's clock (a Clock or VirtualClock).
+        Call before arming any TimeEvents; the expirations
+        of already-armed TimeEvents are not converted.
+        """
+        if self._tm_event_handle:
+            self._tm_event_handle.cancel()
+            self._tm_event_handle = None
+        clock.framework = self
+        self._clock = clock
+        self._reschedule_time_events()
+
+    def post(self, event, act):
         """Posts the event to the given Ahsm's event queue.
         The argument, act, is an Ahsm instance.
         """
         assert isinstance(act, Ahsm)
         act.post_fifo(event)
 
-    @staticmethod
-    def post_by_name(event, act_name):
+    def post_by_name(self, event, act_name):
         """Posts the event to the given Ahsm's event queue.
         The argument, act, is a string of the name of the class
         to which the event is sent.  The event will post to all actors
         having the given classname.
         """
         assert type(act_name) is str
-        for act in Framework._ahsm_registry:
+        for act in self._ahsm_registry:
             if act.__class__.__name__ == act_name:
                 act.post_fifo(event)
 
-    @staticmethod
-    def publish(event):
+    def publish(self, event):
         """Posts the event to the message queue of every Ahsm
-        that is subscribed to the event's signal.
+        that is subscribed to the event's signal, in priority order.
         """
-        if event.signal in Framework._subscriber_table:
-            for act in Framework._subscriber_table[event.signal]:
-                act.post_fifo(event)
-        Framework.run_to_completion()
+        acts = self._subscriber_table.get(event.signal)
+        if acts is None:
+            acts = self._match_subscribers(event.signal)
+        filters = self._filter_table.get(event.signal)
+        if filters is not None:
+            # The value is unpickled once for all of the filters
+            selected = filters.select(event.value)
+            if selected:
+                acts = sorted(acts + tuple(selected),
+                              key=lambda act: act.priority)
+        for act in acts:
+            act.post_fifo(event)
+        self.run_to_completion()
+
+    def _match_subscribers(self, sigid):
+        """Caches and returns the tuple of unfiltered subscribers
+        to the signal, ordered by priority.
+        """
+        found = {}
+        self._topics.match(Signal.to_str(sigid).split("."), 0, found)
+        acts = tuple(sorted((act for act, wheres in found.items()
+                             if wheres is None),
+                            key=lambda act: act.priority))
+        self._subscriber_table[sigid] = acts
+        filtered = {act: wheres for act, wheres in found.items()
+                    if wheres is not None}
+        if filtered:
+            self._filter_table[sigid] = _SignalFilters(filtered)
+        return acts
+
+    def subscribers(self, sigid):
+        """Returns the tuple of Ahsms subscribed to the signal,
+        with or without a filter, ordered by priority.
+        """
+        acts = self._subscriber_table.get(sigid)
+        if acts is None:
+            acts = self._match_subscribers(sigid)
+        filters = self._filter_table.get(sigid)
+        if filters is not None:
+            acts = tuple(sorted(acts + filters.acts,
+                                key=lambda act: act.priority))
+        return acts
+
+    def subscribe(self, signame, act, where=None):
+        """Subscribes the given Ahsm to the signal, or signals, named by
+        signame.  Signal names are words separated by dots
+        (e.g. "sensor.kitchen.temp") and signame may be a pattern in
+        which "*" stands for any one word and "#" for any number of words
+        (e.g. "sensor.*.temp", "sensor.#").  A plain signame is registered
+        as a Signal if it is not already.  Subscribing an Ahsm again,
+        or to overlapping patterns, does not repeat deliveries.
+
+        If where is given, only the published events whose value passes
+        it are posted to the Ahsm.  where is either a dict of fields and
+        the values they must equal, e.g. {"device": 7}, which is indexed
+        so publish() does not test each subscriber, or a predicate called
+        with the event's value.  Fields are the items of a dict value or
+        the attributes of other values.  Subscribing again to the same
+        signame replaces the filter.
+        """
+        if where is not None and not callable(where):
+            where = dict(where)
+            assert where, "where must name at least one field"
+        words = signame.split(".")
+        wild = "*" in words or "#" in words
+        if not wild:
+            Signal.register(signame)
+        patterns = self._subscriptions.setdefault(act, set())
+        node = self._topics
+        for word in words:
+            node = node.children.setdefault(word, _TopicNode())
+        if signame in patterns and node.acts[act] is where:
+            return
+        patterns.add(signame)
+        node.acts[act] = where
+        self._drop_subscribers(signame, wild)
+
+    def unsubscribe(self, signame, act):
+        """Undoes subscribe(signame, act).
+        """
+        patterns = self._subscriptions.get(act)
+        if not patterns or signame not in patterns:
+            return
+        patterns.discard(signame)
+        if not patterns:
+            del self._subscriptions[act]
+        words = signame.split(".")
+        path = [self._topics]
+        for word in words:
+            path.append(path[-1].children[word])
+        del path[-1].acts[act]
+        # Prune the branch back to the last node still in use
+        for i in range(len(words), 0, -1):
+            node = path[i]
+            if node.acts or node.children:
+                break
+            del path[i - 1].children[words[i - 1]]
+        self._drop_subscribers(signame, "*" in words or "#" in words)
+
+    def _drop_subscribers(self, signame, wild):
+        """Drops the cached subscriber tuples a pattern may match;
+        they are rebuilt by the next publish() of each signal.
+        """
+        if wild:
+            self._subscriber_table.clear()
+            self._filter_table.clear()
+        else:
+            sigid = Signal.register(signame)
+            self._subscriber_table.pop(sigid, None)
+            self._filter_table.pop(sigid, None)
+
+    def request(self, act, event, timeout=None):
+        """Posts the event to the Ahsm as a request and returns an
+        asyncio Future (of this Framework's event loop) that the Ahsm
+        completes with reply(event, value).  If timeout (seconds) passes
+        first, the Future's exception is asyncio.TimeoutError.
+        If the event is shed as stale (see set_ttl()) the exception is
+        asyncio.TimeoutError too; if the Ahsm ends with the event still
+        in its queue, or a coalesced event replaces it, RuntimeError.
+        Await the Future from a coroutine running on this Framework's
+        event loop.
+        """
+        future = (self._event_loop or self.bind()).create_future()
+        self._post_request(act, event, future, timeout)
+        return future
 
-    @staticmethod
-    def subscribe(signame, act):
-        """Adds the given Ahsm to the subscriber table list
-        for the given signal.  The argument, signame, is a string of the name
-        of the Signal to which the Ahsm is subscribing.  Using a string allows
-        the Signal to be created in the registry if it is not already.
+    def _post_request(self, act, event, target, timeout):
+        """Registers a request for a reply to the target
+        (a Future or an (Ahsm, signal) pair) and posts it.
         """
-        sigid = Signal.register(signame)
-        if sigid not in Framework._subscriber_table:
-            Framework._subscriber_table[sigid] = []
-        Framework._subscriber_table[sigid].append(act)
+        request_id = next(self._request_ids)
+        handle = None
+        if timeout is not None:
+            # The timeout shares the clock with TimeEvents (no task)
+            handle = self._clock.call_at(self._clock.time() + timeout,
+                                         self._expire_request, request_id)
+        self._requests[request_id] = (target, handle)
+        if target.__class__ is tuple:
+            ids = self._act_requests.get(target[0])
+            if ids is None:
+                ids = self._act_requests[target[0]] = {}
+            ids[request_id] = None
+        event.reply_to = self
+        event.request_id = request_id
+        act.post_fifo(event)
 
-    @staticmethod
-    def add_time_event(tm_event, delta):
+    def reply(self, event, value):
+        """Completes the request, event, with the value.
+        Does nothing if the event is not a request or its request
+        was already answered or timed out.  The requesting Framework
+        may run in another thread.
+        """
+        fw = getattr(event, "reply_to", None)
+        if fw is None:
+            return
+        self._send_reply(fw, event.request_id, value, None)
+
+    def _send_reply(self, fw, request_id, value, exc):
+        """Completes the request of fw, the requesting Framework,
+        on fw's thread.
+        """
+        if fw is self:
+            fw._complete_request(request_id, value, exc)
+        else:
+            fw._event_loop.call_soon_threadsafe(
+                fw._complete_request, request_id, value, exc)
+
+    def _drop_request(self, evt, exc_type, reason):
+        """Fails the request, evt, if it is one, with an exc_type
+        exception because it will never be dispatched.
+        """
+        while evt.__class__ in (_QueuedEvent, _ComponentEvent,
+                                _CoalescedEvent):
+            evt = evt.event
+        fw = getattr(evt, "reply_to", None)
+        if fw is None:
+            return
+        self._send_reply(fw, evt.request_id, None, exc_type(
+            "Request %d %s" % (evt.request_id, reason)))
+
+    def _complete_request(self, request_id, value, exc=None):
+        pending = self._requests.pop(request_id, None)
+        if pending is None:
+            return
+        target, handle = pending
+        if handle is not None:
+            handle.cancel()
+        if target.__class__ is tuple:
+            act, sigid = target
+            ids = self._act_requests[act]
+            del ids[request_id]
+            if not ids:
+                del self._act_requests[act]
+            # Unless the requesting Ahsm has ended
+            if act.framework._priority_dict.get(act.priority) is act:
+                act.post_fifo(Event(sigid, exc if exc else value))
+        elif not target.done():
+            if exc:
+                target.set_exception(exc)
+            else:
+                target.set_result(value)
+
+    def _expire_request(self, request_id):
+        import asyncio
+
+        self._complete_request(request_id, None, asyncio.TimeoutError(
+            "No reply to request %d" % request_id))
+
+    def set_ttl(self, signame, ttl):
+        """Makes events of the named signal stale ttl seconds after
+        they are posted, unless the event has a ttl or deadline
+        of its own.  Stale events are dropped when dequeued instead of
+        being dispatched.  A ttl of None removes the signal's ttl.
+        """
+        sigid = Signal.register(signame)
+        if ttl is None:
+            self._ttls.pop(sigid, None)
+        else:
+            self._ttls[sigid] = ttl
+
+    def _queue_entry(self, act, evt):
+        """Returns the entry that queues this post of the event to the
+        Ahsm, carrying the post's own deadline, time and trace context,
+        so a later post of the same event (e.g. a periodic TimeEvent)
+        does not change them.  Only needed while a ttl, metrics or
+        a Tracer use them; otherwise the event itself is queued.
+        """
+        if evt.__class__ is _ComponentEvent:
+            # A component's post already has a wrapper of its own
+            entry = evt
+        else:
+            entry = _QueuedEvent(evt)
+        self._stamp(act, entry, evt)
+        return entry
+
+    def _stamp(self, act, entry, evt):
+        """Sets the time, deadline and trace context of the queue
+        entry of a post of the event.  The deadline comes from the
+        event's own deadline, else its ttl or its signal's.
+        """
+        if evt.__class__ is _ComponentEvent:
+            evt = evt.event
+        now = self._clock.time()
+        entry.t_posted = now
+        deadline = evt.deadline
+        if deadline is None:
+            ttl = evt.ttl
+            if ttl is None:
+                ttl = self._ttls.get(evt.signal)
+            if ttl is not None:
+                deadline = now + ttl
+        entry.deadline = deadline
+        if self._tracer:
+            self._tracer.on_post(act, entry, evt)
+
+    def add_time_event(self, tm_event, delta):
         """Adds the TimeEvent to the list of time events in the Framework.
         The event will fire its signal (to the TimeEvent's target Ahsm)
         after the delay, delta.
         """
-        expiration = Framework._event_loop.time() + delta
-        Framework.add_time_event_at(tm_event, expiration)
+        expiration = self._clock.time() + delta
+        self.add_time_event_at(tm_event, expiration)
 
-    @staticmethod
-    def add_time_event_at(tm_event, abs_time):
+    def add_time_event_at(self, tm_event, abs_time):
         """Adds the TimeEvent to the list of time events in the Framework.
         The event will fire its signal (to the TimeEvent's target Ahsm)
-        at the given absolute time (_event_loop.time()).
+        at the given absolute time (Framework.time()).
         """
-        assert tm_event not in Framework._time_events, \
+        assert tm_event._armed_for is None, \
             "A TimeEvent must not be armed more than once."
-        Framework._insort_time_event(tm_event, abs_time)
+        self._insort_time_event(tm_event, abs_time)
 
-    @staticmethod
-    def _insort_time_event(tm_event, expiration):
+    def _insort_time_event(self, tm_event, expiration):
         """Inserts a TimeEvent into the sequence of time events,
         sorted by the next expiration of the timer.
         If the expiration time matches an existing expiration,
         the identically-timed events fire in a FIFO fashion.
         """
         # If the event is to happen in the past, post it now
-        now = Framework._event_loop.time()
+        now = self._clock.time()
         if expiration <= now:
             tm_event.act.post_fifo(tm_event)
             if tm_event.is_periodic():
                 # Adjust expiration if we're missing deadlines
                 if expiration + tm_event.interval < now:
                     expiration = now
-                Framework._insort_time_event(tm_event,
-                                             expiration + tm_event.interval)
+                self._insort_time_event(
+                    tm_event, expiration + tm_event.interval)
 
         else:
             # If the new event is the soonest, cancel the callback
-            if (len(Framework._time_events) > 0
-                    and expiration < Framework._time_event_times[0]):
-                if Framework._tm_event_handle:
-                    Framework._tm_event_handle.cancel()
-                    Framework._tm_event_handle = None
+            if (len(self._time_events) > 0
+                    and expiration < self._time_event_times[0]):
+                if self._tm_event_handle:
+                    self._tm_event_handle.cancel()
+                    self._tm_event_handle = None
 
-            index = bisect.bisect_right(Framework._time_event_times,
+            index = bisect.bisect_right(self._time_event_times,
                                         expiration)
-            Framework._time_event_times.insert(index, expiration)
-            Framework._time_events.insert(index, tm_event)
+            self._time_event_times.insert(index, expiration)
+            self._time_events.insert(index, tm_event)
+            self._index_time_event(tm_event, expiration)
 
-            if Framework._tm_event_handle is None:
-                Framework._reschedule_time_events()
+            if self._tm_event_handle is None:
+                self._reschedule_time_events()
 
-    @staticmethod
-    def _reschedule_time_events():
-        if len(Framework._time_events) > 0:
-            next_expiration = Framework._time_event_times[0]
-            next_event = Framework._time_events[0]
-            Framework._tm_event_handle = Framework._event_loop.call_at(
+    def _index_time_event(self, tm_event, expiration):
+        """Records that the TimeEvent is armed for its Ahsm.
+        """
+        tm_event._armed_for = tm_event.act
+        tm_event._expiration = expiration
+        timers = self._act_timers.get(tm_event.act)
+        if timers is None:
+            timers = self._act_timers[tm_event.act] = {}
+        timers[tm_event] = None
+
+    def _unindex_time_event(self, tm_event):
+        act = tm_event._armed_for
+        tm_event._armed_for = None
+        timers = self._act_timers.get(act)
+        if timers is not None:
+            timers.pop(tm_event, None)
+            if not timers:
+                del self._act_timers[act]
+
+    def _reschedule_time_events(self):
+        if len(self._time_events) > 0:
+            next_expiration = self._time_event_times[0]
+            next_event = self._time_events[0]
+            self._tm_event_handle = self._clock.call_at(
                 next_expiration,
-                Framework.time_event_callback,
+                self.time_event_callback,
                 next_event,
                 next_expiration)
 
-    @staticmethod
-    def remove_time_event(tm_event):
+    def remove_time_event(self, tm_event):
         """Removes the TimeEvent from the collection of active time events.
         Cancels the TimeEvent's callback if there is one.  Schedules the
         appropriate remaining TimeEvent's callback if there is one.
         """
-        if tm_event in Framework._time_events:
-            idx = Framework._time_events.index(tm_event)
-            del Framework._time_events[idx]
-            del Framework._time_event_times[idx]
+        if tm_event._armed_for is not None:
+            # Find the TimeEvent among those of the same expiration
+            idx = bisect.bisect_left(self._time_event_times,
+                                     tm_event._expiration)
+            while self._time_events[idx] is not tm_event:
+                idx += 1
+            del self._time_events[idx]
+            del self._time_event_times[idx]
+            self._unindex_time_event(tm_event)
 
             # If the removed event was the soonest,
             # cancel the callback and reschedule any other events
             if idx == 0:
-                if Framework._tm_event_handle:
-                    Framework._tm_event_handle.cancel()
-                    Framework._tm_event_handle = None
+                if self._tm_event_handle:
+                    self._tm_event_handle.cancel()
+                    self._tm_event_handle = None
 
-                Framework._reschedule_time_events()
+                self._reschedule_time_events()
 
-    @staticmethod
-    def time_event_callback(tm_event, expiration):
+    def time_event_callback(self, tm_event, expiration):
         """The callback function for all TimeEvents.
         Posts the event to the event's target Ahsm.
         If the TimeEvent is periodic, re-insort the event
         in the list of active time events.
         """
-        assert tm_event == Framework._time_events[0]
-        assert expiration == Framework._time_event_times[0]
+        assert tm_event == self._time_events[0]
+        assert expiration == self._time_event_times[0]
 
         # Remove this expired TimeEvent from the active list
-        del Framework._time_events[0]
-        del Framework._time_event_times[0]
-        Framework._tm_event_handle = None
+        del self._time_events[0]
+        del self._time_event_times[0]
+        self._unindex_time_event(tm_event)
+        self._tm_event_handle = None
 
         if tm_event.is_periodic():
-            Framework._insort_time_event(tm_event,
-                                         expiration + tm_event.interval)
+            self._insort_time_event(
+                tm_event, expiration + tm_event.interval)
+
+        # Schedule the next TimeEvent if re-insorting did not
+        if self._tm_event_handle is None:
+            self._reschedule_time_events()
+
+        if self._recorder:
+            self._recorder.on_time_event(tm_event)
+        if tm_event.act.metrics:
+            tm_event.act.metrics.on_timer()
 
         # Post the event to the target Ahsm
         tm_event.act.post_fifo(tm_event)
-        Framework.run_to_completion()
+        self.run_to_completion()
 
-    @staticmethod
-    def add(act):
+    def add(self, act):
         """Makes the framework aware of the given Ahsm.
         """
-        Framework._ahsm_registry.append(act)
-        assert act.priority not in Framework._priority_dict, \
+        assert act.priority not in self._priority_dict, \
                "Priority MUST be unique"
-        Framework._priority_dict[act.priority] = act
+        self._ahsm_registry[act] = None
+        self._priority_dict[act.priority] = act
+        # An Ahsm restored with queued events is ready at once
+        act._scheduled = bool(act.__dict__.get("mq"))
+        if act._scheduled:
+            heapq.heappush(self._ready, act.priority)
+        if self._metrics_enabled:
+            act.metrics = ActorMetrics(self._clock.time(), act,
+                                       self._metrics_dirty)
+        if self._flight_depth:
+            act.flight = FlightRecorder(self._flight_depth)
         Spy.on_framework_add(act)
 
-    @staticmethod
-    def remove(act):
+    def remove(self, act):
         """Removes the Ahsm from the framework so events will no longer
         be dispatched to the Ahsm.
+        Also removes the Ahsm's subscriptions, disarms its TimeEvents
+        and returns its priority to its PriorityBand, if it has one.
+        Fails the requests left in its queue and forgets the requests
+        it is waiting on.
         """
-        del Framework._priority_dict[act.priority]
-        Framework._ahsm_registry.remove(act)
+        Spy.on_framework_remove(act)
+        del self._priority_dict[act.priority]
+        del self._ahsm_registry[act]
+        # Its entry in the ready heap, if any, is skipped
+        act._scheduled = False
+        for evt in act.mq:
+            self._drop_request(evt, RuntimeError,
+                               "was not dispatched; its Ahsm ended")
+        for request_id in self._act_requests.pop(act, ()):
+            handle = self._requests.pop(request_id)[1]
+            if handle is not None:
+                handle.cancel()
+        for signame in tuple(self._subscriptions.get(act, ())):
+            self.unsubscribe(signame, act)
+        for tm_event in tuple(self._act_timers.get(act, ())):
+            tm_event.disarm()
+        if act.band is not None:
+            act.band.release(act.priority)
+        if act.metrics:
+            # Let metrics readers see that the Ahsm is gone
+            act.metrics.mark_dirty()
+
+    def start_all(self, acts, priorities):
+        """Starts each of the Ahsms in this Framework, as Ahsm.start()
+        does, with the priorities from the iterable, priorities, or from
+        a PriorityBand, and schedules a single run-to-completion for all.
+        """
+        self._bind_for_start()
+        if isinstance(priorities, PriorityBand):
+            priorities = itertools.repeat(priorities)
+        for act, priority in zip(acts, priorities):
+            act.framework = self
+            act._start(priority)
+        self.run_to_completion()
+
+    def _bind_for_start(self):
+        """Binds the Framework to the event loop on first use
+        or when running under a new loop (e.g. another asyncio.run()).
+        """
+        import asyncio
 
-    @staticmethod
-    def run():
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        loop = self._event_loop
+        if loop is None or loop.is_closed() or running not in (None, loop):
+            self.bind()
+
+    def run(self):
         """Dispatches an event to the highest priority Ahsm
         until all event queues are empty (i.e. Run To Completion).
+        Also finds events put straight into an Ahsm's queue,
+        rather than posted, e.g. by tests.
+        If an exception escapes a handler, the flight recorders
+        are dumped before the exception propagates.
+        """
+        for act in self._ahsm_registry:
+            if act.mq and not act._scheduled:
+                act._scheduled = True
+                heapq.heappush(self._ready, act.priority)
+        self._run_ready()
+
+    def _run_ready(self):
+        """Dispatches the events of the Ahsms in the ready heap,
+        always to the highest priority Ahsm that has one,
+        until no Ahsm has events.  This is what run_to_completion()
+        schedules: Ahsms without events cost nothing.
+        """
+        ready = self._ready
+        priorities = self._priority_dict
+
+        # Events posted from now on need another run
+        self._run_pending = False
+        if self._recorder:
+            self._recorder.in_run = True
+        try:
+            while ready:
+                act = priorities.get(heapq.heappop(ready))
+                if act is None:
+                    continue
+                # Cleared before the queue is looked at, so an event
+                # posted from another thread meanwhile is either seen
+                # here or pushes the Ahsm again
+                act._scheduled = False
+                if not act.mq:
+                    continue
+                entry = act.pop_msg()
+                if act.mq:
+                    act._scheduled = True
+                    heapq.heappush(ready, act.priority)
+                now = self._clock.time()
+                deadline = entry.deadline
+                if deadline is not None and now > deadline:
+                    self._shed(act, entry, now)
+                    continue
+                if act.metrics:
+                    act.metrics.on_dispatch(entry, now)
+                act.dispatched += 1
+                if entry.__class__ in _ENVELOPES:
+                    event_next = entry.event
+                else:
+                    event_next = entry
+                tracer = self._tracer
+                if tracer:
+                    span = tracer.on_dispatch(act, entry, now)
+                Spy.on_framework_dispatch_pre(act, event_next)
+                t0 = perf_counter()
+                try:
+                    act.dispatch(event_next)
+                except Exception as exc:
+                    if act.flight:
+                        # The crash is the entry a post-mortem needs most
+                        act.flight.record(now, event_next.signal, act._state,
+                                          perf_counter() - t0, repr(exc))
+                    if tracer:
+                        tracer.on_handled(act, entry, span, exc)
+                    Spy.on_framework_dispatch_error(act, event_next, exc)
+                    raise
+                if tracer:
+                    tracer.on_handled(act, entry, span)
+                if act.flight or act.metrics:
+                    dur = perf_counter() - t0
+                    if act.metrics:
+                        act.metrics.on_handled(dur)
+                    if act.flight:
+                        act.flight.record(now, event_next.signal,
+                                          act._state, dur)
+                Spy.on_framework_dispatch_post(act, event_next)
+        except Exception:
+            self.dump_flight_recorder()
+            raise
+        finally:
+            if self._recorder:
+                self._recorder.in_run = False
+
+    def _shed(self, act, entry, now):
+        """Drops the stale queue entry and any stale entries behind it
+        at the head of the Ahsm's queue, so an Ahsm that fell behind
+        skips its backlog of stale events in one step.
         """
-        getPriority = lambda x: x.priority
+        import asyncio
 
         while True:
-            allQueuesEmpty = True
-            sorted_acts = sorted(Framework._ahsm_registry, key=getPriority)
-            for act in sorted_acts:
-                if act.has_msgs():
-                    event_next = act.pop_msg()
-                    act.dispatch(event_next)
-                    allQueuesEmpty = False
-                    break
-            if allQueuesEmpty:
+            if act.metrics:
+                act.metrics.on_expired()
+            evt = entry.event if entry.__class__ in _ENVELOPES else entry
+            self._drop_request(evt, asyncio.TimeoutError,
+                               "expired before it was dispatched")
+            Spy.on_framework_event_expired(act, evt)
+            if not act.mq:
                 return
+            deadline = act.mq[-1].deadline
+            if deadline is None or now <= deadline:
+                return
+            entry = act.pop_msg()
 
-    @staticmethod
-    def run_to_completion():
-        Framework._event_loop.call_soon_threadsafe(Framework.run)
+    def run_to_completion(self):
+        """Schedules run() on the Framework's event loop
+        unless a run() is already scheduled and has not started.
+        Safe to call from any thread.
+        """
+        if not self._run_pending:
+            self._run_pending = True
+            (self._event_loop or self.bind()).call_soon_threadsafe(
+                self._run_ready)
+
+    def enable_metrics(self):
+        """Starts collecting queue metrics for every Ahsm,
+        including those added later.
+        Events posted from now on are stamped with their enqueue time.
+        """
+        now = self._clock.time()
+        self._metrics_enabled = True
+        for act in self._ahsm_registry:
+            act.metrics = ActorMetrics(now, act, self._metrics_dirty)
 
-    @staticmethod
-    def stop():
+    def disable_metrics(self):
+        """Stops collecting queue metrics and discards the counters.
+        """
+        self._metrics_enabled = False
+        for act in self._ahsm_registry:
+            act.metrics = None
+        self._metrics_dirty.clear()
+
+    def get_metrics(self):
+        """Returns a dict, keyed by priority, of each Ahsm's queue metrics
+        (see ActorMetrics.snapshot()) plus the Ahsm's class name.
+        Returns an empty dict if metrics are not enabled.
+        """
+        now = self._clock.time()
+        snapshot = {}
+        for act in self._ahsm_registry:
+            if act.metrics:
+                d = act.metrics.snapshot(len(act.mq), now)
+                d["name"] = act.__class__.__name__
+                snapshot[act.priority] = d
+        return snapshot
+
+    def stop(self):
         """EXITs all Ahsms and stops the event loop.
         """
+        if self._recorder:
+            self._recorder.on_stop()
+        if self._tracer:
+            self._tracer.on_stop()
+
         # Disable the timer callback
-        if Framework._tm_event_handle:
-            Framework._tm_event_handle.cancel()
-            Framework._tm_event_handle = None
+        if self._tm_event_handle:
+            self._tm_event_handle.cancel()
+            self._tm_event_handle = None
 
         # Post EXIT to all Ahsms
-        for act in Framework._ahsm_registry:
-            Framework.post(Event.EXIT, act)
+        for act in self._ahsm_registry:
+            self.post(Event.EXIT, act)
 
         # Run to completion in this context
         # and stop the asyncio event loop
-        Framework.run()
-        Framework._event_loop.stop()
+        self.run()
+        if self._owns_loop:
+            self._event_loop.stop()
         Spy.on_framework_stop()
 
-    @staticmethod
-    def print_info():
+    def print_info(self):
         """Prints the name and current state
         of each actor in the framework.
         Meant to be called when ctrl+T (SIGINFO/29) is issued.
         """
-        for act in Framework._ahsm_registry:
-            print(act.__class__.__name__, act.state.__name__)
+        for act in self._ahsm_registry:
+            print(act.__class__.__name__, act._state.__name__)
+
+    def configure_flight_recorder(self, depth=32, path=None,
+                                  signum=getattr(signal, "SIGUSR1", None)):
+        """Sets the number of dispatches each Ahsm's FlightRecorder keeps
+        (0 disables them), the file the recorders are dumped to
+        and the POSIX signal that triggers a dump (None for no signal).
+        A new depth applies to Ahsms added afterwards.
+        """
+        self._flight_depth = depth
+        self._flight_path = path
+        loop = self._event_loop if self is Framework else None
+        try:
+            if loop and self._flight_signum is not None:
+                loop.remove_signal_handler(self._flight_signum)
+            if loop and signum is not None:
+                loop.add_signal_handler(
+                    signum, self.dump_flight_recorder)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+        self._flight_signum = signum
+
+    def dump_flight_recorder(self):
+        """Writes each Ahsm's current state, queue depth
+        and recent dispatches to the flight recorder file.
+        Returns the file's path.
+        """
+        import tempfile
+
+        path = self._flight_path or os.path.join(
+            tempfile.gettempdir(), "farc-flight-%d.txt" % os.getpid())
+        with open(path, "w") as f:
+            f.write("farc flight recorder at %.6f\n" %
+                    self._clock.time())
+            for act in self._ahsm_registry:
+                f.write("\n%s priority=%d state=%s queued=%d\n" % (
+                    act.__class__.__name__, act.priority,
+                    act._state.__name__, len(act.mq)))
+                if act.flight:
+                    for t, sig, st, dur, err in act.flight.entries(True):
+                        if err is None:
+                            f.write("  %.6f %s -> %s (%.1f us)\n" % (
+                                t, Signal.to_str(sig), st.__name__, 1e6 * dur))
+                        else:
+                            f.write("  %.6f %s in %s raised %s (%.1f us)\n" % (
+                                t, Signal.to_str(sig), st.__name__, err,
+                                1e6 * dur))
+        print("Flight recorder file: %s" % path, file=sys.stderr)
+        return path
+
+    def bind(self, loop=None):
+        """Binds the Framework to the given asyncio event loop or,
+        if None, to the running loop or the current thread's loop
+        (creating one if there is none).  For the default Framework,
+        installs the POSIX signal handlers on the loop.
+        Ahsm.start() calls this the first time and whenever it is
+        called from a different running loop,
+        so calling it explicitly is only needed to choose a loop.
+        Returns the loop.
+        """
+        import asyncio
+
+        running = True
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                running = False
+                loop = self._current_loop()
+        else:
+            running = loop.is_running()
+        if loop is self._event_loop:
+            return loop
+
+        self._event_loop = loop
+        # A loop that is already running belongs to someone else
+        # (e.g. asyncio.run()), so leave SIGINT/SIGTERM to its owner
+        # and don't stop the loop in stop()
+        self._owns_loop = not running
+
+        # Bind a useful set of POSIX signals to the handler
+        # (ignore the errors on Windows and outside the main thread).
+        # Signals are process-wide, so only the default Framework takes them.
+        if self is Framework:
+            try:
+                if self._owns_loop:
+                    loop.add_signal_handler(signal.SIGINT,
+                                            lambda: self.stop())
+                    loop.add_signal_handler(signal.SIGTERM,
+                                            lambda: self.stop())
+                loop.add_signal_handler(29, self.print_info)
+                if self._flight_signum is not None:
+                    loop.add_signal_handler(self._flight_signum,
+                                            self.dump_flight_recorder)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass
+
+        # Move the pending TimeEvent callback to the new loop
+        if self._tm_event_handle:
+            self._tm_event_handle.cancel()
+            self._tm_event_handle = None
+        self._reschedule_time_events()
+        return loop
+
+    def _current_loop(self):
+        """Returns the current thread's event loop, creating one if needed,
+        without asyncio.get_event_loop()'s deprecation warning.
+        """
+        import asyncio
 
-    # Bind a useful set of POSIX signals to the handler
-    # (ignore a NotImplementedError on Windows)
-    try:
-        _event_loop.add_signal_handler(signal.SIGINT, lambda: Framework.stop())
-        _event_loop.add_signal_handler(signal.SIGTERM, lambda: Framework.stop())
-        _event_loop.add_signal_handler(29, print_info.__func__)
-    except NotImplementedError:
-        pass
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", DeprecationWarning)
+                loop = asyncio.get_event_loop()
+            if not loop.is_closed():
+                return loop
+        except RuntimeError:
+            pass
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
 
 
-def run_forever():
-    """Runs the asyncio event loop with and
+# Singleton pattern:
+# Turn Framework into the default instance of itself so that
+# "import farc; farc.Framework.foo()" uses the default Framework.
+# Framework.new() creates additional, independent Frameworks.
+Framework = Framework()
+
+
+def run_forever(framework=Framework):
+    """Runs the framework's asyncio event loop with and
     ensures state machines are exited upon a KeyboardInterrupt.
     """
-    loop = asyncio.get_event_loop()
+    loop = framework._event_loop or framework.bind()
     try:
         loop.run_forever()
     except KeyboardInterrupt:
-        Framework.stop()
+        framework.stop()
     loop.close()
 
 
+class _QueuedEvent(BaseEvent):
+    """The queue entry of one post of an event,
+    carrying the post's own deadline, time and trace context
+    (see Framework._queue_entry()).
+    """
+
+    def __init__(self, evt):
+        self.event = evt
+        self.signal = evt.signal
+
+
+class _ComponentEvent(BaseEvent):
+    """An event in a container Ahsm's queue that is meant
+    for one of the container's components.
+    Each post to a component has one, which is its queue entry.
+    """
+
+    def __init__(self, component, evt):
+        self.component = component
+        self.event = evt
+        self.signal = evt.signal
+        self.deadline = evt.deadline
+
+    @property
+    def value(self):
+        return self.event.value
+
+
+class _CoalescedEvent(BaseEvent):
+    """A slot in a coalescing Ahsm's queue holding the newest
+    of the events of one signal, for the Ahsm or one of its components,
+    posted since the slot was queued.
+    """
+
+    def __init__(self, evt, component):
+        self.event = evt
+        self.signal = evt.signal
+        self.component = component
+        self.deadline = evt.deadline
+
+    @property
+    def value(self):
+        return self.event.value
+
+
+# The queue entries whose event, rather than the entry itself,
+# is dispatched
+_ENVELOPES = (_QueuedEvent, _CoalescedEvent)
+
+
 class Ahsm(Hsm):
     """An Augmented Hierarchical State Machine (AHSM); a.k.a. ActiveObject/AO.
     Adds a priority, message queue and methods to work with the queue.
     A lower number means higher priority.
     """
 
-    def start(self, priority):
-        """Adds this Ahsm to the Framework, creates the msg queue
-        and performs the state machine's initial transition.
-        A lower number means higher priority.
+    # Queue statistics; an ActorMetrics while metrics are enabled
+    metrics = None
+
+    # Recent dispatches; a FlightRecorder unless disabled
+    flight = None
+
+    # The Framework this Ahsm joins in start()
+    framework = Framework
+
+    # Number of posts that replaced a queued event (see coalesce())
+    coalesced = 0
+
+    # Number of events the Framework has dispatched to this Ahsm
+    dispatched = 0
+
+    # True while this Ahsm's priority is in its Framework's ready heap
+    _scheduled = False
+
+    # The PriorityBand this Ahsm's priority came from, if any
+    band = None
+
+    def start(self, priority, framework=None):
+        """Adds this Ahsm to the given Framework (the default Framework
+        if None), creates the msg queue and performs the state machine's
+        initial transition.  A lower number means higher priority.
+        Priorities need only be unique within a Framework.
+        priority may be a PriorityBand, which picks a free priority.
         """
+        if framework is not None:
+            self.framework = framework
+        fw = self.framework
+        fw._bind_for_start()
+        self._start(priority)
+        fw.run_to_completion()
+
+    def _start(self, priority):
+        fw = self.framework
+        if isinstance(priority, PriorityBand):
+            self.band = priority
+            priority = priority.allocate(fw)
+        else:
+            self.band = None
         # must set the priority before Framework.add() which uses the priority
         self.priority = priority
-        Framework.add(self)
+        fw.add(self)
         self.mq = collections.deque()
         self.init()
-        Framework.run_to_completion()
 
     def end(self):
-        """Removes this Ahsm from the Framework immediately.
+        """Removes this Ahsm from its Framework immediately.
         Does not process any events in its queue.
         """
-        Framework.remove(self)
+        self.framework.remove(self)
 
     def post_lifo(self, evt):
         """Adds the event in LIFO order to this Ahsm's queue.
-        Schedules the Framework to run-to-completion.
+        Schedules the Ahsm's Framework to run-to-completion.
+        The Ahsm may belong to another Framework than the caller,
+        even one running in another thread.
         """
-        self.mq.append(evt)
-        Framework.run_to_completion()
+        fw = self.framework
+        if fw._ttls or evt.ttl is not None or self.metrics or fw._tracer:
+            self.mq.append(fw._queue_entry(self, evt))
+        else:
+            self.mq.append(evt)
+        if not self._scheduled:
+            self._scheduled = True
+            heapq.heappush(fw._ready, self.priority)
+        if fw._recorder:
+            fw._recorder.on_post(self, evt, True)
+        if self.metrics:
+            self.metrics.on_post(len(self.mq))
+        Spy.on_ahsm_post(self, evt)
+        fw.run_to_completion()
 
     def post_fifo(self, evt):
         """Adds the event in FIFO order to this Ahsm's queue.
-        Schedules the Framework to run-to-completion.
+        Schedules the Ahsm's Framework to run-to-completion.
+        The Ahsm may belong to another Framework than the caller,
+        even one running in another thread.
         """
-        self.mq.appendleft(evt)
-        Framework.run_to_completion()
+        fw = self.framework
+        if fw._ttls or evt.ttl is not None or self.metrics or fw._tracer:
+            self.mq.appendleft(fw._queue_entry(self, evt))
+        else:
+            self.mq.appendleft(evt)
+        if not self._scheduled:
+            self._scheduled = True
+            heapq.heappush(fw._ready, self.priority)
+        if fw._recorder:
+            fw._recorder.on_post(self, evt, False)
+        if self.metrics:
+            self.metrics.on_post(len(self.mq))
+        Spy.on_ahsm_post(self, evt)
+        fw.run_to_completion()
 
     def pop_msg(self):
         return self.mq.pop()
 
+    def request(self, act, event, reply_signame, timeout=None):
+        """Posts the event to another Ahsm as a request.  Its reply is
+        posted back to this Ahsm as an event of the named signal whose
+        value is the reply's value or, if timeout (seconds) passes first,
+        an asyncio.TimeoutError.
+        """
+        sigid = Signal.register(reply_signame)
+        self.framework._post_request(act, event, (self, sigid), timeout)
+
+    def reply(self, event, value):
+        """Replies to the request, event, with the value.
+        Call from a state handler that received the request.
+        """
+        self.framework.reply(event, value)
+
+    def coalesce(self, *signames):
+        """Makes this Ahsm keep at most one queued event of each of
+        the named signals for itself and for each of its components.
+        Posting such an event while one of the same signal, for the same
+        Hsm, is still queued replaces the queued one, which keeps its
+        place in the queue, so only the newest value is dispatched.
+        Events of other signals keep their order relative to it.
+        For state updates (e.g. readings) where only the latest matters.
+        """
+        if not self.__dict__.get("_coalesce"):
+            self._coalesce = set()
+            # The queue slot of each (component or None, signal)
+            self._slots = {}
+            # Only Ahsms that coalesce pay for the lookups
+            self.post_fifo = self._post_fifo_coalescing
+            self.post_lifo = self._post_lifo_coalescing
+            self.pop_msg = self._pop_msg_coalescing
+        self._coalesce.update(Signal.register(name) for name in signames)
+
+    def _post_fifo_coalescing(self, evt):
+        if evt.signal in self._coalesce:
+            self._post_coalescing(evt, False)
+        else:
+            Ahsm.post_fifo(self, evt)
+
+    def _post_lifo_coalescing(self, evt):
+        if evt.signal in self._coalesce:
+            self._post_coalescing(evt, True)
+        else:
+            Ahsm.post_lifo(self, evt)
+
+    def _post_coalescing(self, evt, lifo):
+        fw = self.framework
+        if fw._recorder:
+            fw._recorder.on_post(self, evt, lifo)
+        stamp = fw._ttls or evt.ttl is not None or self.metrics or fw._tracer
+        # A component's events go through this queue too (see
+        # add_component()); they must not replace this Ahsm's own
+        component = getattr(evt, "component", None)
+        slot = self._slots.get((component, evt.signal))
+        if slot is None:
+            slot = _CoalescedEvent(evt, component)
+            if stamp:
+                fw._stamp(self, slot, evt)
+            self._slots[component, evt.signal] = slot
+            if lifo:
+                self.mq.append(slot)
+            else:
+                self.mq.appendleft(slot)
+            if not self._scheduled:
+                self._scheduled = True
+                heapq.heappush(fw._ready, self.priority)
+            if self.metrics:
+                self.metrics.on_post(len(self.mq))
+        else:
+            Spy.on_ahsm_coalesced(self, slot.event, evt)
+            fw._drop_request(slot.event, RuntimeError,
+                             "was replaced by a newer event")
+            slot.event = evt
+            if stamp:
+                # The queueing latency counts from when the slot
+                # was queued; the deadline and trace are the newest post's
+                t_posted = slot.t_posted
+                fw._stamp(self, slot, evt)
+                slot.t_posted = t_posted
+            else:
+                slot.deadline = evt.deadline
+            self.coalesced += 1
+            if self.metrics:
+                self.metrics.on_coalesced()
+        Spy.on_ahsm_post(self, evt)
+        fw.run_to_completion()
+
+    def _pop_msg_coalescing(self):
+        entry = self.mq.pop()
+        if entry.__class__ is _CoalescedEvent:
+            del self._slots[entry.component, entry.signal]
+        return entry
+
+    def add_component(self, hsm):
+        """Makes the Hsm an orthogonal component of this Ahsm and
+        performs the Hsm's initial transition.  A component has no queue
+        or priority of its own: events posted to it and its TimeEvents
+        pass through this Ahsm's queue and are dispatched to it directly.
+        This Ahsm's state handlers may also dispatch events to it.
+        Call from this Ahsm's _initial() state handler.
+        """
+        hsm.container = self
+        if not self.__dict__.get("components"):
+            self.components = []
+            # Only Ahsms that have components pay for the routing
+            self.dispatch = self._dispatch_routed
+        self.components.append(hsm)
+        hsm.init()
+
+    def dispatch_components(self, event):
+        """Dispatches the event to each of this Ahsm's components in turn.
+        """
+        for hsm in self.components:
+            hsm.dispatch(event)
+
+    def _dispatch_routed(self, event):
+        """Dispatches the event to the component it is meant for,
+        otherwise to this Ahsm's state handlers.
+        """
+        hsm = getattr(event, "component", None)
+        if hsm is None:
+            self.__class__.dispatch(self, event)
+        elif event.__class__ is _ComponentEvent:
+            hsm.dispatch(event.event)
+        else:
+            hsm.dispatch(event)
+
     def has_msgs(self):
         return len(self.mq) > 0
 
 
-class TimeEvent():
+class Afsm(Fsm, Ahsm):
+    """An Augmented Finite State Machine: an Ahsm whose state machine
+    is a flat Fsm.  For high-rate actors that need no state hierarchy.
+    """
+
+
+class TimeEvent(BaseEvent):
     """TimeEvent is a composite class that contains Event-like fields.
     A TimeEvent is created by the application and added to the Framework.
     The Framework then posts the event to the HSM after the given delay.
     A one-shot TimeEvent is created by calling either post_at() or post_in().
     A periodic TimeEvent is created by calling the post_every() method.
     """
+
+    # The Framework of the Ahsm the TimeEvent was last armed for
+    framework = Framework
+
+    # The component the TimeEvent targets (see Ahsm.add_component()).
+    # The TimeEvent's act is then the component's container.
+    component = None
+
+    # The Ahsm the TimeEvent is armed for and its next expiration,
+    # while it is in its Framework's time events
+    _armed_for = None
+    _expiration = None
+
     def __init__(self, signame):
         self.signal = Signal.register(signame)
         self.value = None
@@ -706,34 +2202,47 @@ class TimeEvent():
         """
         return self.interval > 0
 
+    def _set_target(self, act):
+        """Targets the Ahsm or, if act is a component,
+        the component through its container.
+        """
+        if isinstance(act, Ahsm):
+            self.act = act
+            self.component = None
+        else:
+            assert act.container, "The target must be an Ahsm or a component"
+            self.act = act.container
+            self.component = act
+        self.framework = self.act.framework
+
     def post_at(self, act, abs_time):
-        """Posts this TimeEvent to the given Ahsm at a specified time.
+        """Posts this TimeEvent to the given Ahsm (or component)
+        at a specified time.
         """
-        assert isinstance(act, Ahsm)
-        self.act = act
+        self._set_target(act)
         self.interval = 0
-        Framework.add_time_event_at(self, abs_time)
+        self.framework.add_time_event_at(self, abs_time)
 
     def post_in(self, act, delta):
-        """Posts this TimeEvent to the given Ahsm after the time delta.
+        """Posts this TimeEvent to the given Ahsm (or component)
+        after the time delta.
         """
-        assert isinstance(act, Ahsm)
-        self.act = act
+        self._set_target(act)
         self.interval = 0
-        Framework.add_time_event(self, delta)
+        self.framework.add_time_event(self, delta)
 
     def post_every(self, act, delta):
-        """Posts this TimeEvent to the given Ahsm after the time delta
-        and every time delta thereafter until disarmed.
+        """Posts this TimeEvent to the given Ahsm (or component)
+        after the time delta and every time delta thereafter until disarmed.
         """
-        assert isinstance(act, Ahsm)
-        self.act = act
+        self._set_target(act)
         self.interval = delta
-        Framework.add_time_event(self, delta)
+        self.framework.add_time_event(self, delta)
 
     def disarm(self):
         """Removes this TimeEvent from the Framework's active time events.
         """
         self.act = None
+        self.component = None
         self.interval = 0
-        Framework.remove_time_event(self)
+        self.framework.remove_time_event(self)
@@ -0,0 +1,290 @@
+"""
+Copyright 2018 Dean Hall.  See LICENSE file for details.
+
+A live, top-like view of a farc program's MetricsServer:
+
+    python3 -m farc.top [--interval 1.0] [--sort depth] [--once] ADDRESS
+
+ADDRESS is a port on localhost, host:port or the path of a Unix socket.
+Keys: d (depth), r (rate), l (p99 latency), h (p99 handler time),
+n (name) and p (priority) pick the sort column; q quits.
+Without a terminal, or with --once, the table is printed and refreshed
+every interval (once with --once).
+"""
+
+
+import argparse
+import http.client
+import re
+import socket
+import sys
+import time
+
+
+_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+# sort key: (column, descending)
+SORTS = {
+    "depth": ("depth", True),
+    "rate": ("rate", True),
+    "p99": ("latency_p99", True),
+    "handler": ("handler_p99", True),
+    "name": ("name", False),
+    "priority": ("priority", False),
+}
+_KEYS = {"d": "depth", "r": "rate", "l": "p99", "h": "handler",
+         "n": "name", "p": "priority"}
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    """An HTTPConnection to a Unix socket.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def fetch(address, timeout=5.0):
+    """Returns the metrics text served at address.
+    """
+    if "/" in address:
+        conn = _UnixConnection(address, timeout)
+    elif ":" in address:
+        host, port = address.rsplit(":", 1)
+        conn = http.client.HTTPConnection(host, int(port), timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection("127.0.0.1", int(address),
+                                          timeout=timeout)
+    try:
+        conn.request("GET", "/metrics")
+        resp = conn.getresponse()
+        if resp.status != 200:
+            raise IOError("HTTP %d from %s" % (resp.status, address))
+        return resp.read().decode()
+    finally:
+        conn.close()
+
+
+def parse(text):
+    """Parses the Prometheus text into ({priority: actor dict}, globals).
+    An actor dict holds the actor's name, priority, depth, depth_max,
+    posted, dispatched, timers, expired and, for each histogram (latency and
+    handler), a sorted list of (upper bound, cumulative count).
+    """
+    actors = {}
+    globs = {}
+    for line in text.splitlines():
+        if not line or line[0] == "#":
+            continue
+        m = _LINE.match(line)
+        if not m:
+            continue
+        name, labels, value = m.groups()
+        value = float(value)
+        if not labels:
+            globs[name] = value
+            continue
+        labels = dict(_LABEL.findall(labels))
+        prio = int(labels.get("priority", -1))
+        act = actors.get(prio)
+        if act is None:
+            act = actors[prio] = {"name": labels.get("actor", "?"),
+                                  "priority": prio,
+                                  "latency": [], "handler": []}
+        if name.endswith("_bucket"):
+            hist = "latency" if name.startswith("farc_queue_latency") \
+                else "handler"
+            le = labels["le"]
+            act[hist].append(
+                (float("inf") if le == "+Inf" else float(le), value))
+        elif name == "farc_queue_depth":
+            act["depth"] = value
+        elif name == "farc_queue_depth_max":
+            act["depth_max"] = value
+        elif name == "farc_events_posted_total":
+            act["posted"] = value
+        elif name == "farc_events_dispatched_total":
+            act["dispatched"] = value
+        elif name == "farc_timers_fired_total":
+            act["timers"] = value
+        elif name == "farc_events_expired_total":
+            act["expired"] = value
+    for act in actors.values():
+        act["latency"].sort()
+        act["handler"].sort()
+    return actors, globs
+
+
+def percentile(buckets, q):
+    """Returns the upper bound of the bucket holding the q-th
+    quantile (0 < q < 1) of the cumulative buckets, or None if empty.
+    """
+    if not buckets or not buckets[-1][1]:
+        return None
+    rank = q * buckets[-1][1]
+    for bound, count in buckets:
+        if count >= rank:
+            return bound
+    return buckets[-1][0]
+
+
+def rows(actors, prev, dt):
+    """Returns the table rows of the actors, adding each actor's rate
+    (dispatches per second) since the previous sample, prev.
+    """
+    result = []
+    for prio, act in actors.items():
+        row = dict(act)
+        before = prev.get(prio)
+        if before is not None and dt > 0:
+            row["rate"] = max(0.0, act.get("dispatched", 0)
+                              - before.get("dispatched", 0)) / dt
+        else:
+            row["rate"] = 0.0
+        row["latency_p99"] = percentile(act["latency"], 0.99)
+        row["handler_p50"] = percentile(act["handler"], 0.50)
+        row["handler_p99"] = percentile(act["handler"], 0.99)
+        result.append(row)
+    return result
+
+
+def sort_rows(table, sort):
+    """Returns the rows sorted by the named column.
+    Missing percentiles sort as the smallest values.
+    """
+    col, reverse = SORTS[sort]
+    if col == "name":
+        key = lambda row: row["name"]
+    else:
+        key = lambda row: -1.0 if row[col] is None else row[col]
+    return sorted(table, key=key, reverse=reverse)
+
+
+def _secs(t):
+    if t is None:
+        return "-"
+    if t == float("inf"):
+        return "inf"
+    if t < 1e-3:
+        return "%.0fus" % (t * 1e6)
+    if t < 1.0:
+        return "%.1fms" % (t * 1e3)
+    return "%.2fs" % t
+
+
+def format_table(table, globs, sort):
+    """Returns the lines of the table.
+    """
+    lines = [
+        "farc top  actors: %d  timers armed: %d  loop lag: %s (max %s)"
+        "  sort: %s" % (
+            globs.get("farc_actors", 0), globs.get("farc_timers_armed", 0),
+            _secs(globs.get("farc_loop_lag_seconds")),
+            _secs(globs.get("farc_loop_lag_max_seconds")), sort),
+        "%5s %-20s %7s %7s %10s %9s %9s %9s %8s %8s" % (
+            "PRIO", "ACTOR", "DEPTH", "MAX", "EVT/S", "LAT p99",
+            "HND p50", "HND p99", "TIMERS", "EXPIRED"),
+    ]
+    for row in sort_rows(table, sort):
+        lines.append("%5d %-20.20s %7d %7d %10.1f %9s %9s %9s %8d %8d" % (
+            row["priority"], row["name"], row.get("depth", 0),
+            row.get("depth_max", 0), row["rate"],
+            _secs(row["latency_p99"]), _secs(row["handler_p50"]),
+            _secs(row["handler_p99"]), row.get("timers", 0),
+            row.get("expired", 0)))
+    return lines
+
+
+class Sampler():
+    """Fetches the metrics and keeps the previous sample for rates.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.prev = {}
+        self.t_prev = None
+
+    def sample(self):
+        actors, globs = parse(fetch(self.address))
+        now = time.monotonic()
+        dt = now - self.t_prev if self.t_prev is not None else 0.0
+        table = rows(actors, self.prev, dt)
+        self.prev, self.t_prev = actors, now
+        return table, globs
+
+
+def _run_curses(stdscr, sampler, sort, interval):
+    import curses
+    curses.curs_set(0)
+    stdscr.timeout(int(interval * 1000))
+    table, globs, error = [], {}, None
+    t_next = 0.0
+    while True:
+        if time.monotonic() >= t_next:
+            t_next = time.monotonic() + interval
+            try:
+                table, globs = sampler.sample()
+                error = None
+            except (OSError, ValueError) as e:
+                error = str(e)
+        stdscr.erase()
+        height, width = stdscr.getmaxyx()
+        lines = format_table(table, globs, sort)
+        if error:
+            lines.insert(1, "error: %s" % error)
+        for y, line in enumerate(lines[:height]):
+            stdscr.addnstr(y, 0, line, width - 1,
+                           curses.A_REVERSE if y == 1 and not error else 0)
+        stdscr.refresh()
+        ch = stdscr.getch()
+        if ch < 0:
+            continue
+        key = chr(ch) if ch < 256 else ""
+        if key in ("q", "Q"):
+            return
+        if key in _KEYS:
+            sort = _KEYS[key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m farc.top",
+        description="Live view of a farc MetricsServer")
+    parser.add_argument("address",
+        help="port on localhost, host:port or path of a Unix socket")
+    parser.add_argument("-i", "--interval", type=float, default=1.0,
+        help="seconds between samples (default 1.0)")
+    parser.add_argument("-s", "--sort", choices=sorted(SORTS),
+        default="depth", help="sort column (default depth)")
+    parser.add_argument("-1", "--once", action="store_true",
+        help="print the table once and exit")
+    args = parser.parse_args(argv)
+
+    sampler = Sampler(args.address)
+    try:
+        if args.once:
+            # Two samples, so the rates are meaningful
+            sampler.sample()
+            time.sleep(min(args.interval, 1.0))
+            print("\n".join(format_table(*sampler.sample(), args.sort)))
+        elif sys.stdout.isatty():
+            import curses
+            curses.wrapper(_run_curses, sampler, args.sort, args.interval)
+        else:
+            while True:
+                print("\n".join(format_table(*sampler.sample(), args.sort)))
+                print(flush=True)
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        sys.exit("farc.top: %s: %s" % (args.address, e))
+
+if __name__ == "__main__":
+    main()
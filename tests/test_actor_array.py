@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""This test checks an ActorArray's vectorized transitions
+and its entry and exit callbacks.
+"""
+
+
+import unittest
+
+import farc
+
+try:
+    import numpy as np
+    from farc.ActorArray import ActorArray, BatchEvent
+except ImportError:
+    np = None
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+def make_sensors(n):
+    class Sensors(ActorArray):
+        def __init__(self):
+            super().__init__(n, ("normal", "alarm", "fault"), "normal")
+            self.alarms = []
+            self.cleared = []
+            self.readings = np.zeros(n)
+            self.on("READING", None, None,
+                    when=lambda arr, idx, val: np.isnan(val),
+                    action=Sensors._nan)
+            self.on("READING", "normal", "alarm",
+                    when=lambda arr, idx, val: val > 100.0)
+            self.on("READING", "alarm", "normal",
+                    when=lambda arr, idx, val: val < 90.0)
+            self.on("RESET", "fault", "normal")
+            self.on_entry("alarm", Sensors._alarm)
+            self.on_exit("alarm", Sensors._clear)
+
+        def _nan(self, idx, val):
+            self.state[idx] = self.code("fault")
+
+        def _alarm(self, idx, val):
+            self.alarms.extend(idx.tolist())
+
+        def _clear(self, idx, val):
+            self.cleared.extend(idx.tolist())
+
+    return Sensors()
+
+
+@unittest.skipIf(np is None, "requires numpy")
+class TestActorArray(unittest.TestCase):
+    def setUp(self):
+        self.arr = make_sensors(10)
+        self.arr.start(111)
+
+    def tearDown(self):
+        self.arr.end()
+
+    def test_initial(self,):
+        self.assertEqual(self.arr.counts(),
+                         {"normal": 10, "alarm": 0, "fault": 0})
+
+    def test_batch(self,):
+        self.arr.post_fifo(BatchEvent(farc.Signal.READING,
+                                      [1, 2, 3], [150.0, 50.0, 101.0]))
+        self.assertEqual(self.arr.in_state("alarm").tolist(), [1, 3])
+        self.assertEqual(self.arr.alarms, [1, 3])
+
+        # Hysteresis: 95 keeps 1 in alarm, 80 clears 3
+        self.arr.post_fifo(BatchEvent(farc.Signal.READING,
+                                      [1, 3], [95.0, 80.0]))
+        self.assertEqual(self.arr.in_state("alarm").tolist(), [1])
+        self.assertEqual(self.arr.cleared, [3])
+
+    def test_action_without_transition(self,):
+        self.arr.post_fifo(BatchEvent(farc.Signal.READING,
+                                      [4, 5], [float("nan"), 200.0]))
+        self.assertEqual(self.arr.in_state("fault").tolist(), [4])
+        self.assertEqual(self.arr.in_state("alarm").tolist(), [5])
+        # An Event whose value is (idx, values) works too
+        self.arr.post_fifo(farc.Event(farc.Signal.RESET, ([4], None)))
+        self.assertEqual(self.arr.in_state("fault").tolist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
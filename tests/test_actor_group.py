@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""This test checks that an ActorGroup routes posted and published events
+to its least-loaded member (pool mode) or to the member owning the
+event's key (partition mode), and combines the members' metrics.
+"""
+
+
+import unittest
+
+import farc
+from farc.ActorGroup import ActorGroup
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Worker(farc.Ahsm):
+    def __init__(self):
+        super().__init__()
+        self.received = []
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("JOB")
+        return self.tran(Worker._working)
+
+    @farc.Hsm.state
+    def _working(self, event):
+        if event.signal == farc.Signal.JOB:
+            self.received.append(event.value)
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestActorGroup(unittest.TestCase):
+    def tearDown(self):
+        farc.Framework.disable_metrics()
+        if self.group.members[0] in farc.Framework._ahsm_registry:
+            self.group.end()
+
+    def _burst(self, values):
+        """Posts JOBs to the group without running the Framework,
+        so the members' queues fill up, then runs it.
+        """
+        fw = farc.Framework
+        fw.run_to_completion = lambda: None
+        for v in values:
+            self.group.post_fifo(farc.Event(farc.Signal.JOB, v))
+        fw.run_to_completion = fw.run
+        fw.run()
+
+    def test_pool_spreads_load(self,):
+        self.group = ActorGroup(Worker, 4)
+        self.group.start(130)
+        self._burst(range(10))
+        counts = [len(act.received) for act in self.group.members]
+        self.assertEqual(sum(counts), 10)
+        self.assertLessEqual(max(counts) - min(counts), 1)
+        self.assertEqual(self.group.routed, counts)
+
+    def test_pool_prefers_idle_member(self,):
+        self.group = ActorGroup(Worker, 3)
+        self.group.start(130)
+        busy = self.group.members[0]
+        busy.mq.appendleft(farc.Event(farc.Signal.JOB, "queued"))
+        busy.mq.appendleft(farc.Event(farc.Signal.JOB, "queued"))
+        self.group._next = 0
+        self.assertIsNot(self.group.member_for(None), busy)
+        farc.Framework.run()
+
+    def test_partition_keeps_key_order(self,):
+        self.group = ActorGroup(Worker, 4, mode="partition",
+                                key=lambda event: event.value[0])
+        self.group.start(130)
+        values = [(key, seq) for seq in range(20) for key in "abcdefgh"]
+        self._burst(values)
+        owners = {}
+        for act in self.group.members:
+            for key, seq in act.received:
+                owners.setdefault(key, set()).add(act.member_index)
+            for key in set(k for k, _ in act.received):
+                seqs = [s for k, s in act.received if k == key]
+                self.assertEqual(seqs, sorted(seqs))
+        # Each key went to exactly one member
+        self.assertTrue(all(len(m) == 1 for m in owners.values()))
+        self.assertEqual(len(owners), 8)
+
+    def test_publish_and_metrics(self,):
+        self.group = ActorGroup(Worker, 2)
+        self.group.start(130)
+        farc.Framework.subscribe("JOB", self.group)
+        farc.Framework.enable_metrics()
+        for v in range(6):
+            farc.Framework.publish(farc.Event(farc.Signal.JOB, v))
+        m = self.group.get_metrics()
+        self.assertEqual(m["members"], 2)
+        self.assertEqual(m["posted"], 6)
+        self.assertEqual(m["dispatched"], 6)
+        self.assertEqual(m["depth"], 0)
+        self.group.end()
+        self.assertNotIn(self.group, farc.Framework._subscriptions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""This test checks that the BufferedWriter used by the trace spies
+writes every appended record and rotates its output file.
+"""
+
+
+import os
+import tempfile
+import unittest
+
+from farc.BufferedWriter import BufferedWriter
+
+
+class LineSink():
+    def open(self, path):
+        self._file = open(path, "w")
+
+    def write(self, record):
+        self._file.write("%d\n" % record[0])
+
+    def size(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+class TestBufferedWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "trace.txt")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_all_records_written(self,):
+        w = BufferedWriter(LineSink(), self.path)
+        for n in range(1000):
+            w.append((n,))
+        w.close()
+        with open(self.path) as f:
+            self.assertEqual(f.read().split(), [str(n) for n in range(1000)])
+
+    def test_rotation(self,):
+        w = BufferedWriter(LineSink(), self.path,
+                           max_bytes=100, backup_count=2)
+        for n in range(1000):
+            w.append((n,))
+        w.close()
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        self.assertTrue(os.path.exists(self.path + ".2"))
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        with open(self.path) as f:
+            self.assertEqual(f.read().split()[-1], "999")
+
+
+if __name__ == '__main__':
+    unittest.main()
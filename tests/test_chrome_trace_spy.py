@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""This test records a session with ChromeTraceSpy and checks
+the trace events: a named track per Ahsm, handler and transition slices,
+instant events for posts and TimeEvents and flows from post to dispatch.
+"""
+
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import farc
+from farc.ChromeTraceSpy import ChromeTraceSpy
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Pinger(farc.Ahsm):
+    """Turns each GO into a PING to the ponger, each PAIR into two.
+    A PAIR of "end" then ends the ponger.
+    """
+
+    def __init__(self, ponger):
+        super().__init__()
+        self.ponger = ponger
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register_many("GO", "PAIR", "PING")
+        return self.tran(Pinger._ready)
+
+    @farc.Hsm.state
+    def _ready(self, event):
+        if event.signal == farc.Signal.GO:
+            self.ponger.post_fifo(farc.Event(farc.Signal.PING, None))
+            return self.handled(event)
+        if event.signal == farc.Signal.PAIR:
+            self.ponger.post_fifo(farc.Event(farc.Signal.PING, 1))
+            self.ponger.post_fifo(farc.Event(farc.Signal.PING, 2))
+            if event.value == "end":
+                self.ponger.end()
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class Ponger(farc.Ahsm):
+    """Toggles between two states on each PING; raises on BOOM."""
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register_many("PING", "BOOM")
+        self.tmr = farc.TimeEvent("TICK")
+        return self.tran(Ponger._idle)
+
+    @farc.Hsm.state
+    def _idle(self, event):
+        if event.signal == farc.Signal.PING:
+            return self.tran(Ponger._pinged)
+        if event.signal == farc.Signal.BOOM:
+            raise RuntimeError("boom")
+        return self.super(self.top)
+
+    @farc.Hsm.state
+    def _pinged(self, event):
+        if event.signal == farc.Signal.PING:
+            return self.tran(Ponger._idle)
+        return self.super(self.top)
+
+
+class TestChromeTraceSpy(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "trace.json")
+        ChromeTraceSpy.configure(self.path)
+        farc.Spy.enable_spy(ChromeTraceSpy)
+        self.ponger = Ponger()
+        self.ponger.start(129)
+        self.pinger = Pinger(self.ponger)
+        self.pinger.start(128)
+
+    def tearDown(self):
+        for act in (self.pinger, self.ponger):
+            if act in farc.Framework._ahsm_registry:
+                act.end()
+        farc.Spy.disable_spy()
+        farc.Framework.configure_flight_recorder()
+        self.tmpdir.cleanup()
+
+    def _events(self):
+        ChromeTraceSpy.on_framework_stop()
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_trace_events(self,):
+        self.pinger.post_fifo(farc.Event(farc.Signal.GO, None))
+        self.pinger.post_fifo(farc.Event(farc.Signal.GO, None))
+        self.ponger.tmr.post_in(self.ponger, 0.0)
+        farc.Framework._event_loop.run_until_complete(asyncio.sleep(0.01))
+        events = self._events()
+
+        names = {e["tid"]: e["args"]["name"] for e in events
+                 if e["ph"] == "M" and e["name"] == "thread_name"}
+        self.assertEqual(names, {128: "Pinger(128)", 129: "Ponger(129)"})
+
+        slices = [(e["tid"], e["name"]) for e in events if e["ph"] == "X"]
+        self.assertEqual(slices.count((128, "GO")), 2)
+        self.assertEqual(slices.count((129, "PING")), 2)
+        self.assertEqual(slices.count((129, "TICK")), 1)
+        trans = [e for e in events
+                 if e["ph"] == "X" and e["name"].startswith("tran")]
+        self.assertEqual([e["name"] for e in trans],
+                         ["tran _pinged", "tran _idle"])
+        self.assertEqual(trans[0]["args"]["source"], "Ponger._idle")
+
+        instants = [(e["tid"], e["name"]) for e in events if e["ph"] == "i"]
+        self.assertIn((128, "post GO"), instants)
+        self.assertIn((128, "post PING to Ponger(129)"), instants)
+        self.assertIn((129, "timer TICK"), instants)
+
+        starts = {e["id"]: e for e in events if e["ph"] == "s"}
+        ends = {e["id"]: e for e in events if e["ph"] == "f"}
+        self.assertEqual(len(starts), 2)
+        self.assertEqual(sorted(starts), sorted(ends))
+        for flow, start in starts.items():
+            self.assertEqual((start["tid"], ends[flow]["tid"]), (128, 129))
+            self.assertLessEqual(start["ts"], ends[flow]["ts"])
+
+    def test_raising_handler(self,):
+        farc.Framework.configure_flight_recorder(
+            path=os.path.join(self.tmpdir.name, "flight.txt"), signum=None)
+        with self.assertRaises(RuntimeError):
+            self.ponger.post_fifo(farc.Event(farc.Signal.BOOM, None))
+        self.assertEqual(ChromeTraceSpy._stack, [])
+        # A post from outside a handler is not drawn as a flow
+        self.pinger.post_fifo(farc.Event(farc.Signal.GO, None))
+        events = self._events()
+        failed, = [e for e in events
+                   if e["ph"] == "X" and e["name"] == "BOOM"]
+        self.assertIn("boom", failed["args"]["error"])
+        self.assertEqual(len([e for e in events if e["ph"] == "s"]), 1)
+
+    def _pair(self, value):
+        """Posts a PAIR while the Framework is not running,
+        so the ponger's PINGs queue up behind it, then runs.
+        """
+        fw = farc.Framework
+        fw.run_to_completion = lambda: None
+        try:
+            self.pinger.post_fifo(farc.Event(farc.Signal.PAIR, value))
+            fw._run_ready()
+        finally:
+            fw.run_to_completion = fw.run
+
+    def test_coalesced_flow(self,):
+        self.ponger.coalesce("PING")
+        self._pair(None)
+        # The first PING was replaced in the queue; its flow was dropped
+        self.assertEqual(ChromeTraceSpy._flows[129], {})
+        events = self._events()
+        self.assertEqual(len([e for e in events if e["ph"] == "s"]), 2)
+        self.assertEqual(len([e for e in events if e["ph"] == "f"]), 1)
+
+    def test_removed_flows(self,):
+        self._pair("end")
+        self.assertNotIn(129, ChromeTraceSpy._flows)
+
+
+if __name__ == '__main__':
+    unittest.main()
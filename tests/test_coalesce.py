@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""This test checks that an Ahsm that coalesces a signal keeps
+at most one queued event of it, holding the newest value,
+at the queue position of the oldest one.
+"""
+
+
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Tracker(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("POSITION")
+        farc.Signal.register("COMMAND")
+        self.coalesce("POSITION")
+        self.received = []
+        return self.tran(Tracker._tracking)
+
+    @farc.Hsm.state
+    def _tracking(self, event):
+        if event.signal in (farc.Signal.POSITION, farc.Signal.COMMAND):
+            self.received.append((farc.Signal.to_str(event.signal),
+                                  event.value))
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class Compass(farc.Hsm):
+    """A component of a Tracker that also receives POSITIONs."""
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        self.received = []
+        return self.tran(Compass._reading)
+
+    @farc.Hsm.state
+    def _reading(self, event):
+        if event.signal == farc.Signal.POSITION:
+            self.received.append(event.value)
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestCoalesce(unittest.TestCase):
+    def setUp(self):
+        farc.Framework.enable_metrics()
+        self.sm = Tracker()
+        self.sm.start(116)
+
+    def tearDown(self):
+        farc.Framework.disable_metrics()
+        self.sm.end()
+
+    def _burst(self, events):
+        """Posts the events while the Framework is not running,
+        then runs it.
+        """
+        fw = farc.Framework
+        fw.run_to_completion = lambda: None
+        for post, evt in events:
+            post(evt)
+        fw.run_to_completion = fw.run
+        fw.run()
+
+    def test_newest_value_wins(self,):
+        pos = lambda v: (self.sm.post_fifo, farc.Event(farc.Signal.POSITION, v))
+        cmd = lambda v: (self.sm.post_fifo, farc.Event(farc.Signal.COMMAND, v))
+        self._burst([pos(0), cmd("a"), pos(1), pos(2), cmd("b"), pos(3)])
+        self.assertEqual(self.sm.received, [
+            ("POSITION", 3), ("COMMAND", "a"), ("COMMAND", "b")])
+        self.assertEqual(self.sm.coalesced, 3)
+        m = farc.Framework.get_metrics()[116]
+        self.assertEqual(m["coalesced"], 3)
+        self.assertEqual(m["posted"], 6)
+        self.assertEqual(m["dispatched"], 3)
+        self.assertEqual(m["depth_hwm"], 3)
+
+    def test_new_slot_after_dispatch(self,):
+        for v in range(3):
+            self.sm.post_fifo(farc.Event(farc.Signal.POSITION, v))
+        self.assertEqual(self.sm.received,
+                         [("POSITION", 0), ("POSITION", 1), ("POSITION", 2)])
+        self.assertEqual(self.sm.coalesced, 0)
+        self.assertEqual(len(self.sm.mq), 0)
+
+    def test_lifo(self,):
+        pos = lambda v: (self.sm.post_lifo, farc.Event(farc.Signal.POSITION, v))
+        cmd = lambda v: (self.sm.post_fifo, farc.Event(farc.Signal.COMMAND, v))
+        self._burst([cmd("a"), pos(0), cmd("b"), pos(1)])
+        self.assertEqual(self.sm.received, [
+            ("POSITION", 1), ("COMMAND", "a"), ("COMMAND", "b")])
+
+    def test_stale_slot_is_shed(self,):
+        old = farc.Event(farc.Signal.POSITION, "old")
+        new = farc.Event(farc.Signal.POSITION, "new")
+        new.deadline = 0.0
+        self._burst([(self.sm.post_fifo, old), (self.sm.post_fifo, new)])
+        # The replacement's deadline applies to the slot
+        self.assertEqual(self.sm.received, [])
+        self.assertEqual(farc.Framework.get_metrics()[116]["expired"], 1)
+
+    def test_component_slots(self,):
+        compass = Compass()
+        self.sm.add_component(compass)
+        pos = lambda post, v: (post, farc.Event(farc.Signal.POSITION, v))
+        self._burst([pos(self.sm.post_fifo, 1), pos(compass.post_fifo, 2),
+                     pos(compass.post_fifo, 3)])
+        # The component's events replace each other, not the Ahsm's own
+        self.assertEqual(self.sm.received, [("POSITION", 1)])
+        self.assertEqual(compass.received, [3])
+        self.assertEqual(self.sm.coalesced, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
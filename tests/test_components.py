@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""This test checks orthogonal components: plain Hsms owned by an Ahsm
+that receive events and TimeEvents through the Ahsm's queue.
+"""
+
+
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Lamp(farc.Hsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("TOGGLE")
+        self.timer = farc.TimeEvent("TIMEOUT")
+        return self.tran(Lamp._off)
+
+    @farc.Hsm.state
+    def _off(self, event):
+        if event.signal == farc.Signal.TOGGLE:
+            return self.tran(Lamp._on)
+        return self.super(self.top)
+
+    @farc.Hsm.state
+    def _on(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.timer.post_in(self, 0.005)
+            return self.handled(event)
+        if sig in (farc.Signal.TOGGLE, farc.Signal.TIMEOUT):
+            return self.tran(Lamp._off)
+        return self.super(self.top)
+
+
+class Room(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("ALL_ON")
+        self.seen = []
+        self.left = Lamp()
+        self.right = Lamp()
+        self.add_component(self.left)
+        self.add_component(self.right)
+        return self.tran(Room._running)
+
+    @farc.Hsm.state
+    def _running(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ALL_ON:
+            self.dispatch_components(farc.Event(farc.Signal.TOGGLE, None))
+            return self.handled(event)
+        if sig not in (farc.Signal.ENTRY, farc.Signal.EXIT,
+                       farc.Signal.EMPTY, farc.Signal.INIT):
+            self.seen.append(sig)
+        return self.super(self.top)
+
+
+class TestComponents(unittest.TestCase):
+    def setUp(self):
+        self.room = Room()
+        self.room.start(109)
+
+    def tearDown(self):
+        self.room.end()
+
+    def test_initialized(self,):
+        self.assertEqual(self.room.left._state, Lamp._off)
+        self.assertIs(self.room.left.container, self.room)
+
+    def test_routed_post(self,):
+        # The TOGGLE goes to the left Lamp only, not to Room's handlers
+        self.room.left.post_fifo(farc.Event(farc.Signal.TOGGLE, None))
+        self.assertEqual(self.room.left._state, Lamp._on)
+        self.assertEqual(self.room.right._state, Lamp._off)
+        self.assertEqual(self.room.seen, [])
+
+    def test_dispatch_components(self,):
+        self.room.post_fifo(farc.Event(farc.Signal.ALL_ON, None))
+        self.assertEqual(self.room.left._state, Lamp._on)
+        self.assertEqual(self.room.right._state, Lamp._on)
+
+    def test_component_timer(self,):
+        self.room.right.post_fifo(farc.Event(farc.Signal.TOGGLE, None))
+        self.assertEqual(self.room.right._state, Lamp._on)
+        # The TimeEvent was armed for the container, on behalf of the Lamp
+        self.assertIs(self.room.right.timer.act, self.room)
+        loop = farc.Framework._event_loop
+        loop.call_later(0.05, loop.stop)
+        loop.run_forever()
+        self.assertEqual(self.room.right._state, Lamp._off)
+        self.assertEqual(self.room.seen, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
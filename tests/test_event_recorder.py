@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""This test records the externally injected events of a session,
+replays them into a fresh Ahsm as fast as possible
+and verifies that the replay ends in the recorded state.
+Posts to components and of events that are not Events
+are recorded too.
+"""
+
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import farc
+from farc.ActorArray import BatchEvent
+from farc.EventRecorder import EventRecorder, EventReplayer
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class BlinkSM(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("BUMP")
+        self.bumps = 0
+        self.tmr = farc.TimeEvent("BLINK")
+        return self.tran(BlinkSM._off)
+
+    @farc.Hsm.state
+    def _off(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.tmr.post_in(self, 1.0)
+            return self.handled(event)
+        elif sig == farc.Signal.BLINK:
+            return self.tran(BlinkSM._on)
+        elif sig == farc.Signal.BUMP:
+            self.bumps += 1
+            return self.handled(event)
+        return self.super(self.top)
+
+    @farc.Hsm.state
+    def _on(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.tmr.post_in(self, 1.5)
+            return self.handled(event)
+        elif sig == farc.Signal.BLINK:
+            return self.tran(BlinkSM._off)
+        elif sig == farc.Signal.BUMP:
+            self.bumps += 10
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class Knob(farc.Hsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        self.turns = 0
+        return self.tran(Knob._idle)
+
+    @farc.Hsm.state
+    def _idle(self, event):
+        if event.signal == farc.Signal.BUMP:
+            self.turns += 1
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class PanelSM(farc.Ahsm):
+    """Has two Knob components and keeps the indices of each BATCH."""
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register_many("BUMP", "BATCH")
+        self.batches = []
+        self.tmr = farc.TimeEvent("PANEL_TICK")
+        self.knobs = [Knob(), Knob()]
+        for knob in self.knobs:
+            self.add_component(knob)
+        return self.tran(PanelSM._running)
+
+    @farc.Hsm.state
+    def _running(self, event):
+        if event.signal == farc.Signal.BATCH:
+            self.batches.append(event.value[0].tolist())
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestEventRecorder(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "events.rec")
+
+    def tearDown(self):
+        self.sm.tmr.disarm()
+        self.sm.end()
+        farc.Framework.set_clock(farc.Clock())
+        farc.Framework.configure_flight_recorder()
+        self.tmpdir.cleanup()
+
+    def test_record_replay(self,):
+        # Record a session driven by a virtual clock
+        farc.Framework.set_clock(farc.VirtualClock(stop_at=6.2))
+        self.sm = BlinkSM()
+        self.sm.start(105)
+        recorder = EventRecorder(self.path)
+        recorder.start()
+        self.sm.post_fifo(farc.Event(farc.Signal.BUMP, None))
+        farc.Framework._event_loop.call_soon(
+            farc.Framework.post, farc.Event(farc.Signal.BUMP, None), self.sm)
+        farc.Framework._event_loop.run_forever()
+        recorded_bumps = self.sm.bumps
+        # The second BUMP arrives after the first BLINK
+        self.assertEqual(recorded_bumps, 11)
+        self.sm.tmr.disarm()
+        self.sm.end()
+        farc.Framework.set_clock(farc.Clock())
+
+        # Replay into a fresh Ahsm; counting its dispatches
+        # must not depend on the flight recorder
+        farc.Framework.configure_flight_recorder(depth=0)
+        replayer = EventReplayer(self.path)
+        self.sm = BlinkSM()
+        self.sm.start(105)
+        stats = replayer.run()
+        # two BUMPs and timers at 1.0, 2.5, 3.5, 5.0 and 6.0
+        self.assertEqual(stats["events"], 7)
+        self.assertEqual(stats["dispatched"], 7)
+        self.assertEqual(self.sm.bumps, recorded_bumps)
+        self.assertEqual(replayer.verify(), {})
+
+    def test_components_and_batches(self,):
+        self.sm = PanelSM()
+        self.sm.start(136)
+        recorder = EventRecorder(self.path)
+        recorder.start()
+        self.sm.knobs[1].post_fifo(farc.Event(farc.Signal.BUMP, None))
+        self.sm.post_fifo(BatchEvent(farc.Signal.BATCH, [1, 2]))
+        # An event that can not be pickled is skipped, not an error
+        with self.assertWarns(RuntimeWarning):
+            self.sm.post_fifo(BatchEvent(
+                farc.Signal.BATCH, [0], np.array([lambda: 0], dtype=object)))
+        recorder.stop()
+        self.assertEqual(self.sm.batches, [[1, 2], [0]])
+        self.sm.end()
+
+        replayer = EventReplayer(self.path)
+        self.sm = PanelSM()
+        self.sm.start(136)
+        stats = replayer.run()
+        self.assertEqual(stats["events"], 2)
+        self.assertEqual([k.turns for k in self.sm.knobs], [0, 1])
+        self.assertEqual(self.sm.batches, [[1, 2]])
+        self.assertEqual(replayer.verify(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""This test checks that each Ahsm's flight recorder keeps
+its most recent dispatches and that the recorders are dumped
+when an exception escapes a state handler.
+"""
+
+
+import os
+import tempfile
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class FragileSM(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("TICK")
+        farc.Signal.register("BREAK")
+        return self.tran(FragileSM._ticking)
+
+    @farc.Hsm.state
+    def _ticking(self, event):
+        sig = event.signal
+        if sig == farc.Signal.TICK:
+            return self.handled(event)
+        elif sig == farc.Signal.BREAK:
+            raise RuntimeError("broken")
+        return self.super(self.top)
+
+
+class TestFlightRecorder(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "flight.txt")
+        farc.Framework.configure_flight_recorder(depth=4, path=self.path,
+                                                 signum=None)
+        self.sm = FragileSM()
+        self.sm.start(103)
+
+    def tearDown(self):
+        self.sm.end()
+        farc.Framework.configure_flight_recorder()
+        self.tmpdir.cleanup()
+
+    def test_keeps_recent(self,):
+        for _ in range(6):
+            self.sm.post_fifo(farc.Event(farc.Signal.TICK, None))
+        self.assertEqual(self.sm.flight.count, 6)
+        entries = self.sm.flight.entries()
+        self.assertEqual(len(entries), 4)
+        for t, sig, st, dur in entries:
+            self.assertEqual(sig, farc.Signal.TICK)
+            self.assertIs(st, FragileSM._ticking)
+            self.assertGreaterEqual(dur, 0.0)
+        self.assertEqual([e[0] for e in entries],
+                         sorted(e[0] for e in entries))
+
+    def test_dump_on_exception(self,):
+        self.sm.post_fifo(farc.Event(farc.Signal.TICK, None))
+        with self.assertRaises(RuntimeError):
+            self.sm.post_fifo(farc.Event(farc.Signal.BREAK, None))
+        with open(self.path) as f:
+            dump = f.read()
+        self.assertIn("FragileSM priority=103 state=_ticking", dump)
+        self.assertIn("TICK -> _ticking", dump)
+        # The dispatch that raised is recorded before the dump
+        self.assertIn("BREAK in _ticking raised RuntimeError('broken')", dump)
+        self.assertEqual(self.sm.flight.count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
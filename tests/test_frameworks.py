@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""This test runs two independent Frameworks, each on its own
+event loop in its own thread, and bounces events between them.
+"""
+
+
+import asyncio
+import threading
+import unittest
+
+import farc
+
+
+N_ROUND_TRIPS = 1000
+
+
+class Ponger(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("PING")
+        farc.Signal.register("PONG")
+        return self.tran(Ponger._ponging)
+
+    @farc.Hsm.state
+    def _ponging(self, event):
+        if event.signal == farc.Signal.PING:
+            self.peer.post_fifo(farc.Event(farc.Signal.PONG, None))
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class Pinger(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        self.count = 0
+        self.threads = set()
+        return self.tran(Pinger._pinging)
+
+    @farc.Hsm.state
+    def _pinging(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.peer.post_fifo(farc.Event(farc.Signal.PING, None))
+            return self.handled(event)
+        if sig == farc.Signal.PONG:
+            self.threads.add(threading.get_ident())
+            self.count += 1
+            if self.count < N_ROUND_TRIPS:
+                self.peer.post_fifo(farc.Event(farc.Signal.PING, None))
+            else:
+                self.done.set()
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestFrameworks(unittest.TestCase):
+    def test_cross_thread_post(self,):
+        fw_a = farc.Framework.new()
+        fw_b = farc.Framework.new()
+        fw_a.bind(asyncio.new_event_loop())
+        fw_b.bind(asyncio.new_event_loop())
+
+        pinger = Pinger()
+        ponger = Ponger()
+        pinger.peer = ponger
+        ponger.peer = pinger
+        pinger.done = threading.Event()
+        # Priorities only need to be unique within a Framework
+        ponger.start(0, fw_b)
+        pinger.start(0, fw_a)
+        self.assertIs(pinger.framework, fw_a)
+        self.assertNotIn(pinger, farc.Framework._ahsm_registry)
+
+        threads = [threading.Thread(target=farc.run_forever, args=(fw,))
+                   for fw in (fw_a, fw_b)]
+        for t in threads:
+            t.start()
+        self.assertTrue(pinger.done.wait(10.0))
+        for fw in (fw_a, fw_b):
+            fw._event_loop.call_soon_threadsafe(fw.stop)
+        for t in threads:
+            t.join()
+
+        self.assertEqual(pinger.count, N_ROUND_TRIPS)
+        # Every PONG was dispatched by fw_a's thread
+        self.assertEqual(pinger.threads, {threads[0].ident})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""This test checks the flat Afsm's transitions, ENTRY/EXIT actions
+and that it receives posted, published and time events.
+"""
+
+
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Toggle(farc.Afsm):
+    @farc.Fsm.state
+    def _initial(self, event):
+        farc.Signal.register("FLIP")
+        farc.Framework.subscribe("FLIP_ALL", self)
+        self.log = []
+        self.tmr = farc.TimeEvent("FLIP")
+        return self.tran(Toggle._off)
+
+    @farc.Fsm.state
+    def _off(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.log.append("off-ENTRY")
+            return self.handled(event)
+        if sig == farc.Signal.EXIT:
+            self.log.append("off-EXIT")
+            return self.handled(event)
+        if sig in (farc.Signal.FLIP, farc.Signal.FLIP_ALL):
+            return self.tran(Toggle._on)
+        return self.ignored(event)
+
+    @farc.Fsm.state
+    def _on(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            self.log.append("on-ENTRY")
+            return self.handled(event)
+        if sig in (farc.Signal.FLIP, farc.Signal.FLIP_ALL):
+            return self.tran(Toggle._off)
+        return self.ignored(event)
+
+
+class TestFsm(unittest.TestCase):
+    def setUp(self):
+        self.sm = Toggle()
+        self.sm.start(110)
+
+    def tearDown(self):
+        self.sm.tmr.disarm()
+        self.sm.end()
+
+    def test_init(self,):
+        self.assertEqual(self.sm._state, Toggle._off)
+        self.assertEqual(self.sm.log, ["off-ENTRY"])
+
+    def test_post(self,):
+        self.sm.post_fifo(farc.Event(farc.Signal.FLIP, None))
+        self.assertEqual(self.sm._state, Toggle._on)
+        self.assertEqual(self.sm.log, ["off-ENTRY", "off-EXIT", "on-ENTRY"])
+
+    def test_ignored(self,):
+        self.sm.post_fifo(farc.Event(farc.Signal.INIT, None))
+        self.assertEqual(self.sm._state, Toggle._off)
+        self.assertEqual(self.sm.log, ["off-ENTRY"])
+
+    def test_publish(self,):
+        farc.Framework.publish(farc.Event(farc.Signal.FLIP_ALL, None))
+        self.assertEqual(self.sm._state, Toggle._on)
+
+    def test_time_event(self,):
+        self.sm.tmr.post_in(self.sm, 0.005)
+        loop = farc.Framework._event_loop
+        loop.call_later(0.05, loop.stop)
+        loop.run_forever()
+        self.assertEqual(self.sm._state, Toggle._on)
+
+
+if __name__ == '__main__':
+    unittest.main()
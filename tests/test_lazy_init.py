@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""This test checks that importing farc has no side effects
+and that the Framework binds to the event loop of asyncio.run().
+"""
+
+
+import asyncio
+import subprocess
+import sys
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class TickSM(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        self.ticks = 0
+        self.tmr = farc.TimeEvent("TICK")
+        self.tmr.post_every(self, 0.01)
+        return self.tran(TickSM._ticking)
+
+    @farc.Hsm.state
+    def _ticking(self, event):
+        if event.signal == farc.Signal.TICK:
+            self.ticks += 1
+            return self.handled(event)
+        return self.super(self.top)
+
+
+async def tick_for(seconds):
+    sm = TickSM()
+    sm.start(108)
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sm.tmr.disarm()
+        sm.end()
+    return sm.ticks, farc.Framework._event_loop
+
+
+class TestLazyInit(unittest.TestCase):
+    def test_import_has_no_side_effects(self,):
+        code = ("import signal, farc;"
+                "assert farc.Framework._event_loop is None;"
+                "assert signal.getsignal(signal.SIGINT)"
+                " is signal.default_int_handler")
+        subprocess.run([sys.executable, "-W", "error", "-c", code],
+                       check=True)
+
+    def test_asyncio_run(self,):
+        ticks, loop1 = asyncio.run(tick_for(0.1))
+        self.assertGreater(ticks, 3)
+        # A second asyncio.run() has a new loop, which start() binds to
+        ticks, loop2 = asyncio.run(tick_for(0.1))
+        self.assertGreater(ticks, 3)
+        self.assertIsNot(loop1, loop2)
+        self.assertFalse(farc.Framework._owns_loop)
+
+    def test_bind(self,):
+        loop = asyncio.new_event_loop()
+        self.assertIs(farc.Framework.bind(loop), loop)
+        self.assertIs(farc.Framework._event_loop, loop)
+        self.assertTrue(farc.Framework._owns_loop)
+        asyncio.set_event_loop(loop)
+
+    def test_unbound_run_to_completion(self,):
+        fw = farc.Framework.new()
+        self.assertIsNone(fw._event_loop)
+        fw.run_to_completion()
+        self.assertIsNotNone(fw._event_loop)
+        fw._event_loop.run_until_complete(asyncio.sleep(0))
+        self.assertFalse(fw._run_pending)
+
+
+if __name__ == '__main__':
+    unittest.main()
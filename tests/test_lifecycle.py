@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""This test checks priority bands, the cleanup when an Ahsm ends,
+starting many Ahsms with one run-to-completion
+and that run() dispatches in priority order from the ready heap,
+even when posts from two threads interleave.
+"""
+
+
+import collections
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+# The (priority, value) of every PING dispatched
+dispatched = []
+
+
+class Session(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("PING")
+        self.tmr = farc.TimeEvent("SESSION_TIMEOUT")
+        self.tmr.post_in(self, 60.0)
+        farc.Framework.subscribe("session.#", self)
+        return self.tran(Session._open)
+
+    @farc.Hsm.state
+    def _open(self, event):
+        if event.signal == farc.Signal.PING:
+            dispatched.append((self.priority, event.value))
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestLifecycle(unittest.TestCase):
+    def setUp(self):
+        del dispatched[:]
+        self.acts = []
+
+    def tearDown(self):
+        for act in self.acts:
+            if act in farc.Framework._ahsm_registry:
+                act.end()
+
+    def _session(self, priority):
+        act = Session()
+        act.start(priority)
+        self.acts.append(act)
+        return act
+
+    def test_band(self,):
+        band = farc.PriorityBand(2000, 2003)
+        # Priorities already in use are skipped
+        self._session(2001)
+        a, b = self._session(band), self._session(band)
+        self.assertEqual((a.priority, b.priority), (2000, 2002))
+        with self.assertRaises(ValueError):
+            Session().start(band)
+        a.end()
+        c = self._session(band)
+        self.assertEqual(c.priority, 2000)
+
+    def test_restart_without_band(self,):
+        band = farc.PriorityBand(2000, 2003)
+        act = self._session(band)
+        act.end()
+        # Started again with a plain priority, its end must not
+        # hand that priority to the band
+        act.start(2005)
+        act.end()
+        self.assertEqual(band._free, [2000])
+
+    def test_end_cleans_up(self,):
+        act = self._session(2000)
+        self.assertIn(act, farc.Framework._act_timers)
+        self.assertIn(act.tmr, farc.Framework._time_events)
+        act.end()
+        self.assertNotIn(act.tmr, farc.Framework._time_events)
+        self.assertNotIn(act, farc.Framework._act_timers)
+        self.assertIsNone(act.tmr._armed_for)
+        self.assertNotIn(act, farc.Framework._subscriptions)
+        # The TimeEvent may be armed again
+        act.tmr.post_in(act, 1.0)
+        act.tmr.disarm()
+
+    def test_start_all(self,):
+        runs = []
+        fw = farc.Framework
+        fw.run_to_completion = lambda: runs.append(1)
+        try:
+            acts = [Session() for _ in range(50)]
+            fw.start_all(acts, farc.PriorityBand(2000, 3000))
+        finally:
+            fw.run_to_completion = fw.run
+        self.acts.extend(acts)
+        self.assertEqual(len(runs), 1)
+        self.assertEqual([act.priority for act in acts],
+                         list(range(2000, 2050)))
+
+    def test_priority_order(self,):
+        acts = [self._session(p) for p in (2002, 2000, 2001)]
+        fw = farc.Framework
+        fw.run_to_completion = lambda: None
+        try:
+            for n in range(2):
+                for act in acts:
+                    act.post_fifo(farc.Event(farc.Signal.PING, n))
+        finally:
+            fw.run_to_completion = fw.run
+        fw._run_ready()
+        self.assertEqual(dispatched, [
+            (2000, 0), (2000, 1), (2001, 0), (2001, 1), (2002, 0), (2002, 1)])
+        self.assertEqual(fw._ready, [])
+
+    def test_interleaved_posts(self,):
+        act = self._session(2000)
+
+        class Queue(collections.deque):
+            """Runs another post between this post's append
+            and its check of the ready heap, as a second thread may.
+            """
+            def appendleft(self, evt):
+                super().appendleft(evt)
+                if evt.value == 0:
+                    act.post_fifo(farc.Event(farc.Signal.PING, 1))
+
+        act.mq = Queue()
+        fw = farc.Framework
+        fw.run_to_completion = lambda: None
+        try:
+            act.post_fifo(farc.Event(farc.Signal.PING, 0))
+        finally:
+            fw.run_to_completion = fw.run
+        fw._run_ready()
+        self.assertEqual(dispatched, [(2000, 0), (2000, 1)])
+        self.assertEqual(fw._ready, [])
+
+    def test_disarm_among_equal_expirations(self,):
+        act = self._session(2000)
+        timers = [farc.TimeEvent("SESSION_TIMEOUT") for _ in range(3)]
+        for te in timers:
+            te.post_at(act, farc.Framework.time() + 30.0)
+        timers[1].disarm()
+        armed = [te for te in farc.Framework._time_events if te in timers]
+        self.assertEqual(armed, [timers[0], timers[2]])
+        with self.assertRaises(AssertionError):
+            timers[0].post_in(act, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""This test checks the per-actor queue metrics:
+depth high-water mark, post and dispatch counts
+and the post-to-dispatch latency histogram.
+"""
+
+
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class CountingSM(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("COUNT")
+        self.count = 0
+        return self.tran(CountingSM._counting)
+
+    @farc.Hsm.state
+    def _counting(self, event):
+        if event.signal == farc.Signal.COUNT:
+            self.count += 1
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.sm = CountingSM()
+        self.sm.start(100)
+        farc.Framework.enable_metrics()
+
+    def tearDown(self):
+        farc.Framework.disable_metrics()
+        self.sm.end()
+
+    def test_counts(self,):
+        for _ in range(3):
+            self.sm.post_fifo(farc.Event(farc.Signal.COUNT, None))
+        m = farc.Framework.get_metrics()[100]
+        self.assertEqual(m["name"], "CountingSM")
+        self.assertEqual(m["posted"], 3)
+        self.assertEqual(m["dispatched"], 3)
+        self.assertEqual(m["depth"], 0)
+        self.assertEqual(m["depth_hwm"], 1)
+        self.assertEqual(sum(n for _, n in m["latency_hist"]), 3)
+        self.assertEqual(self.sm.count, 3)
+
+    def test_depth_hwm(self,):
+        # Queue events without running the framework
+        for _ in range(5):
+            self.sm.mq.appendleft(farc.Event(farc.Signal.COUNT, None))
+            self.sm.metrics.on_post(len(self.sm.mq))
+        self.assertEqual(farc.Framework.get_metrics()[100]["depth"], 5)
+        farc.Framework.run()
+        m = farc.Framework.get_metrics()[100]
+        self.assertEqual(m["depth"], 0)
+        self.assertEqual(m["depth_hwm"], 5)
+
+    def test_disabled(self,):
+        farc.Framework.disable_metrics()
+        self.assertIsNone(self.sm.metrics)
+        self.assertEqual(farc.Framework.get_metrics(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
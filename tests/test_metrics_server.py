@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""This test checks that the MetricsServer serves the Prometheus text
+format over TCP and a Unix socket, renders again only the actors whose
+metrics changed and that farc.top parses what it serves.
+"""
+
+
+import os
+import tempfile
+import unittest
+
+import farc
+from farc import top
+from farc.MetricsServer import MetricsServer
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Counter(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("TICK")
+        return self.tran(Counter._counting)
+
+    @farc.Hsm.state
+    def _counting(self, event):
+        if event.signal == farc.Signal.TICK:
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class CountingServer(MetricsServer):
+    rendered = []
+
+    @staticmethod
+    def _render_actor(act, m):
+        CountingServer.rendered.append(act.priority)
+        return MetricsServer._render_actor(act, m)
+
+
+class TestMetricsServer(unittest.TestCase):
+    def setUp(self):
+        self.a = Counter()
+        self.a.start(113)
+        self.b = Counter()
+        self.b.start(114)
+        self.server = CountingServer()
+        CountingServer.rendered = []
+        self.loop = farc.Framework._event_loop
+
+    def tearDown(self):
+        self.server.stop()
+        farc.Framework.disable_metrics()
+        self.a.end()
+        self.b.end()
+
+    def _tick(self, act, n):
+        for _ in range(n):
+            act.post_fifo(farc.Event(farc.Signal.TICK, None))
+
+    def _fetch(self, address):
+        # farc.top blocks, so it fetches from another thread
+        # while the event loop serves the request
+        return self.loop.run_until_complete(
+            self.loop.run_in_executor(None, top.fetch, address))
+
+    def test_tcp(self,):
+        self.loop.run_until_complete(self.server.start(0))
+        self._tick(self.a, 3)
+        text = self._fetch(str(self.server.address()[1]))
+        self.assertIn("# TYPE farc_handler_seconds histogram\n", text)
+        self.assertIn(
+            'farc_events_dispatched_total{actor="Counter",priority="113"} 3\n',
+            text)
+        self.assertIn(
+            'farc_handler_seconds_count{actor="Counter",priority="113"} 3\n',
+            text)
+
+        actors, globs = top.parse(text)
+        self.assertEqual(actors[113]["dispatched"], 3)
+        self.assertEqual(actors[114]["dispatched"], 0)
+        self.assertEqual(actors[113]["handler"][-1], (float("inf"), 3))
+        self.assertIsNotNone(top.percentile(actors[113]["handler"], 0.99))
+        self.assertIsNone(top.percentile(actors[114]["handler"], 0.99))
+        self.assertEqual(globs["farc_actors"], len(farc.Framework._ahsm_registry))
+
+    def test_unix_socket(self,):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics.sock")
+            self.loop.run_until_complete(self.server.start(path=path))
+            self._tick(self.b, 2)
+            actors, _ = top.parse(self._fetch(path))
+            self.assertEqual(actors[114]["posted"], 2)
+            self.server.stop()
+
+    def test_only_dirty_actors_rendered(self,):
+        farc.Framework.enable_metrics()
+        self.server.render()
+        self.assertIn(113, CountingServer.rendered)
+        self.assertIn(114, CountingServer.rendered)
+
+        CountingServer.rendered = []
+        self._tick(self.a, 1)
+        text = self.server.render()
+        self.assertEqual(CountingServer.rendered, [113])
+        # The unchanged actor's lines are still served
+        self.assertIn('farc_queue_depth{actor="Counter",priority="114"} 0\n',
+                      text)
+
+        CountingServer.rendered = []
+        self.server.render()
+        self.assertEqual(CountingServer.rendered, [])
+
+    def test_reused_priority(self,):
+        farc.Framework.enable_metrics()
+        self.b.end()
+        old, self.b = self.b, Counter()
+        self.b.start(114)
+        self.server.render()
+        # The ended actor's metrics are handled after its successor's
+        old.metrics.mark_dirty()
+        text = self.server.render()
+        self.assertIn('farc_queue_depth{actor="Counter",priority="114"} 0\n',
+                      text)
+
+    def test_top_rates_and_sort(self,):
+        prev = {1: {"dispatched": 10}}
+        actors = {
+            1: {"name": "A", "priority": 1, "dispatched": 30, "depth": 0,
+                "latency": [], "handler": [(1e-6, 5), (float("inf"), 5)]},
+            2: {"name": "B", "priority": 2, "dispatched": 5, "depth": 4,
+                "latency": [], "handler": []},
+        }
+        table = top.rows(actors, prev, 2.0)
+        by_prio = {row["priority"]: row for row in table}
+        self.assertEqual(by_prio[1]["rate"], 10.0)
+        self.assertEqual(by_prio[2]["rate"], 0.0)
+        self.assertEqual(by_prio[1]["handler_p99"], 1e-6)
+        self.assertEqual([r["name"] for r in top.sort_rows(table, "depth")],
+                         ["B", "A"])
+        self.assertEqual([r["name"] for r in top.sort_rows(table, "rate")],
+                         ["A", "B"])
+        self.assertEqual(len(top.format_table(table, {}, "name")), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
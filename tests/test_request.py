@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""This test checks request/reply: Framework.request() from asyncio code,
+Ahsm.request() between Ahsms, timeouts, replies from another
+Framework's thread and requests that are never dispatched.
+"""
+
+
+import asyncio
+import threading
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Doubler(farc.Ahsm):
+    """Replies to DOUBLE with twice the value; ignores SILENT."""
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register_many("DOUBLE", "SILENT")
+        return self.tran(Doubler._serving)
+
+    @farc.Hsm.state
+    def _serving(self, event):
+        if event.signal == farc.Signal.DOUBLE:
+            self.reply(event, 2 * event.value)
+            return self.handled(event)
+        if event.signal == farc.Signal.SILENT:
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class Client(farc.Ahsm):
+    def __init__(self, server, signame, timeout=None):
+        super().__init__()
+        self.server = server
+        self.signame = signame
+        self.timeout = timeout
+        self.answers = []
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register_many("ASK", "ANSWER")
+        return self.tran(Client._asking)
+
+    @farc.Hsm.state
+    def _asking(self, event):
+        if event.signal == farc.Signal.ASK:
+            self.request(self.server,
+                         farc.Event(getattr(farc.Signal, self.signame),
+                                    event.value),
+                         "ANSWER", self.timeout)
+            return self.handled(event)
+        if event.signal == farc.Signal.ANSWER:
+            self.answers.append(event.value)
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestRequest(unittest.TestCase):
+    def setUp(self):
+        self.server = Doubler()
+        self.server.start(123)
+        self.loop = farc.Framework._event_loop
+        self.acts = [self.server]
+
+    def tearDown(self):
+        for act in self.acts:
+            act.end()
+        self.assertEqual(farc.Framework._requests, {})
+        self.assertEqual(farc.Framework._act_requests, {})
+
+    def test_future(self,):
+        fut = farc.Framework.request(
+            self.server, farc.Event(farc.Signal.DOUBLE, 21), timeout=1.0)
+        self.assertEqual(self.loop.run_until_complete(fut), 42)
+
+    def test_future_timeout(self,):
+        fut = farc.Framework.request(
+            self.server, farc.Event(farc.Signal.SILENT, 1), timeout=0.01)
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(fut)
+
+    def test_between_ahsms(self,):
+        client = Client(self.server, "DOUBLE")
+        client.start(124)
+        self.acts.append(client)
+        for v in (1, 2, 3):
+            client.post_fifo(farc.Event(farc.Signal.ASK, v))
+        self.assertEqual(client.answers, [2, 4, 6])
+
+    def test_between_ahsms_timeout(self,):
+        client = Client(self.server, "SILENT", timeout=0.01)
+        client.start(124)
+        self.acts.append(client)
+        client.post_fifo(farc.Event(farc.Signal.ASK, 1))
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(len(client.answers), 1)
+        self.assertIsInstance(client.answers[0], asyncio.TimeoutError)
+
+    def test_target_ended(self,):
+        server = Doubler()
+        server.start(124)
+        fw = farc.Framework
+        fw.run_to_completion = lambda: None
+        try:
+            fut = fw.request(server, farc.Event(farc.Signal.DOUBLE, 1))
+            server.end()
+        finally:
+            fw.run_to_completion = fw.run
+        with self.assertRaises(RuntimeError):
+            self.loop.run_until_complete(fut)
+
+    def test_shed(self,):
+        event = farc.Event(farc.Signal.DOUBLE, 1)
+        event.deadline = farc.Framework.time() - 1.0
+        fut = farc.Framework.request(self.server, event)
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(fut)
+
+    def test_requester_ended(self,):
+        client = Client(self.server, "SILENT")
+        client.start(124)
+        client.post_fifo(farc.Event(farc.Signal.ASK, 1))
+        self.assertEqual(len(farc.Framework._requests), 1)
+        self.assertEqual(list(farc.Framework._act_requests), [client])
+        client.end()
+
+    def test_reply_from_other_thread(self,):
+        fw = farc.Framework.new()
+        remote = Doubler()
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            remote.start(1, fw)
+            started.set()
+            fw._event_loop.run_forever()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        started.wait()
+        try:
+            fut = farc.Framework.request(
+                remote, farc.Event(farc.Signal.DOUBLE, 5), timeout=1.0)
+            self.assertEqual(self.loop.run_until_complete(fut), 10)
+        finally:
+            fw._event_loop.call_soon_threadsafe(fw._event_loop.stop)
+            thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
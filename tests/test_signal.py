@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""This test checks Signal registration, attribute access,
+bulk registration, freezing, thread-safe registration and
+a Spy that registers signals when it is told of one.
+"""
+
+
+import threading
+import unittest
+
+import farc
+from farc.SpyType import SpyType
+
+
+class EchoSpy(metaclass=SpyType):
+    """Registers an echo of every signal registered."""
+
+    registered = []
+
+    @staticmethod
+    def on_signal_register(signame, sigid):
+        EchoSpy.registered.append(signame)
+        if not signame.endswith("_ECHO"):
+            farc.Signal.register(signame + "_ECHO")
+
+
+class TestSignal(unittest.TestCase):
+    def tearDown(self):
+        farc.Signal._frozen = False
+
+    def test_attribute(self,):
+        sigid = farc.Signal.register("SIG_ATTR")
+        self.assertEqual(farc.Signal.SIG_ATTR, sigid)
+        # The signal is a real attribute, not found by __getattr__
+        self.assertIn("SIG_ATTR", vars(farc.Signal))
+        self.assertEqual(farc.Signal.register("SIG_ATTR"), sigid)
+        self.assertFalse(hasattr(farc.Signal, "SIG_NEVER_REGISTERED"))
+        # Callers that caught the KeyError of older versions still work
+        with self.assertRaises(KeyError):
+            farc.Signal.SIG_NEVER_REGISTERED
+        with self.assertRaises(farc.SignalNotRegistered):
+            farc.Signal.SIG_NEVER_REGISTERED
+
+    def test_register_many(self,):
+        a, b = farc.Signal.register_many("SIG_MANY_A", "SIG_MANY_B")
+        self.assertEqual((farc.Signal.SIG_MANY_A, farc.Signal.SIG_MANY_B),
+                         (a, b))
+        self.assertEqual(farc.Signal.to_str(b), "SIG_MANY_B")
+
+    def test_freeze(self,):
+        sigid = farc.Signal.register("SIG_BEFORE_FREEZE")
+        farc.Signal.freeze()
+        self.assertEqual(farc.Signal.register("SIG_BEFORE_FREEZE"), sigid)
+        with self.assertRaises(RuntimeError):
+            farc.Signal.register("SIG_AFTER_FREEZE")
+
+    def test_threads(self,):
+        names = ["SIG_THREAD_%d" % n for n in range(200)]
+        results = []
+
+        def register_all():
+            results.append(farc.Signal.register_many(*names))
+
+        threads = [threading.Thread(target=register_all) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # Every thread got the same, unique ids
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(len(set(results[0])), len(names))
+        self.assertEqual([farc.Signal.to_str(i) for i in results[0]], names)
+
+    def test_spy_registers(self,):
+        farc.Spy.enable_spy(EchoSpy)
+        try:
+            # A deadlock would leave the thread running
+            t = threading.Thread(target=farc.Signal.register,
+                                 args=("SIG_SPIED",), daemon=True)
+            t.start()
+            t.join(5.0)
+            self.assertFalse(t.is_alive())
+        finally:
+            farc.Spy.disable_spy()
+        self.assertEqual(EchoSpy.registered, ["SIG_SPIED", "SIG_SPIED_ECHO"])
+        self.assertTrue(farc.Signal.exists("SIG_SPIED_ECHO"))
+
+
+if __name__ == '__main__':
+    unittest.main()
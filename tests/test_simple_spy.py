@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""This test records a golden trace with SimpleSpy
+without printing it and compares it against a reference.
+"""
+
+
+import unittest
+
+import farc
+from farc.SimpleSpy import SimpleSpy
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class ToggleSM(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("TOGGLE")
+        return self.tran(ToggleSM._off)
+
+    @farc.Hsm.state
+    def _off(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            return self.handled(event)
+        elif sig == farc.Signal.TOGGLE:
+            return self.tran(ToggleSM._on)
+        return self.super(self.top)
+
+    @farc.Hsm.state
+    def _on(self, event):
+        sig = event.signal
+        if sig == farc.Signal.ENTRY:
+            return self.handled(event)
+        elif sig == farc.Signal.TOGGLE:
+            return self.tran(ToggleSM._off)
+        return self.super(self.top)
+
+
+REFERENCE = ("_initial-INIT;_off-ENTRY;"
+             "\n<TOGGLE> _off-TOGGLE;_off-EXIT;_on-ENTRY;"
+             "\n<TOGGLE> _on-TOGGLE;_on-EXIT;_off-ENTRY;")
+
+
+class TestSimpleSpy(unittest.TestCase):
+    def setUp(self):
+        SimpleSpy.configure(echo=False, maxlen=100)
+        farc.Spy.enable_spy(SimpleSpy)
+        self.sm = ToggleSM()
+        self.sm.start(102)
+        for _ in range(2):
+            self.sm.post_fifo(farc.Event(farc.Signal.TOGGLE, None))
+
+    def tearDown(self):
+        self.sm.end()
+        farc.Spy.disable_spy()
+        SimpleSpy.configure()
+
+    def test_get_log(self,):
+        self.assertEqual("".join(SimpleSpy.get_log()), REFERENCE)
+
+    def test_compare_log(self,):
+        self.assertEqual(SimpleSpy.compare_log(REFERENCE), -1)
+        bad = REFERENCE.replace("_on-EXIT", "_on-ENTRY")
+        self.assertEqual(SimpleSpy.compare_log(bad),
+                         REFERENCE.index("_on-EXIT") + len("_on-E"))
+        self.assertEqual(SimpleSpy.compare_log(REFERENCE + ";"),
+                         len(REFERENCE))
+
+    def test_bounded(self,):
+        SimpleSpy.configure(echo=False, maxlen=3)
+        for _ in range(10):
+            self.sm.post_fifo(farc.Event(farc.Signal.TOGGLE, None))
+        self.assertEqual(len(SimpleSpy.get_log()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
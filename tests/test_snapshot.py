@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""This test snapshots an Ahsm having a queued event and an armed
+TimeEvent, restores it and checks that it resumes without re-running
+its initial transition.
+"""
+
+
+import os
+import pickle
+import tempfile
+import unittest
+
+import farc
+from farc.Snapshot import Snapshot, restore
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class TallySM(farc.Ahsm):
+    inits = 0
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("ADD")
+        TallySM.inits += 1
+        self.total = 0
+        self.tmr = farc.TimeEvent("ADD")
+        return self.tran(TallySM._tallying)
+
+    @farc.Hsm.state
+    def _tallying(self, event):
+        if event.signal == farc.Signal.ADD:
+            self.total += event.value or 1
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "snap.bin")
+        self.acts = []
+        # A snapshot holds every Ahsm in the Framework,
+        # so set aside any Ahsms left by other tests
+        self.others = list(farc.Framework._ahsm_registry)
+        for act in self.others:
+            act.end()
+
+    def tearDown(self):
+        for act in self.acts:
+            act.tmr.disarm()
+            act.end()
+        for act in self.others:
+            farc.Framework.add(act)
+        farc.Framework.configure_flight_recorder()
+        self.tmpdir.cleanup()
+
+    def start(self, prio):
+        act = TallySM()
+        act.start(prio)
+        self.acts.append(act)
+        return act
+
+    def end_all(self):
+        for act in self.acts:
+            act.tmr.disarm()
+            act.end()
+        self.acts = []
+
+    def test_snapshot_restore(self,):
+        a = self.start(106)
+        b = self.start(107)
+        a.post_fifo(farc.Event(farc.Signal.ADD, 5))
+        a.tmr.post_in(a, 3600.0)
+        # An event left in the queue
+        b.mq.appendleft(farc.Event(farc.Signal.ADD, 7))
+
+        snap = Snapshot(self.path)
+        snap.take()
+        snap.wait()
+        self.end_all()
+
+        inits = TallySM.inits
+        restored = restore(self.path)
+        self.acts = restored
+        self.assertEqual(TallySM.inits, inits)
+        a, b = restored
+        self.assertEqual(a.priority, 106)
+        self.assertEqual(a.total, 5)
+        self.assertIs(a._state, TallySM._tallying)
+        self.assertIs(a.tmr.act, a)
+        self.assertIn(a.tmr, farc.Framework._time_events)
+        # The queued event was dispatched once restored
+        self.assertEqual(b.total, 7)
+
+    def test_incremental(self,):
+        a = self.start(106)
+        b = self.start(107)
+        snap = Snapshot(self.path)
+        snap.take(background=False)
+        size_full = os.path.getsize(self.path)
+        a.post_fifo(farc.Event(farc.Signal.ADD, 2))
+        snap.take(background=False)
+        # The second frame holds only the Ahsm that changed
+        self.assertLess(os.path.getsize(self.path), 2 * size_full)
+        b.post_fifo(farc.Event(farc.Signal.ADD, 3))
+        snap.take(background=False)
+        self.end_all()
+
+        self.acts = restore(self.path)
+        a, b = self.acts
+        self.assertEqual((a.total, b.total), (2, 3))
+
+    def test_incremental_without_flight_recorder(self,):
+        farc.Framework.configure_flight_recorder(depth=0)
+        a = self.start(106)
+        self.start(107)
+        snap = Snapshot(self.path)
+        snap.take(background=False)
+        a.post_fifo(farc.Event(farc.Signal.ADD, 2))
+        snap.take(background=False)
+        with open(self.path, "rb") as f:
+            frames = [pickle.load(f), pickle.load(f)]
+        self.assertEqual(sorted(frames[0]["actors"]), [106, 107])
+        self.assertEqual(sorted(frames[1]["actors"]), [106])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork()")
+    def test_failed_background_write(self,):
+        a = self.start(106)
+        self.start(107)
+        snap = Snapshot(self.path)
+        snap.take(background=False)
+        a.post_fifo(farc.Event(farc.Signal.ADD, 2))
+        # An attribute that cannot be pickled fails the child's write
+        a.unpicklable = lambda: None
+        snap.take()
+        with self.assertRaises(RuntimeError):
+            snap.wait()
+        del a.unpicklable
+        # The next frame still holds the change the failed one lost
+        snap.take(background=False)
+        self.end_all()
+
+        self.acts = restore(self.path)
+        a, b = self.acts
+        self.assertEqual((a.total, b.total), (2, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""This test checks that subscription filters (where=) select
+which subscribers a published event is posted to.
+"""
+
+
+import collections
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+Reading = collections.namedtuple("Reading", "device kind value")
+
+
+class Device(farc.Ahsm):
+    def __init__(self, signame, where):
+        super().__init__()
+        self.signame = signame
+        self.where = where
+        self.received = []
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Framework.subscribe(self.signame, self, where=self.where)
+        return self.tran(Device._running)
+
+    @farc.Hsm.state
+    def _running(self, event):
+        if event.signal > farc.Signal.INIT:
+            self.received.append(event.value)
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestSubscriptionFilters(unittest.TestCase):
+    def setUp(self):
+        self.sig = farc.Signal.register("filters.reading")
+        self.acts = []
+
+    def tearDown(self):
+        for act in self.acts:
+            act.end()
+
+    def _start(self, priority, where, signame="filters.reading"):
+        act = Device(signame, where)
+        act.start(priority)
+        self.acts.append(act)
+        return act
+
+    def _publish(self, value):
+        farc.Framework.publish(farc.Event(self.sig, value))
+
+    def test_field_equality(self,):
+        seven = self._start(120, {"device": 7})
+        eight = self._start(121, {"device": 8})
+        for device in (7, 8, 9, 7):
+            self._publish({"device": device})
+        self.assertEqual(seven.received, [{"device": 7}, {"device": 7}])
+        self.assertEqual(eight.received, [{"device": 8}])
+        filters = farc.Framework._filter_table[self.sig]
+        self.assertEqual(sorted(filters.index["device"]), [7, 8])
+        self.assertEqual(filters.predicates, [])
+
+    def test_several_fields_and_attributes(self,):
+        temp = self._start(120, {"device": 7, "kind": "temp"})
+        self._publish(Reading(7, "temp", 20.5))
+        self._publish(Reading(7, "humidity", 40.0))
+        self._publish(Reading(8, "temp", 19.0))
+        # A value without the field matches no field filter
+        self._publish(None)
+        self.assertEqual(temp.received, [Reading(7, "temp", 20.5)])
+
+    def test_predicate(self,):
+        hot = self._start(120, lambda value: value["t"] > 30)
+        for t in (10, 35, 31):
+            self._publish({"t": t})
+        self.assertEqual([v["t"] for v in hot.received], [35, 31])
+
+    def test_mixed_with_unfiltered(self,):
+        everyone = self._start(122, None)
+        seven = self._start(120, {"device": 7})
+        # A second, overlapping subscription repeats no delivery
+        farc.Framework.subscribe("filters.*", seven, where={"device": 7})
+        self._publish({"device": 7})
+        self._publish({"device": 1})
+        self.assertEqual(len(everyone.received), 2)
+        self.assertEqual(seven.received, [{"device": 7}])
+        self.assertEqual(farc.Framework.subscribers(self.sig),
+                         (seven, everyone))
+
+    def test_resubscribe_replaces_filter(self,):
+        act = self._start(120, {"device": 7})
+        farc.Framework.subscribe("filters.reading", act, where={"device": 8})
+        self._publish({"device": 7})
+        self._publish({"device": 8})
+        self.assertEqual(act.received, [{"device": 8}])
+
+
+if __name__ == '__main__':
+    unittest.main()
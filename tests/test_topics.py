@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""This test checks subscriptions to dotted signal names and patterns:
+wildcard matching, priority-ordered and de-duplicated delivery,
+unsubscribe and the cleanup when an Ahsm ends.
+"""
+
+
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+# The order in which every Listener received events
+deliveries = []
+
+
+class Listener(farc.Ahsm):
+    def __init__(self, *patterns):
+        super().__init__()
+        self.patterns = patterns
+        self.received = []
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        for pattern in self.patterns:
+            farc.Framework.subscribe(pattern, self)
+        return self.tran(Listener._listening)
+
+    @farc.Hsm.state
+    def _listening(self, event):
+        if event.signal > farc.Signal.INIT:
+            name = farc.Signal.to_str(event.signal)
+            self.received.append(name)
+            deliveries.append((self.priority, name))
+            return self.handled(event)
+        return self.super(self.top)
+
+
+def publish(signame):
+    farc.Framework.publish(
+        farc.Event(farc.Signal.register(signame), None))
+
+
+class TestTopics(unittest.TestCase):
+    def setUp(self):
+        del deliveries[:]
+        self.acts = []
+
+    def tearDown(self):
+        for act in self.acts:
+            if act in farc.Framework._ahsm_registry:
+                act.end()
+
+    def _start(self, priority, *patterns):
+        act = Listener(*patterns)
+        act.start(priority)
+        self.acts.append(act)
+        return act
+
+    def test_wildcards(self,):
+        temps = self._start(117, "sensor.*.temp")
+        sensors = self._start(118, "sensor.#")
+        kitchen = self._start(119, "sensor.kitchen.temp")
+        for signame in ("sensor.kitchen.temp", "sensor.garage.temp",
+                        "sensor.garage.humidity", "sensor", "actuator.fan"):
+            publish(signame)
+        self.assertEqual(temps.received,
+                         ["sensor.kitchen.temp", "sensor.garage.temp"])
+        self.assertEqual(sensors.received,
+                         ["sensor.kitchen.temp", "sensor.garage.temp",
+                          "sensor.garage.humidity", "sensor"])
+        self.assertEqual(kitchen.received, ["sensor.kitchen.temp"])
+
+    def test_no_duplicates(self,):
+        act = self._start(117, "dup.a", "dup.a", "dup.*", "#")
+        publish("dup.a")
+        self.assertEqual(act.received, ["dup.a"])
+
+    def test_priority_order(self,):
+        # Subscribed in the opposite order of their priorities
+        self._start(119, "order.x")
+        self._start(117, "order.*")
+        self._start(118, "order.x")
+        publish("order.x")
+        self.assertEqual(deliveries,
+                         [(117, "order.x"), (118, "order.x"), (119, "order.x")])
+
+    def test_subscribe_after_publish(self,):
+        act = self._start(117)
+        publish("late.topic")
+        farc.Framework.subscribe("late.*", act)
+        publish("late.topic")
+        self.assertEqual(act.received, ["late.topic"])
+
+    def test_unsubscribe(self,):
+        act = self._start(117, "unsub.a", "unsub.*")
+        farc.Framework.unsubscribe("unsub.*", act)
+        publish("unsub.a")
+        publish("unsub.b")
+        farc.Framework.unsubscribe("unsub.a", act)
+        publish("unsub.a")
+        self.assertEqual(act.received, ["unsub.a"])
+        self.assertNotIn("unsub", farc.Framework._topics.children)
+
+    def test_end_unsubscribes(self,):
+        act = self._start(117, "gone.#")
+        publish("gone.x")
+        act.end()
+        self.assertNotIn(act, farc.Framework._subscriptions)
+        self.assertEqual(
+            farc.Framework.subscribers(farc.Signal.register("gone.x")), ())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""This test records a trace with TraceSpy, saves it
+and decodes it with the module's offline reader.
+"""
+
+
+import io
+import os
+import tempfile
+import unittest
+
+import farc
+from farc import TraceSpy as ts
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class PingSM(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("PING")
+        return self.tran(PingSM._idle)
+
+    @farc.Hsm.state
+    def _idle(self, event):
+        if event.signal == farc.Signal.PING:
+            return self.tran(PingSM._pinged)
+        return self.super(self.top)
+
+    @farc.Hsm.state
+    def _pinged(self, event):
+        if event.signal == farc.Signal.PING:
+            return self.tran(PingSM._idle)
+        return self.super(self.top)
+
+
+class TestTraceSpy(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "trace.bin")
+        ts.TraceSpy.configure(capacity=8)
+        farc.Spy.enable_spy(ts.TraceSpy)
+        self.sm = PingSM()
+        self.sm.start(101)
+
+    def tearDown(self):
+        self.sm.end()
+        farc.Spy.disable_spy()
+        self.tmpdir.cleanup()
+
+    def post_pings(self, n):
+        for _ in range(n):
+            self.sm.post_fifo(farc.Event(farc.Signal.PING, None))
+
+    def test_records(self,):
+        self.post_pings(2)
+        ts.TraceSpy.save(self.path)
+        names, records = ts.read_trace(self.path)
+        self.assertEqual(names[ts.DICT_ACTOR][101], "PingSM")
+        self.assertEqual(names[ts.DICT_SIGNAL][farc.Signal.PING], "PING")
+        types = [r[4] for r in records]
+        self.assertEqual(types, [ts.REC_POST, ts.REC_DISPATCH, ts.REC_DONE] * 2)
+        states = names[ts.DICT_STATE]
+        self.assertEqual(states[records[1][2]], "PingSM._idle")
+        self.assertEqual(states[records[2][2]], "PingSM._pinged")
+
+    def test_ring_wraps(self,):
+        self.post_pings(5)
+        ts.TraceSpy.save(self.path)
+        _, records = ts.read_trace(self.path)
+        # 15 records were written to a ring of 8; the newest 8 remain
+        self.assertEqual(len(records), 8)
+        self.assertEqual(records[-1][4], ts.REC_DONE)
+        times = [r[0] for r in records]
+        self.assertEqual(times, sorted(times))
+
+    def test_to_text(self,):
+        self.post_pings(1)
+        ts.TraceSpy.save(self.path)
+        out = io.StringIO()
+        ts.to_text(self.path, out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn("PingSM(101) DISPATCH PING PingSM._idle", lines[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
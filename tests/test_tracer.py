@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""This test checks that a Tracer propagates the trace context of an event
+to the events posted and published by its handler, records queueing and
+handler spans as OTLP JSON and samples whole traces or none of them.
+"""
+
+
+import json
+import os
+import tempfile
+import unittest
+
+import farc
+from farc.Tracer import Tracer
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Relay(farc.Ahsm):
+    """Publishes a FAN event for each TRIGGER it receives;
+    raises on a TRIGGER of "boom".
+    """
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register_many("TRIGGER", "FAN")
+        return self.tran(Relay._relaying)
+
+    @farc.Hsm.state
+    def _relaying(self, event):
+        if event.signal == farc.Signal.TRIGGER:
+            if event.value == "boom":
+                raise RuntimeError("boom")
+            farc.Framework.publish(farc.Event(farc.Signal.FAN, event.value))
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class Sink(farc.Ahsm):
+    def __init__(self):
+        super().__init__()
+        self.received = []
+
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Framework.subscribe("FAN", self)
+        return self.tran(Sink._sinking)
+
+    @farc.Hsm.state
+    def _sinking(self, event):
+        if event.signal == farc.Signal.FAN:
+            self.received.append(event)
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "trace.json")
+        self.relay = Relay()
+        self.relay.start(125)
+        self.sinks = [Sink(), Sink()]
+        self.sinks[0].start(126)
+        self.sinks[1].start(127)
+
+    def tearDown(self):
+        self.tracer.stop()
+        for act in [self.relay] + self.sinks:
+            act.end()
+        self.tmpdir.cleanup()
+
+    def _trigger(self, value):
+        self.relay.post_fifo(farc.Event(farc.Signal.TRIGGER, value))
+
+    def _spans(self):
+        self.tracer.stop()
+        with open(self.path) as f:
+            doc = json.load(f)
+        return doc["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+    def test_propagation(self,):
+        self.tracer = Tracer(self.path)
+        self.tracer.start()
+        self._trigger(1)
+        spans = self._spans()
+        self.assertEqual(len(spans), 6)
+        by_name = {}
+        for s in spans:
+            by_name.setdefault(s["name"], []).append(s)
+        self.assertEqual(len(set(s["traceId"] for s in spans)), 1)
+        root, = by_name["queue TRIGGER"]
+        relay, = by_name["handle TRIGGER"]
+        self.assertNotIn("parentSpanId", root)
+        self.assertEqual(relay["parentSpanId"], root["spanId"])
+        # The published event's queue spans are children of the handler
+        # that published it and each queue span is its handler's parent
+        queued = by_name["queue FAN"]
+        self.assertEqual([s["parentSpanId"] for s in queued],
+                         [relay["spanId"]] * 2)
+        self.assertEqual(sorted(s["parentSpanId"]
+                                for s in by_name["handle FAN"]),
+                         sorted(s["spanId"] for s in queued))
+        for s in spans:
+            self.assertLessEqual(int(s["startTimeUnixNano"]),
+                                 int(s["endTimeUnixNano"]))
+
+    def test_unsampled(self,):
+        self.tracer = Tracer(self.path, sample_rate=0.0)
+        self.tracer.start()
+        self._trigger(1)
+        self.assertEqual(len(self.sinks[0].received), 1)
+        self.assertEqual(self._spans(), [])
+
+    def test_head_sampling(self,):
+        self.tracer = Tracer(self.path, sample_rate=0.5)
+        self.tracer._random.seed(49)
+        self.tracer.start()
+        for v in range(200):
+            self._trigger(v)
+        spans = self._spans()
+        traces = {}
+        for s in spans:
+            traces[s["traceId"]] = traces.get(s["traceId"], 0) + 1
+        # Whole traces are kept or dropped
+        self.assertEqual(set(traces.values()), {6})
+        self.assertTrue(50 < len(traces) < 150)
+        prio = {"key": "farc.priority", "value": {"intValue": "126"}}
+        sampled = [s for s in spans
+                   if s["name"] == "handle FAN" and prio in s["attributes"]]
+        self.assertEqual(len(sampled), len(traces))
+        # The trace context is the posts', not the events'
+        self.assertIsNone(self.sinks[0].received[0].trace_id)
+
+    def test_raising_handler(self,):
+        self.tracer = Tracer(self.path)
+        self.tracer.start()
+        with self.assertRaises(RuntimeError):
+            self._trigger("boom")
+        # The next event from outside a handler starts a new trace
+        self._trigger(1)
+        spans = self._spans()
+        self.assertEqual(len(spans), 8)
+        failed, = [s for s in spans if "status" in s]
+        self.assertEqual(failed["name"], "handle TRIGGER")
+        self.assertEqual(failed["status"]["code"], 2)
+        roots = [s for s in spans if "parentSpanId" not in s]
+        self.assertEqual(len(roots), 2)
+        self.assertEqual(len(set(s["traceId"] for s in roots)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
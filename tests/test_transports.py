@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""This test checks that the transport adapters deliver received data
+in batches, pause reading while the receiving Ahsm's queue is deep
+and write through a QueuedWriter.
+"""
+
+
+import asyncio
+import socket
+import sys
+import unittest
+
+import farc
+from farc.Transports import Adapter, DatagramAdapter, StreamAdapter, \
+    SubprocessAdapter
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Sink(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("NET_RXD")
+        farc.Signal.register("NET_CLOSED")
+        self.rxd = []
+        self.batches = 0
+        self.closed = None
+        return self.tran(Sink._receiving)
+
+    @farc.Hsm.state
+    def _receiving(self, event):
+        sig = event.signal
+        if sig == farc.Signal.NET_RXD:
+            self.batches += 1
+            self.rxd.append(event.value)
+            return self.handled(event)
+        if sig == farc.Signal.NET_CLOSED:
+            self.closed = event.value
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestTransports(unittest.TestCase):
+    def setUp(self):
+        self.sink = Sink()
+        self.sink.start(112)
+        self.loop = farc.Framework._event_loop
+
+    def tearDown(self):
+        self.sink.end()
+
+    def run_loop(self, seconds):
+        self.loop.run_until_complete(asyncio.sleep(seconds))
+
+    def test_datagram_batches(self,):
+        transport, adapter = self.loop.run_until_complete(
+            self.loop.create_datagram_endpoint(
+                lambda: DatagramAdapter(self.sink, batch_delay=0.01),
+                local_addr=("127.0.0.1", 0)))
+        addr = transport.get_extra_info("sockname")
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            for n in range(200):
+                client.sendto(b"%d" % n, addr)
+            self.run_loop(0.05)
+
+            received = [data for batch in self.sink.rxd for data, _ in batch]
+            self.assertEqual(received, [b"%d" % n for n in range(200)])
+            # Datagrams that arrived together were delivered together
+            self.assertLess(self.sink.batches, 200)
+
+            # Reply through the writer
+            client_addr = self.sink.rxd[0][0][1]
+            adapter.writer.write(b"pong", client_addr)
+            client.settimeout(1.0)
+            self.assertEqual(client.recv(16), b"pong")
+        transport.close()
+
+    def test_stream_backpressure(self,):
+        rsock, wsock = socket.socketpair()
+        transport, adapter = self.loop.run_until_complete(
+            self.loop.create_connection(
+                lambda: StreamAdapter(self.sink, high_water=2, low_water=0),
+                sock=rsock))
+        # Let the Sink's queue fill up
+        farc.Framework.run_to_completion = lambda: None
+        try:
+            for n in range(3):
+                wsock.send(b"x" * 10)
+                self.run_loop(0.01)
+            self.assertTrue(adapter.reading_paused)
+            self.assertFalse(transport.is_reading())
+            self.assertEqual(adapter.pauses, 1)
+        finally:
+            farc.Framework.run_to_completion = farc.Framework.run
+        farc.Framework.run()
+        self.run_loop(0.02)
+        self.assertFalse(adapter.reading_paused)
+        self.assertTrue(transport.is_reading())
+        self.assertEqual(b"".join(data for _, data in self.sink.rxd),
+                         b"x" * 30)
+        self.assertIs(Adapter.get(self.sink.rxd[0][0]), adapter)
+
+        adapter.writer.write(b"reply")
+        self.assertEqual(wsock.recv(16), b"reply")
+        wsock.close()
+        transport.close()
+        self.run_loop(0.01)
+
+    def test_subprocess(self,):
+        transport, adapter = self.loop.run_until_complete(
+            self.loop.subprocess_exec(
+                lambda: SubprocessAdapter(self.sink,
+                                          close_signame="NET_CLOSED"),
+                sys.executable, "-c", "print(input().upper())"))
+        adapter.writer.write(b"hello\n")
+        adapter.writer.close()
+        for _ in range(100):
+            if self.sink.closed is not None:
+                break
+            self.run_loop(0.02)
+        self.assertEqual(self.sink.closed, 0)
+        out = b"".join(data for batch in self.sink.rxd
+                       for fd, data in batch if fd == 1)
+        self.assertEqual(out.strip(), b"HELLO")
+        transport.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
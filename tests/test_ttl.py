@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""This test checks that events whose ttl or deadline has passed
+are dropped when dequeued, before reaching the state handlers,
+and that the drops are counted.
+"""
+
+
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class Telemetry(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("READING")
+        farc.Signal.register("COMMAND")
+        self.received = []
+        self.tmr = farc.TimeEvent("TICK")
+        return self.tran(Telemetry._running)
+
+    @farc.Hsm.state
+    def _running(self, event):
+        if event.signal in (farc.Signal.READING, farc.Signal.COMMAND,
+                            farc.Signal.TICK):
+            self.received.append((event.signal, event.value))
+            return self.handled(event)
+        return self.super(self.top)
+
+    def run_burst(self, lag, events):
+        """Queues the events, lets the clock run for lag seconds,
+        as if the Ahsm had fallen behind, then dispatches them.
+        """
+        fw = self.framework
+        fw.run_to_completion = lambda: None
+        for evt in events:
+            self.post_fifo(evt)
+        fw._clock.now += lag
+        fw.run_to_completion = fw.run
+        fw.run()
+
+
+class TestTtl(unittest.TestCase):
+    def setUp(self):
+        farc.Framework.set_clock(farc.VirtualClock(start=100.0))
+        farc.Framework.enable_metrics()
+        self.sm = Telemetry()
+        self.sm.start(115)
+
+    def tearDown(self):
+        farc.Framework.set_ttl("READING", None)
+        farc.Framework.set_ttl("TICK", None)
+        self.sm.tmr.disarm()
+        farc.Framework.disable_metrics()
+        self.sm.end()
+        farc.Framework.set_clock(farc.Clock())
+
+    def _reading(self, n):
+        return farc.Event(farc.Signal.READING, n)
+
+    def test_signal_ttl(self,):
+        farc.Framework.set_ttl("READING", 1.0)
+        events = [self._reading(n) for n in range(5)]
+        events.append(farc.Event(farc.Signal.COMMAND, "go"))
+        self.sm.run_burst(2.0, events)
+        # The stale readings were shed; the command has no ttl
+        self.assertEqual(self.sm.received, [(farc.Signal.COMMAND, "go")])
+        # The deadline belongs to the post, not to the event
+        self.assertIsNone(events[0].deadline)
+        m = farc.Framework.get_metrics()[115]
+        self.assertEqual(m["expired"], 5)
+        self.assertEqual(m["dispatched"], 1)
+
+    def test_signal_ttl_not_expired(self,):
+        farc.Framework.set_ttl("READING", 1.0)
+        self.sm.run_burst(0.5, [self._reading(n) for n in range(3)])
+        self.assertEqual([v for _, v in self.sm.received], [0, 1, 2])
+        self.assertEqual(farc.Framework.get_metrics()[115]["expired"], 0)
+
+    def test_event_ttl_overrides_signal_ttl(self,):
+        farc.Framework.set_ttl("READING", 1.0)
+        fresh = self._reading("fresh")
+        fresh.ttl = 10.0
+        self.sm.run_burst(2.0, [self._reading("stale"), fresh])
+        self.assertEqual(self.sm.received, [(farc.Signal.READING, "fresh")])
+
+    def test_event_deadline(self,):
+        late = self._reading("late")
+        late.deadline = 100.5
+        on_time = self._reading("on time")
+        on_time.deadline = 105.0
+        self.sm.run_burst(1.0, [late, on_time, self._reading("no deadline")])
+        self.assertEqual([v for _, v in self.sm.received],
+                         ["on time", "no deadline"])
+        self.assertEqual(farc.Framework.get_metrics()[115]["expired"], 1)
+
+    def test_periodic_time_event_ttl(self,):
+        # Each firing of the same TimeEvent gets a fresh deadline
+        farc.Framework.set_ttl("TICK", 0.5)
+        self.sm.tmr.post_every(self.sm, 1.0)
+        farc.Framework._clock.stop_at = 110.5
+        farc.Framework._event_loop.run_forever()
+        ticks = [v for sig, v in self.sm.received if sig == farc.Signal.TICK]
+        self.assertEqual(len(ticks), 10)
+        self.assertEqual(farc.Framework.get_metrics()[115]["expired"], 0)
+
+    def test_reposted_event_ttl(self,):
+        farc.Framework.set_ttl("READING", 1.0)
+        reading = self._reading("again")
+        self.sm.run_burst(0.0, [reading])
+        farc.Framework._clock.now += 5.0
+        self.sm.run_burst(0.5, [reading])
+        self.assertEqual(len(self.sm.received), 2)
+        self.assertIsNone(reading.deadline)
+
+    def test_reposted_while_queued(self,):
+        # Posting an event again does not refresh the deadline
+        # of its earlier post, still in the queue
+        farc.Framework.set_ttl("READING", 1.0)
+        reading = self._reading("reused")
+        fw = farc.Framework
+        fw.run_to_completion = lambda: None
+        try:
+            self.sm.post_fifo(reading)
+            fw._clock.now += 5.0
+            self.sm.post_fifo(reading)
+        finally:
+            fw.run_to_completion = fw.run
+        fw.run()
+        self.assertEqual(len(self.sm.received), 1)
+        self.assertEqual(fw.get_metrics()[115]["expired"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""This test writes a VCD file with VcdSpy and checks its declarations
+and that a var declared after the file's header warns.
+"""
+
+
+import os
+import tempfile
+import time
+import unittest
+
+import farc
+from farc.VcdSpy import VcdSpy
+
+try:
+    import vcd
+except ImportError:
+    vcd = None
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class PingSM(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        farc.Signal.register("PING")
+        return self.tran(PingSM._idle)
+
+    @farc.Hsm.state
+    def _idle(self, event):
+        if event.signal == farc.Signal.PING:
+            return self.tran(PingSM._pinged)
+        return self.super(self.top)
+
+    @farc.Hsm.state
+    def _pinged(self, event):
+        if event.signal == farc.Signal.PING:
+            return self.tran(PingSM._idle)
+        return self.super(self.top)
+
+
+@unittest.skipIf(vcd is None, "requires pyvcd")
+class TestVcdSpy(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "trace.vcd")
+        farc.Signal.register("PING")
+        VcdSpy.configure(self.path)
+        farc.Spy.enable_spy(VcdSpy)
+        self.stopped = False
+        self.acts = [PingSM()]
+        self.acts[0].start(134)
+
+    def tearDown(self):
+        for act in self.acts:
+            act.end()
+        self.stop()
+        farc.Spy.disable_spy()
+        VcdSpy.configure()
+        self.tmpdir.cleanup()
+
+    def stop(self):
+        if not self.stopped:
+            VcdSpy.on_framework_stop()
+            self.stopped = True
+
+    def test_declarations(self,):
+        for _ in range(2):
+            self.acts[0].post_fifo(farc.Event(farc.Signal.PING, None))
+        self.stop()
+        with open(self.path) as f:
+            text = f.read()
+        header, body = text.split("$enddefinitions")
+        self.assertIn("St134_PingSM__idle", header)
+        self.assertIn("St134_PingSM__pinged", header)
+        self.assertIn("Sig%d_PING" % farc.Signal.PING, header)
+        self.assertIn("#", body)
+
+    def test_late_declaration_warns(self,):
+        self.acts[0].post_fifo(farc.Event(farc.Signal.PING, None))
+        # Wait for the background writer to write the header
+        deadline = time.monotonic() + 5.0
+        while (not VcdSpy._sink.header_written
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.assertTrue(VcdSpy._sink.header_written)
+        late = PingSM()
+        with self.assertWarns(RuntimeWarning):
+            late.start(135)
+        self.acts.append(late)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""This test runs ten simulated hours of a periodic TimeEvent
+on a VirtualClock, which must take far less than real time,
+and checks that callbacks run in the order of their times.
+"""
+
+
+import time
+import unittest
+
+import farc
+
+# This lets us run the framework sequentially/synchronously to ease testing
+farc.Framework.run_to_completion = farc.Framework.run
+
+
+class MinuteSM(farc.Ahsm):
+    @farc.Hsm.state
+    def _initial(self, event):
+        self.ticks = 0
+        self.tmr = farc.TimeEvent("MINUTE")
+        self.tmr.post_every(self, 60.0)
+        return self.tran(MinuteSM._counting)
+
+    @farc.Hsm.state
+    def _counting(self, event):
+        if event.signal == farc.Signal.MINUTE:
+            self.ticks += 1
+            return self.handled(event)
+        return self.super(self.top)
+
+
+class TestVirtualClock(unittest.TestCase):
+    def setUp(self):
+        self.clock = farc.VirtualClock(stop_at=10 * 3600.0)
+        farc.Framework.set_clock(self.clock)
+        self.sm = MinuteSM()
+        self.sm.start(104)
+
+    def tearDown(self):
+        self.sm.tmr.disarm()
+        self.sm.end()
+        farc.Framework.set_clock(farc.Clock())
+
+    def test_simulated_hours(self,):
+        t0 = time.monotonic()
+        farc.Framework._event_loop.run_forever()
+        self.assertLess(time.monotonic() - t0, 5.0)
+        self.assertEqual(self.sm.ticks, 600)
+        self.assertEqual(farc.Framework.time(), 10 * 3600.0)
+
+    def test_deadline_order(self,):
+        fired = []
+        # Scheduled latest first, e.g. a request's timeout
+        # before a sooner TimeEvent
+        for when in (10.0, 5.0, 7.5):
+            self.clock.call_at(when, lambda: fired.append(self.clock.now))
+        self.clock.call_at(6.0, fired.append, "cancelled").cancel()
+        farc.Framework._event_loop.run_forever()
+        self.assertEqual(fired, [5.0, 7.5, 10.0])
+        self.assertEqual(self.sm.ticks, 600)
+
+
+if __name__ == '__main__':
+    unittest.main()